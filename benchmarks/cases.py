@@ -0,0 +1,139 @@
+# The timed cases of the benchmark suite.
+#
+# The config root of mdsphinx is fixed when it is first imported,
+# so suite.py only imports this module after pointing it at a scratch folder.
+from __future__ import annotations
+
+import dataclasses
+import shutil
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from mdsphinx.core.environment import add_env
+from mdsphinx.core.prepare import prepare
+from mdsphinx.core.prepare import Renderer
+from mdsphinx.diagrams import DiagramJob
+from mdsphinx.diagrams import wait_for_diagrams
+from mdsphinx.tempdir import get_out_root
+
+STUB_QUICKSTART = """#!{python}
+# Write just enough of a sphinx project for prepare, without sphinx.
+import sys
+from pathlib import Path
+
+source = Path(sys.argv[-1], "source")
+source.mkdir(parents=True, exist_ok=True)
+source.joinpath("conf.py").write_text("project = 'mdsphinx'\\n")
+"""
+
+
+def stub_diagram(inp: Path | str, out: Path, **kwargs: Any) -> None:
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_bytes(b"\x89PNG\r\n\x1a\n")
+
+
+def make_stub_venv(path: Path, name: str) -> None:
+    """
+    Register a folder that looks enough like a virtual environment with sphinx for prepare to run.
+    """
+    version = f"{sys.version_info.major}.{sys.version_info.minor}"
+    path.joinpath("lib", f"python{version}", "site-packages").mkdir(parents=True, exist_ok=True)
+    path.joinpath("pyvenv.cfg").write_text(f"version = {version}\n")
+
+    quickstart = path / "bin" / "sphinx-quickstart"
+    quickstart.parent.mkdir(parents=True, exist_ok=True)
+    quickstart.write_text(STUB_QUICKSTART.format(python=sys.executable))
+    quickstart.chmod(0o755)
+
+    add_env(name, path)
+
+
+def timed(func: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+@dataclasses.dataclass
+class Bench:
+    root: Path
+    inp: Path
+    context: Path
+    jobs: int = 1
+    env_name: str = "bench"
+
+    @classmethod
+    def create(cls, root: Path, inp: Path, context: Path, jobs: int = 1) -> Bench:
+        bench = cls(root=root, inp=inp, context=context, jobs=jobs)
+        bench.tmp_root.mkdir(parents=True, exist_ok=True)
+        make_stub_venv(root / "venv", bench.env_name)
+
+        # diagrams are written by a stub, so that docker and tectonic are neither needed nor timed
+        DiagramJob.CALLBACKS = {kind: stub_diagram for kind in DiagramJob.CALLBACKS}
+        return bench
+
+    @property
+    def tmp_root(self) -> Path:
+        return self.root / "tmp"
+
+    @property
+    def cases(self) -> dict[str, Callable[[], float]]:
+        return {
+            "load_context": self.load_context,
+            "get_out_root": self.get_out_root,
+            "get_out_root overwrite": self.get_out_root_overwrite,
+            "render cold": self.render_cold,
+            "render warm": self.render_warm,
+            "create_index": self.create_index,
+            "prepare": self.prepare,
+        }
+
+    def renderer(self, out_root: Path) -> Renderer:
+        return Renderer.create(context=self.context, inp_root=self.inp, out_root=out_root)
+
+    def rendered(self) -> Renderer:
+        out_root = Path(tempfile.mkdtemp(dir=self.root, prefix="out."))
+        renderer = self.renderer(out_root)
+        renderer.render(jobs=self.jobs)
+        wait_for_diagrams()
+        return renderer
+
+    def load_context(self) -> float:
+        return timed(lambda: Renderer._load_context(self.context))
+
+    def get_out_root(self) -> float:
+        get_out_root(self.inp, root=self.tmp_root)
+        return timed(lambda: get_out_root(self.inp, root=self.tmp_root))
+
+    def get_out_root_overwrite(self) -> float:
+        return timed(lambda: get_out_root(self.inp, root=self.tmp_root, overwrite=True))
+
+    def render_cold(self) -> float:
+        renderer = self.renderer(Path(tempfile.mkdtemp(dir=self.root, prefix="out.")))
+        try:
+            return timed(lambda: renderer.render(jobs=self.jobs))
+        finally:
+            wait_for_diagrams()
+            shutil.rmtree(renderer.out_root)
+
+    def render_warm(self) -> float:
+        renderer = self.renderer(self.rendered().out_root)
+        try:
+            return timed(lambda: renderer.render(jobs=self.jobs))
+        finally:
+            wait_for_diagrams()
+            shutil.rmtree(renderer.out_root)
+
+    def create_index(self) -> float:
+        renderer = self.rendered()
+        try:
+            return timed(renderer.create_index)
+        finally:
+            shutil.rmtree(renderer.out_root)
+
+    def prepare(self) -> float:
+        return timed(lambda: prepare(self.inp, env_name=self.env_name, tmp_root=self.tmp_root, overwrite=True, jobs=self.jobs))
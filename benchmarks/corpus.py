@@ -0,0 +1,98 @@
+# Generate a synthetic input folder for the benchmarks.
+from __future__ import annotations
+
+import dataclasses
+import random
+from pathlib import Path
+
+import yaml
+
+
+JINJA = """
+## {{{{ project.name }}}} {i}
+
+{{% for item in items[:{loop}] -%}}
+- {{{{ item.name }}}}: {{{{ item.value }}}}
+{{% endfor %}}
+
+{{% if project.draft %}}This is a draft.{{% else %}}Released on {{{{ date }}}}.{{% endif %}}
+"""
+
+DIAGRAM = """
+{{% mermaid -%}}
+ext: .png
+mode: myst
+caption: Diagram {i}
+diagram: |
+    graph TD
+        A{i} --> B{i}
+        B{i} --> C{i}
+{{% endmermaid %}}
+"""
+
+WORDS = ("sphinx", "markdown", "render", "index", "source", "output", "context", "template", "diagram", "resource")
+
+
+@dataclasses.dataclass(frozen=True)
+class Corpus:
+    """
+    The shape of a synthetic input folder, spreading the sources and resources evenly over a tree of directories.
+    """
+
+    files: int = 500
+    depth: int = 3
+    fanout: int = 4
+    jinja: float = 0.5
+    resources: int = 50
+    resource_size: int = 64 * 2**10
+    diagrams: int = 10
+    context: int = 200
+    paragraphs: int = 5
+    seed: int = 0
+
+    def leaves(self, top: Path) -> list[Path]:
+        leaves = [top]
+        for _ in range(self.depth):
+            leaves = [leaf / f"part{i}" for leaf in leaves for i in range(self.fanout)]
+        return leaves
+
+    def generate(self, root: Path) -> tuple[Path, Path]:
+        """
+        Write the input folder and its context file below root.
+
+        Returns:
+            The input folder and the context file, which sits beside it where prepare looks for it.
+        """
+        rng = random.Random(self.seed)
+        inp = root / "docs"
+        leaves = self.leaves(inp)
+
+        # every n-th source is templated or holds a diagram, so both are spread over the whole tree
+        jinja_every = round(1 / self.jinja) if self.jinja > 0 else 0
+        diagram_every = max(1, self.files // self.diagrams) if self.diagrams > 0 else 0
+
+        for i in range(self.files):
+            leaf = leaves[i % len(leaves)]
+            leaf.mkdir(parents=True, exist_ok=True)
+            parts = [f"# Document {i}\n"]
+            parts.extend(" ".join(rng.choices(WORDS, k=60)) + "\n" for _ in range(self.paragraphs))
+            if jinja_every and i % jinja_every == 0:
+                parts.append(JINJA.format(i=i, loop=rng.randint(1, 20)))
+            if diagram_every and i % diagram_every == 0 and i // diagram_every < self.diagrams:
+                parts.append(DIAGRAM.format(i=i))
+            leaf.joinpath(f"doc{i}.md").write_text("\n".join(parts))
+
+        for i in range(self.resources):
+            leaf = leaves[i % len(leaves)]
+            leaf.mkdir(parents=True, exist_ok=True)
+            leaf.joinpath(f"image{i}.png").write_bytes(rng.randbytes(self.resource_size))
+
+        context = root / "context.yml"
+        data = dict(
+            project=dict(name="Benchmark", draft=False),
+            items=[dict(name=f"item{i}", value=rng.random(), tags=rng.choices(WORDS, k=3)) for i in range(self.context)],
+        )
+        with context.open("w") as stream:
+            yaml.safe_dump(data, stream)
+
+        return inp, context
@@ -0,0 +1,121 @@
+# Time index generation on a synthetic tree of sources.
+#
+#   python -m benchmarks.index --files 50000
+#
+# Run it as a module from the repository root, like the suite, so that mdsphinx is importable without installing it.
+# The networkx implementation it replaced is timed too when networkx is installed, and both must list the same toctrees.
+from __future__ import annotations
+
+import importlib
+import tempfile
+import time
+from pathlib import Path
+from typing import Annotated
+from typing import Any
+
+import typer
+from natsort import os_sorted
+from typer import Option
+
+from mdsphinx.core.prepare import Renderer
+
+Toctrees = dict[Path, tuple[str, int, list[tuple[str, str]]]]
+
+
+def make_tree(top: Path, files: int, fanout: int, depth: int) -> None:
+    """
+    Spread the files evenly over the leaves of a tree of directories, with one empty directory per leaf.
+    """
+    leaves = [top]
+    for _ in range(depth):
+        leaves = [leaf / f"d{i}" for leaf in leaves for i in range(fanout)]
+
+    for i in range(files):
+        leaf = leaves[i % len(leaves)]
+        leaf.mkdir(parents=True, exist_ok=True)
+        leaf.joinpath(f"doc{i}.md").touch()
+
+    for leaf in leaves:
+        leaf.joinpath("empty").mkdir(parents=True, exist_ok=True)
+
+
+def tree_toctrees(renderer: Renderer, top: Path) -> Toctrees:
+    return {
+        node.path: (
+            node.title,
+            node.depth,
+            [(e.title, e.target) for e in os_sorted(node.entries, key=lambda e: e.path)],
+        )
+        for node in renderer._make_source_tree(top)
+    }
+
+
+def graph_toctrees(renderer: Renderer, top: Path) -> Toctrees:
+    # networkx is no longer a dependency, so it is not type checked
+    nx: Any = importlib.import_module("networkx")
+
+    graph = nx.DiGraph()
+    for root, dir_names, file_names in top.walk(top_down=True):
+        depth = len(root.relative_to(top).parts)
+        if root not in graph:
+            graph.add_node(root, type="D", depth=depth, title=renderer.inp_root.name)
+
+        dir_names[:] = [d for d in dir_names if d not in renderer.EXCLUDED_NAMES]
+        for base in dir_names:
+            path = root / base
+            graph.add_node(path, type="D", depth=depth + 1, title=path.name, target=path.joinpath("index").relative_to(root))
+            graph.add_edge(root, path)
+
+        for base in file_names:
+            path = root / base
+            if base not in {"index.md", "index.rst"} and path.suffix.lower() in renderer.SOURCES:
+                graph.add_node(path, type="S", title=path.with_suffix("").name, target=path.relative_to(root).with_suffix(""))
+                graph.add_edge(root, path)
+
+    empty = [
+        node
+        for node, data in graph.nodes(data=True)
+        if data["type"] == "D" and not any(graph.nodes[n]["type"] == "S" for n in nx.descendants(graph, node))
+    ]
+    graph.remove_nodes_from(empty)
+
+    def documents(node: Path) -> list[tuple[Path, dict[str, Any]]]:
+        return [(fp if graph.nodes[fp]["type"] == "S" else fp / "index.rst", graph.nodes[fp]) for fp in graph.successors(node)]
+
+    return {
+        node: (
+            data["title"],
+            data["depth"],
+            [(d["title"], str(d["target"])) for _, d in os_sorted(documents(node), key=lambda x: x[0])],
+        )
+        for node, data in graph.nodes(data=True)
+        if data["type"] == "D"
+    }
+
+
+def main(
+    files: Annotated[int, Option(help="The number of source files.")] = 50000,
+    fanout: Annotated[int, Option(help="The number of subdirectories per directory.")] = 10,
+    depth: Annotated[int, Option(help="The number of directory levels.")] = 3,
+) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        renderer = Renderer.create({}, inp_root=Path(tmp, "inp"), out_root=Path(tmp, "out"))
+        top = renderer.index.parent
+        make_tree(top, files=files, fanout=fanout, depth=depth)
+
+        start = time.perf_counter()
+        expected = tree_toctrees(renderer, top)
+        print(f"tree     {time.perf_counter() - start:8.3f}s  {len(expected)} indexes, {files} files")
+
+        try:
+            start = time.perf_counter()
+            observed = graph_toctrees(renderer, top)
+            print(f"networkx {time.perf_counter() - start:8.3f}s  {len(observed)} indexes, {files} files")
+        except ImportError:
+            print("networkx is not installed, skipping")
+        else:
+            assert observed == expected, "the toctrees differ"
+
+
+if __name__ == "__main__":
+    typer.run(main)
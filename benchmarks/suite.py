@@ -0,0 +1,185 @@
+# Time the hot paths of mdsphinx on a synthetic corpus, and flag regressions against an earlier run.
+#
+#   python -m benchmarks.suite run --files 2000 --output after.json --baseline before.json
+#   python -m benchmarks.suite compare before.json after.json
+#
+# Every run works in a scratch config root with a stub environment and stub diagrams, so sphinx, docker and tectonic are not needed.
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Annotated
+from typing import Any
+
+import typer
+from typer import Argument
+from typer import Option
+from typer import Typer
+
+from benchmarks.corpus import Corpus
+from mdsphinx.types import MultipleStrings
+from mdsphinx.types import OptionalPath
+
+
+app = Typer(help="Benchmark mdsphinx on a synthetic corpus.")
+
+
+@dataclasses.dataclass
+class Report:
+    corpus: dict[str, Any]
+    cases: dict[str, list[float]]
+    meta: dict[str, Any] = dataclasses.field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> Report:
+        with path.open("r") as stream:
+            data = json.load(stream)
+        return cls(corpus=data["corpus"], cases=data["cases"], meta=data.get("meta", {}))
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w") as stream:
+            json.dump(dataclasses.asdict(self), stream, indent=2)
+
+    def median(self, name: str) -> float:
+        return statistics.median(self.cases[name])
+
+    def show(self) -> None:
+        print(f"{'median':>10} {'best':>10} {'runs':>5}  case")
+        for name, seconds in self.cases.items():
+            print(f"{statistics.median(seconds):9.4f}s {min(seconds):9.4f}s {len(seconds):5d}  {name}")
+
+
+def get_meta(jobs: int, repeat: int) -> dict[str, Any]:
+    try:
+        commit = subprocess.run(("git", "rev-parse", "--short", "HEAD"), capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return dict(
+        created=datetime.now().isoformat(timespec="seconds"),
+        commit=commit,
+        python=platform.python_version(),
+        platform=platform.platform(),
+        cpus=os.cpu_count(),
+        jobs=jobs,
+        repeat=repeat,
+    )
+
+
+def find_regressions(baseline: Report, current: Report, threshold: float, min_delta: float) -> list[str]:
+    """
+    Print the median of each case beside the baseline and return the cases that got slower by more than threshold.
+
+    Cases that differ by less than min_delta seconds are never flagged, since their timings are mostly noise.
+    """
+    if baseline.corpus != current.corpus:
+        print(f"warning: the corpus differs from the baseline, {baseline.corpus} != {current.corpus}", file=sys.stderr)
+
+    regressions: list[str] = []
+    print(f"{'baseline':>10} {'current':>10} {'change':>8}  case")
+    for name in current.cases:
+        if name not in baseline.cases:
+            print(f"{'-':>10} {current.median(name):9.4f}s {'-':>8}  {name}")
+            continue
+
+        before, after = baseline.median(name), current.median(name)
+        change = after / before - 1 if before > 0 else 0.0
+        slower = change > threshold and after - before > min_delta
+        if slower:
+            regressions.append(name)
+        print(f"{before:9.4f}s {after:9.4f}s {change:+7.1%}  {name}{'  REGRESSION' if slower else ''}")
+
+    return regressions
+
+
+def check(baseline: Path, current: Report, threshold: float, min_delta: float) -> None:
+    if regressions := find_regressions(Report.load(baseline), current, threshold=threshold, min_delta=min_delta):
+        print(f"{len(regressions)} regressions over {threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+        raise typer.Exit(1)
+
+
+@app.command()
+def run(
+    files: Annotated[int, Option(help="The number of source files.")] = Corpus.files,
+    depth: Annotated[int, Option(help="The number of directory levels.")] = Corpus.depth,
+    fanout: Annotated[int, Option(help="The number of subdirectories per directory.")] = Corpus.fanout,
+    jinja: Annotated[float, Option(help="The fraction of sources that use templating.")] = Corpus.jinja,
+    resources: Annotated[int, Option(help="The number of images to mirror.")] = Corpus.resources,
+    resource_size: Annotated[int, Option(help="The size of each image in bytes.")] = Corpus.resource_size,
+    diagrams: Annotated[int, Option(help="The number of stubbed mermaid blocks.")] = Corpus.diagrams,
+    context: Annotated[int, Option(help="The number of items in the context file.")] = Corpus.context,
+    repeat: Annotated[int, Option(help="The number of times to time each case.")] = 5,
+    jobs: Annotated[int, Option("--jobs", "-j", help="The number of parallel render jobs.")] = 1,
+    cases: Annotated[MultipleStrings, Option("--case", help="Only time these cases.")] = None,
+    output: Annotated[OptionalPath, Option(help="Write the timings to this JSON file.")] = None,
+    baseline: Annotated[OptionalPath, Option(help="Compare the timings to this JSON file.")] = None,
+    threshold: Annotated[float, Option(help="The slowdown of a case that counts as a regression.")] = 0.1,
+    min_delta: Annotated[float, Option(help="The seconds a case must slow down by to count as a regression.")] = 0.001,
+) -> None:
+    """
+    Generate a corpus and time each case on it.
+    """
+    if "mdsphinx.config" in sys.modules:
+        raise RuntimeError("mdsphinx was imported before the benchmarks could isolate its config root")
+
+    corpus = Corpus(
+        files=files,
+        depth=depth,
+        fanout=fanout,
+        jinja=jinja,
+        resources=resources,
+        resource_size=resource_size,
+        diagrams=diagrams,
+        context=context,
+    )
+
+    # the diagram extension warns about every diagram it creates
+    logging.getLogger("jinja2_mermaid_extension").setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory(prefix="mdsphinx-bench.") as tmp:
+        os.environ["MDSPHINX_CONFIG_ROOT"] = str(Path(tmp, "config"))
+        from benchmarks.cases import Bench
+
+        inp, context_path = corpus.generate(Path(tmp))
+        bench = Bench.create(Path(tmp), inp=inp, context=context_path, jobs=jobs)
+
+        timings: dict[str, list[float]] = {}
+        for name, case in bench.cases.items():
+            if cases is None or name in cases:
+                timings[name] = [case() for _ in range(repeat)]
+
+    report = Report(corpus=dataclasses.asdict(corpus), cases=timings, meta=get_meta(jobs=jobs, repeat=repeat))
+    report.show()
+
+    if output is not None:
+        report.save(output)
+
+    if baseline is not None:
+        check(baseline, report, threshold=threshold, min_delta=min_delta)
+
+
+@app.command()
+def compare(
+    baseline: Annotated[Path, Argument(help="The JSON file of the earlier run.")],
+    current: Annotated[Path, Argument(help="The JSON file of the later run.")],
+    threshold: Annotated[float, Option(help="The slowdown of a case that counts as a regression.")] = 0.1,
+    min_delta: Annotated[float, Option(help="The seconds a case must slow down by to count as a regression.")] = 0.001,
+) -> None:
+    """
+    Compare two runs, exiting with an error if any case regressed.
+    """
+    check(baseline, Report.load(current), threshold=threshold, min_delta=min_delta)
+
+
+if __name__ == "__main__":
+    app()
@@ -1,15 +1,52 @@
+import importlib
 import logging
 
+import click
+import typer.main
 from typer import Exit
 from typer import Typer
+from typer.core import TyperGroup
 
-import mdsphinx.core.environment
-import mdsphinx.core.generate
-import mdsphinx.core.prepare
-import mdsphinx.core.process
+
+class LazyGroup(TyperGroup):
+    """
+    Import the module of a subcommand only when that subcommand is used, so that startup stays fast.
+    """
+
+    # the module of each subcommand and its typer app or command function, which then provides the EPILOG too
+    LAZY: dict[str, tuple[str, str]] = {
+        "env": ("mdsphinx.core.environment", "app"),
+        "daemon": ("mdsphinx.core.daemon", "app"),
+        "cache": ("mdsphinx.core.cache", "app"),
+        "prepare": ("mdsphinx.core.prepare", "prepare"),
+        "process": ("mdsphinx.core.process", "process"),
+        "batch": ("mdsphinx.core.batch", "batch"),
+        "watch": ("mdsphinx.core.watch", "watch"),
+        "generate": ("mdsphinx.core.generate", "generate"),
+    }
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted({*super().list_commands(ctx), *self.LAZY})
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> click.Command | None:
+        if cmd_name in self.LAZY and cmd_name not in self.commands:
+            module_name, attr = self.LAZY[cmd_name]
+            module = importlib.import_module(module_name)
+            target = getattr(module, attr)
+
+            wrapper = Typer(rich_markup_mode="rich")
+            if isinstance(target, Typer):
+                wrapper.add_typer(target, name=cmd_name)
+            else:
+                wrapper.command(name=cmd_name, epilog=module.EPILOG)(target)
+
+            self.add_command(typer.main.get_group(wrapper).commands[cmd_name], cmd_name)
+
+        return super().get_command(ctx, cmd_name)
 
 
 app = Typer(
+    cls=LazyGroup,
     add_completion=False,
     rich_markup_mode="rich",
     invoke_without_command=True,
@@ -19,12 +56,6 @@ app = Typer(
 )
 
 
-app.add_typer(mdsphinx.core.environment.app, name="env")
-app.command(epilog=mdsphinx.core.prepare.EPILOG)(mdsphinx.core.prepare.prepare)
-app.command(epilog=mdsphinx.core.process.EPILOG)(mdsphinx.core.process.process)
-app.command(epilog=mdsphinx.core.generate.EPILOG)(mdsphinx.core.generate.generate)
-
-
 @app.callback()
 def cb(version: bool = False, verbose: bool = False) -> None:
     """
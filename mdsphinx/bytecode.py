@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import dataclasses
+import functools
+import hashlib
+import marshal
+import os
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from mdsphinx import __version__
+from mdsphinx.config import CACHE_ROOT
+from mdsphinx.config import TEMPLATE_CACHE_SIZE
+from mdsphinx.logger import logger
+from mdsphinx.lru import evict_lru
+
+if TYPE_CHECKING:
+    from jinja2 import BytecodeCache
+    from jinja2 import Environment
+    from jinja2 import Template
+
+
+@dataclasses.dataclass
+class TemplateCache:
+    """
+    An on-disk cache of compiled templates keyed by their source text, evicting the least recently used beyond max_size bytes.
+    """
+
+    root: Path
+    max_size: int = 0
+    hits: int = 0
+    misses: int = 0
+
+    def key(self, instance: Environment, source: str) -> str:
+        import jinja2
+
+        h = hashlib.sha256()
+        for part in (__version__, jinja2.__version__, sys.implementation.cache_tag, *sorted(instance.extensions), source):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def from_string(self, instance: Environment, source: str) -> tuple[Template, frozenset[str]]:
+        """
+        Compile the source, or load it from the cache, returning the template and its undeclared variables.
+        """
+        path = self.path(self.key(instance, source))
+
+        try:
+            with path.open("rb") as stream:
+                code, names = marshal.load(stream)
+        except (OSError, EOFError, ValueError, TypeError):
+            from jinja2 import meta
+
+            self.misses += 1
+            ast = instance.parse(source)
+            code, names = instance.compile(ast), sorted(meta.find_undeclared_variables(ast))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with tmp_path.open("wb") as stream:
+                marshal.dump((code, names), stream)
+            os.replace(tmp_path, path)
+        else:
+            self.hits += 1
+            # the modification time is the clock of the least recently used eviction
+            os.utime(path)
+
+        template = instance.template_class.from_code(instance, code, instance.make_globals(None))
+        return template, frozenset(names)
+
+    def bytecode_cache(self) -> BytecodeCache:
+        """
+        Get a jinja bytecode cache for the templates loaded by name, such as partials, kept in this store and within its bound.
+        """
+        from jinja2 import BytecodeCache
+        from jinja2.bccache import Bucket
+
+        cache = self
+
+        class Store(BytecodeCache):
+            def load_bytecode(self, bucket: Bucket) -> None:
+                path = cache.path(bucket.key)
+                try:
+                    with path.open("rb") as stream:
+                        bucket.load_bytecode(stream)
+                    os.utime(path)
+                except OSError:
+                    pass
+
+            def dump_bytecode(self, bucket: Bucket) -> None:
+                path = cache.path(bucket.key)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+                with tmp_path.open("wb") as stream:
+                    bucket.write_bytecode(stream)
+                os.replace(tmp_path, path)
+
+        return Store()
+
+    def evict(self) -> None:
+        if self.max_size <= 0:
+            return
+
+        for path in evict_lru(self.root, self.max_size):
+            logger.debug(f"evict template: {path}")
+
+
+@functools.lru_cache(maxsize=1)
+def template_cache() -> TemplateCache:
+    return TemplateCache(CACHE_ROOT / "templates", max_size=TEMPLATE_CACHE_SIZE)
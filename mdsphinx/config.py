@@ -14,13 +14,19 @@ CONFIG_ROOT: Path = Path(os.environ.get("MDSPHINX_CONFIG_ROOT", default=Path.hom
 if CONFIG_ROOT.exists():
     assert CONFIG_ROOT.is_dir(), "Configuration root is not a directory."
 
-CONFIG_ROOT.mkdir(parents=True, exist_ok=True)
 assert CONFIG_ROOT != Path.home(), "Configuration root is the home directory."
 
+# nothing is created on import, every directory below is made by the code that first writes to it
 ENVIRONMENTS: Path = CONFIG_ROOT / "environments"
-ENVIRONMENTS.mkdir(parents=True, exist_ok=True)
 
-ENVIRONMENTS_REGISTRY: Path = CONFIG_ROOT / "registry"
+ENVIRONMENTS_REGISTRY: Path = CONFIG_ROOT / "registry.json"
+
+CACHE_ROOT: Path = CONFIG_ROOT / "cache"
+
+# wheels that environments are installed from before the package index, filled by 'mdsphinx env download'
+WHEELHOUSE: Path = Path(os.environ.get("MDSPHINX_WHEELHOUSE", CACHE_ROOT / "wheels"))
+
+OUT_ROOTS: Path = CONFIG_ROOT / "outputs"
 
 DEFAULT_ENVIRONMENT: str = "default"
 DEFAULT_ENVIRONMENT_PACKAGES: tuple[str, ...] = (
@@ -34,3 +40,15 @@ DEFAULT_ENVIRONMENT_PACKAGES: tuple[str, ...] = (
 LATEX_COMMAND: tuple[tuple[str, ...], ...] = tuple(
     tuple(shlex.split(command)) for command in os.environ.get("MDSPHINX_LATEX_COMMAND", "tectonic '{tex}'").split(";")
 )
+
+DAEMON_IDLE_TIMEOUT: float = float(os.environ.get("MDSPHINX_DAEMON_IDLE_TIMEOUT", "600"))
+
+TEMPLATE_CACHE_SIZE: int = int(os.environ.get("MDSPHINX_TEMPLATE_CACHE_SIZE", str(64 * 2**20)))
+
+DIAGRAM_CACHE_SIZE: int = int(os.environ.get("MDSPHINX_DIAGRAM_CACHE_SIZE", str(512 * 2**20)))
+DIAGRAM_JOBS: int = int(os.environ.get("MDSPHINX_DIAGRAM_JOBS", str(os.cpu_count() or 1)))
+DIAGRAM_TIMEOUT: float = float(os.environ.get("MDSPHINX_DIAGRAM_TIMEOUT", "600"))
+
+# evict the least recently used output folders at the end of process, 0 disables each bound
+OUTPUT_MAX_SIZE: int = int(os.environ.get("MDSPHINX_OUTPUT_MAX_SIZE", "0"))
+OUTPUT_MAX_AGE: float = float(os.environ.get("MDSPHINX_OUTPUT_MAX_AGE", "0"))
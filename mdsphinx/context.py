@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import functools
+import hashlib
+import json
+import os
+import pickle
+from collections.abc import Generator
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+from typing import ClassVar
+
+from jinja2 import Environment
+from jinja2 import Template
+from jinja2.runtime import Context
+
+from mdsphinx import __version__
+from mdsphinx.config import CACHE_ROOT
+from mdsphinx.logger import logger
+from mdsphinx.manifest import digest_file
+from mdsphinx.trace import count
+from mdsphinx.trace import span
+
+
+@dataclasses.dataclass(frozen=True)
+class LazyFile:
+    """
+    A context value kept in a side file, only read when a template first uses it.
+    """
+
+    path: Path
+
+    FORMATS: ClassVar[frozenset[str]] = frozenset({".json", ".jsonl", ".csv", ".yml", ".yaml"})
+
+    def __post_init__(self) -> None:
+        if self.path.suffix.lower() not in self.FORMATS:
+            raise ValueError(f"Can not include {self.path}, expected one of {', '.join(sorted(self.FORMATS))}")
+
+    def __getstate__(self) -> dict[str, Any]:
+        # the loaded value is never pickled, each process loads it again when it needs it
+        return dict(path=self.path)
+
+    @functools.cached_property
+    def value(self) -> Any:
+        logger.debug(f"loading: {self.path}")
+        count("context files loaded")
+        with span("load", path=self.path):
+            return load_file(self.path)
+
+    def digest(self) -> str:
+        return digest_file(self.path)
+
+
+@dataclasses.dataclass
+class Reads:
+    """
+    What the templates rendered inside recording() used, including the templates they included, imported or extended.
+
+    The diagrams are the outputs of the diagram blocks that had to be generated.
+    """
+
+    names: set[str] = dataclasses.field(default_factory=set)
+    templates: set[Path] = dataclasses.field(default_factory=set)
+    diagrams: set[Path] = dataclasses.field(default_factory=set)
+
+
+_reads: ContextVar[Reads | None] = ContextVar("reads", default=None)
+
+
+class LazyContext(Context):
+    """
+    A template context that loads the side files of the values a template uses, and only those.
+    """
+
+    def resolve_or_missing(self, key: str) -> Any:
+        if (reads := _reads.get()) is not None:
+            reads.names.add(key)
+        value = super().resolve_or_missing(key)
+        return value.value if isinstance(value, LazyFile) else value
+
+
+class TrackingEnvironment(Environment):
+    """
+    A template environment that records the files of the templates it loads for includes, imports and extends.
+
+    Loaded templates stay in the cache of the environment, so a partial is compiled once for all the sources that use it.
+    """
+
+    context_class = LazyContext
+
+    def get_template(self, *args: Any, **kwargs: Any) -> Template:
+        return self._record(super().get_template(*args, **kwargs))
+
+    def select_template(self, *args: Any, **kwargs: Any) -> Template:
+        return self._record(super().select_template(*args, **kwargs))
+
+    @staticmethod
+    def _record(template: Template) -> Template:
+        if (reads := _reads.get()) is not None and template.filename is not None:
+            reads.templates.add(Path(template.filename))
+        return template
+
+
+@contextlib.contextmanager
+def recording() -> Generator[Reads]:
+    """
+    Collect what the templates rendered inside the block use.
+    """
+    reads = Reads()
+    token = _reads.set(reads)
+    try:
+        yield reads
+    finally:
+        _reads.reset(token)
+
+
+def record_diagram(path: Path) -> None:
+    if (reads := _reads.get()) is not None:
+        reads.diagrams.add(path)
+
+
+def load_yaml(path: Path, includes: bool = False) -> Any:
+    """
+    Parse a YAML file with libyaml when it is available.
+
+    With includes, a top level value tagged with !include names a side file to load lazily, and the tag is an error elsewhere.
+    """
+    import yaml
+
+    base: Any = yaml.CFullLoader if yaml.__with_libyaml__ else yaml.FullLoader
+
+    class Loader(base):  # type: ignore[misc]
+        def construct_document(self, node: yaml.Node) -> Any:
+            allowed = {id(value) for _, value in node.value} if includes and isinstance(node, yaml.MappingNode) else set()
+            for child in walk_nodes(node):
+                if child.tag == "!include" and id(child) not in allowed:
+                    raise yaml.constructor.ConstructorError(
+                        None, None, "!include is only supported for the top level values of a context file", child.start_mark
+                    )
+            return super().construct_document(node)
+
+    def include(loader: Any, node: Any) -> LazyFile:
+        return LazyFile(path.parent / loader.construct_scalar(node))
+
+    Loader.add_constructor("!include", include)
+    with path.open("r") as stream:
+        return yaml.load(stream, Loader=Loader)
+
+
+def walk_nodes(node: Any, seen: set[int] | None = None) -> Generator[Any]:
+    # anchors share nodes, which may even contain themselves
+    seen = seen if seen is not None else set()
+    if id(node) in seen:
+        return
+
+    seen.add(id(node))
+    yield node
+    if isinstance(node.value, list):
+        for child in node.value:
+            for item in child if isinstance(child, tuple) else (child,):
+                yield from walk_nodes(item, seen)
+
+
+def load_file(path: Path) -> Any:
+    match path.suffix.lower():
+        case ".json":
+            with path.open("r") as stream:
+                return json.load(stream)
+        case ".jsonl":
+            with path.open("r") as stream:
+                return [json.loads(line) for line in stream if line.strip()]
+        case ".csv":
+            import csv
+
+            with path.open("r", newline="") as stream:
+                return list(csv.DictReader(stream))
+        case ".yaml" | ".yml":
+            return load_yaml(path)
+        case _:
+            raise ValueError(f"Can not load context from {path}")
+
+
+def load_context(path: Path) -> dict[str, Any]:
+    """
+    Load a JSON or YAML context file, reusing the parsed result cached for the same path, size and modification time.
+    """
+    if path.suffix.lower() not in {".json", ".yml", ".yaml"}:
+        raise ValueError(f"Can not load context from {path}")
+
+    path = path.resolve()
+    stat = path.stat()
+    stamp = (__version__, stat.st_size, stat.st_mtime_ns)
+    cache = CACHE_ROOT / "context" / f"{hashlib.sha256(str(path).encode()).hexdigest()}.pickle"
+
+    try:
+        with cache.open("rb") as stream:
+            cached_stamp, data = pickle.load(stream)
+        if cached_stamp == stamp:
+            logger.debug(f"cached context: {path}")
+            return data  # type: ignore[no-any-return]
+    except (OSError, EOFError, ValueError, TypeError, AttributeError, pickle.UnpicklingError):
+        pass
+
+    data = load_yaml(path, includes=True) if path.suffix.lower() in {".yml", ".yaml"} else load_file(path)
+    data = data if isinstance(data, dict) else {}
+
+    cache.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache.with_suffix(f".{os.getpid()}.tmp")
+    with tmp_path.open("wb") as stream:
+        pickle.dump((stamp, data), stream, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache)
+    return data
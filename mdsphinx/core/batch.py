@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import time
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Annotated
+from typing import Any
+from typing import ClassVar
+
+from typer import Exit
+from typer import Option
+
+from mdsphinx.config import DEFAULT_ENVIRONMENT
+from mdsphinx.config import DIAGRAM_JOBS
+from mdsphinx.config import DIAGRAM_TIMEOUT
+from mdsphinx.config import TMP_ROOT
+from mdsphinx.core.cache import auto_evict
+from mdsphinx.core.daemon import start
+from mdsphinx.core.environment import VirtualEnvironment
+from mdsphinx.core.prepare import prepare
+from mdsphinx.core.process import build
+from mdsphinx.core.process import copy_doctrees
+from mdsphinx.core.process import export
+from mdsphinx.core.process import Format
+from mdsphinx.core.process import get_builder
+from mdsphinx.core.process import get_chains
+from mdsphinx.core.process import get_log_path
+from mdsphinx.logger import logger
+from mdsphinx.mirror import MirrorMode
+
+
+EPILOG = """
+Examples
+
+mdsphinx batch documents.yml --build-jobs 4
+
+documents.yml
+
+defaults:
+  using: default
+documents:
+  - inp: a.md
+    to: [html, pdf]
+    as: {pdf: out/a.pdf}
+  - inp: ./directory
+    to: confluence
+""".replace(
+    "\n", "\n\n"
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class Target:
+    """
+    One output to build from one input.
+    """
+
+    inp: Path
+    format_key: Format
+    builder_key: str = "default"
+    out: Path | None = None
+    env_name: str = DEFAULT_ENVIRONMENT
+    context: Path | None = None
+
+    KEYS: ClassVar[frozenset[str]] = frozenset({"inp", "to", "using", "as", "env-name", "context"})
+
+    @property
+    def source(self) -> tuple[Path, str, Path | None]:
+        """
+        The arguments of prepare, so that targets sharing them are prepared once.
+        """
+        return self.inp, self.env_name, self.context
+
+    def __str__(self) -> str:
+        return f"{self.inp.name} --to {self.format_key.value} --using {self.builder_key}"
+
+
+def load_targets(path: Path) -> list[Target]:
+    """
+    Load the targets of a YAML or JSON batch file, resolving paths relative to it.
+    """
+    with path.open("r") as stream:
+        if path.suffix.lower() == ".json":
+            data = json.load(stream)
+        else:
+            import yaml
+
+            data = yaml.load(stream, Loader=yaml.SafeLoader)
+
+    if not isinstance(data, dict) or not isinstance(data.get("documents"), list):
+        raise ValueError(f"{path} must contain a list of documents")
+
+    targets: list[Target] = []
+    for document in data["documents"]:
+        document = {**data.get("defaults", {}), **(document if isinstance(document, dict) else dict(inp=document))}
+        targets.extend(_load_document(document, root=path.parent))
+
+    return targets
+
+
+def _load_document(document: dict[str, Any], root: Path) -> list[Target]:
+    if unknown := set(document) - Target.KEYS:
+        raise ValueError(f"unknown keys {', '.join(sorted(unknown))} in {document}")
+
+    if "inp" not in document:
+        raise ValueError(f"missing inp in {document}")
+
+    formats = document.get("to", Format.pdf.value)
+    outs = document.get("as")
+
+    targets: list[Target] = []
+    for value in [formats] if isinstance(formats, str) else formats:
+        out = outs.get(value) if isinstance(outs, dict) else outs
+        target = Target(
+            inp=root.joinpath(document["inp"]).resolve(),
+            format_key=Format(value),
+            builder_key=document.get("using", "default"),
+            out=root.joinpath(out).resolve() if out is not None else None,
+            env_name=document.get("env-name", DEFAULT_ENVIRONMENT),
+            context=root.joinpath(document["context"]).resolve() if document.get("context") is not None else None,
+        )
+        if target.out is not None and not get_builder(target.format_key, target.builder_key).export:
+            raise ValueError(f"exporting {target.format_key.value} is not yet supported: {target}")
+        targets.append(target)
+
+    return targets
+
+
+@dataclasses.dataclass(frozen=True)
+class Outcome:
+    action: str
+    target: str
+    seconds: float
+    error: str | None = None
+    log: Path | None = None
+
+
+def batch(
+    inp: Annotated[Path, "The YAML/JSON file listing the documents to build."],
+    tmp_root: Annotated[Path, Option(help="The directory for temporary output.")] = TMP_ROOT,
+    overwrite: Annotated[bool, Option(help="Force creation of new output folder in --tmp-root?")] = False,
+    reconfigure: Annotated[bool, Option(help="Remove existing sphinx conf.py file?")] = False,
+    jobs: Annotated[int, Option("--jobs", "-j", min=1, help="The number of parallel render jobs.")] = 1,
+    build_jobs: Annotated[int, Option(help="The number of builds to run at once.")] = 4,
+    mirror_mode: Annotated[MirrorMode, Option("--mirror", help="How to mirror resources to the output.")] = MirrorMode.copy,
+    diagram_jobs: Annotated[int, Option(min=1, help="The number of diagram jobs to run at once.")] = DIAGRAM_JOBS,
+    diagram_timeout: Annotated[float, Option(min=0, help="Seconds before a diagram job is killed, 0 for no limit.")] = DIAGRAM_TIMEOUT,
+    daemon: Annotated[bool, Option(help="Build with a warm sphinx daemon of the environment?")] = False,
+) -> None:
+    """
+    Render many documents to many formats.
+    """
+    targets = load_targets(inp.resolve())
+    tmp_root = tmp_root.resolve()
+
+    venvs = {name: VirtualEnvironment.from_db(name) for name in dict.fromkeys(target.env_name for target in targets)}
+    if daemon:
+        start_daemons(list(venvs.values()))
+
+    groups: dict[tuple[Path, str, Path | None], list[Target]] = {}
+    for target in targets:
+        groups.setdefault(target.source, []).append(target)
+
+    outcomes: list[Outcome] = []
+    futures: list[Future[tuple[list[Outcome], list[Future[list[Outcome]]]]]] = []
+    with ThreadPoolExecutor(max_workers=max(1, build_jobs), thread_name_prefix="mdsphinx-build") as executor:
+        # prepare one input at a time while the builds of the inputs before it run in the background
+        for (path, env_name, context), group in groups.items():
+            started = time.monotonic()
+            try:
+                renderer = prepare(
+                    inp=path,
+                    context=context,
+                    env_name=env_name,
+                    tmp_root=tmp_root,
+                    overwrite=overwrite,
+                    reconfigure=reconfigure,
+                    jobs=jobs,
+                    mirror_mode=mirror_mode,
+                    diagram_jobs=diagram_jobs,
+                    diagram_timeout=diagram_timeout,
+                )
+            except Exception as error:
+                outcomes.append(Outcome("prepare", str(path), time.monotonic() - started, error=f"{type(error).__name__}: {error}"))
+                continue
+
+            outcomes.append(Outcome("prepare", str(path), time.monotonic() - started))
+            futures.append(executor.submit(build_input, executor, renderer.out_root, group, venvs[env_name], tmp_root, daemon))
+
+        for future in futures:
+            first, others = future.result()
+            outcomes.extend(first)
+            for other in others:
+                outcomes.extend(other.result())
+
+    report(outcomes)
+    auto_evict()
+
+    if any(outcome.error is not None for outcome in outcomes):
+        raise Exit(1)
+
+
+def start_daemons(venvs: list[VirtualEnvironment]) -> None:
+    """
+    Start the daemons up front, so that concurrent builds do not race to start them.
+    """
+    for venv in venvs:
+        try:
+            start(venv)
+        except OSError as error:
+            logger.warning(dict(action="daemon", name=venv.name, message=f"not started: {error}"))
+
+
+def build_input(
+    executor: ThreadPoolExecutor, out_root: Path, targets: list[Target], venv: VirtualEnvironment, tmp_root: Path, daemon: bool
+) -> tuple[list[Outcome], list[Future[list[Outcome]]]]:
+    """
+    Build the first target of an input alone to fill the shared doctree cache, then submit the others to run at once.
+
+    Each submitted chain gets its own copy of the doctree cache, so concurrent builds never write the same files.
+    """
+    (first, *same_format), *others = get_chains(targets, key=lambda target: target.format_key)
+    outcomes = build_chain(out_root, [first], venv, tmp_root, daemon)
+    chains = [chain for chain in (same_format, *others) if chain]
+    return outcomes, [
+        executor.submit(build_chain, out_root, chain, venv, tmp_root, daemon, copy_doctrees(out_root, chain[0].format_key))
+        for chain in chains
+    ]
+
+
+def build_chain(
+    out_root: Path, targets: list[Target], venv: VirtualEnvironment, tmp_root: Path, daemon: bool, doctrees: Path | None = None
+) -> list[Outcome]:
+    """
+    Build the targets one after the other, sending the output of each to a log file.
+    """
+    outcomes: list[Outcome] = []
+    for target in targets:
+        log = get_log_path(out_root, target.format_key, target.builder_key)
+        started = time.monotonic()
+        try:
+            with log.open("w") as stream:
+                build(out_root, venv, target.format_key, target.builder_key, daemon=daemon, stdout=stream, doctrees=doctrees)
+            if target.out is not None:
+                export(out_root, target.format_key, target.builder_key, target.out, top=tmp_root)
+        except Exception as error:
+            outcomes.append(Outcome("build", str(target), time.monotonic() - started, f"{type(error).__name__}: {error}", log))
+        else:
+            outcomes.append(Outcome("build", str(target), time.monotonic() - started, log=log))
+
+    return outcomes
+
+
+def report(outcomes: list[Outcome]) -> None:
+    logger.info(f"{'action':<8} {'status':<7} {'seconds':>8}  target")
+    for outcome in outcomes:
+        status = "ok" if outcome.error is None else "failed"
+        logger.info(f"{outcome.action:<8} {status:<7} {outcome.seconds:8.2f}  {outcome.target}")
+        if outcome.error is not None:
+            logger.error(f"{'':<8} {outcome.error}" + (f" (see {outcome.log})" if outcome.log is not None else ""))
+
+    failed = sum(outcome.error is not None for outcome in outcomes)
+    logger.info(f"{len(outcomes) - failed} succeeded, {failed} failed")
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import dataclasses
+import fcntl
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Annotated
+
+from typer import Option
+from typer import Typer
+
+from mdsphinx.config import OUTPUT_MAX_AGE
+from mdsphinx.config import OUTPUT_MAX_SIZE
+from mdsphinx.logger import logger
+from mdsphinx.mirror import collect_blobs
+from mdsphinx.tempdir import LOCK_NAME
+from mdsphinx.tempdir import OutRoots
+from mdsphinx.types import OptionalPath
+
+
+app = Typer(help="Manage the output folders in the temporary root.")
+
+# the names given by make_next_directory, used to find folders made before the index existed
+FOLDER_PATTERN = re.compile(r".+\.\d\d\d\d-\d\d-\d\d\..+\.\d+")
+
+
+@dataclasses.dataclass(frozen=True)
+class Folder:
+    path: Path
+    inp: Path | None
+    used: float
+    size: int
+
+    @classmethod
+    def scan(cls, path: Path, inp: Path | None) -> Folder:
+        try:
+            used = path.joinpath(LOCK_NAME).stat().st_mtime
+        except FileNotFoundError:
+            used = path.stat().st_mtime
+
+        return cls(path=path, inp=inp, used=used, size=get_size(path))
+
+
+def get_size(root: Path) -> int:
+    """
+    Get the disk usage of the folder, counting hard linked files once.
+    """
+    seen: set[tuple[int, int]] = set()
+    total = 0
+    for path, _, names in root.walk():
+        for name in names:
+            try:
+                stat = path.joinpath(name).lstat()
+            except FileNotFoundError:
+                continue
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_blocks * 512
+    return total
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+
+def get_folders(tmp_root: Path | None = None) -> list[Folder]:
+    """
+    Get the output folders in the index, and the unindexed output folders in tmp_root if given.
+    """
+    folders: dict[Path, Path | None] = {}
+    for out_roots in OutRoots.load_all():
+        for path in out_roots.history:
+            folders[path] = out_roots.inp
+
+    if tmp_root is not None:
+        for path in tmp_root.resolve().iterdir():
+            if path not in folders and FOLDER_PATTERN.fullmatch(path.name) and path.joinpath("source", "conf.py").exists():
+                folders[path] = None
+
+    found: list[Folder] = []
+    for path, inp in folders.items():
+        try:
+            found.append(Folder.scan(path, inp))
+        except FileNotFoundError:
+            continue
+
+    return sorted(found, key=lambda folder: folder.used)
+
+
+def is_held(path: Path) -> bool:
+    try:
+        fd = os.open(path / LOCK_NAME, os.O_RDONLY | os.O_CLOEXEC)
+    except FileNotFoundError:
+        return False
+
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return False
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+
+
+def remove(path: Path) -> bool:
+    """
+    Remove the folder unless a running build holds its lock.
+    """
+    try:
+        fd = os.open(path / LOCK_NAME, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+    except FileNotFoundError:
+        return True
+
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+
+    try:
+        shutil.rmtree(path)
+    finally:
+        os.close(fd)
+
+    return True
+
+
+def evict(folders: list[Folder], max_size: int = 0, max_age: float = 0.0, dry_run: bool = False) -> list[Folder]:
+    """
+    Remove the folders unused for more than max_age days, then the least recently used until at most max_size bytes remain.
+
+    The age limit never removes the newest folder of an input, so every input keeps its latest output.
+    A bound of 0 is disabled, and folders held by running builds are skipped.
+    """
+    now = time.time()
+    total = sum(folder.size for folder in folders)
+    folders = sorted(folders, key=lambda f: f.used)
+    newest: dict[Path | None, Path] = {folder.inp: folder.path for folder in folders if folder.inp is not None}
+
+    evicted: list[Folder] = []
+    for folder in folders:
+        expired = max_age > 0 and now - folder.used > max_age * 86400 and folder.path != newest.get(folder.inp)
+        if not expired and (max_size <= 0 or total <= max_size):
+            continue
+
+        if dry_run or remove(folder.path):
+            evicted.append(folder)
+            total -= folder.size
+            logger.info(dict(action="evict", path=folder.path, size=format_size(folder.size), dry_run=dry_run))
+        else:
+            logger.warning(dict(action="evict", path=folder.path, message="in use, skipping"))
+
+    return evicted
+
+
+def auto_evict() -> None:
+    """
+    Enforce MDSPHINX_OUTPUT_MAX_SIZE and MDSPHINX_OUTPUT_MAX_AGE, if either is set.
+    """
+    if OUTPUT_MAX_SIZE > 0 or OUTPUT_MAX_AGE > 0:
+        if evict(get_folders(), max_size=OUTPUT_MAX_SIZE, max_age=OUTPUT_MAX_AGE):
+            collect_blobs()
+
+
+@app.command(name="list")
+def display_folders(
+    tmp_root: Annotated[OptionalPath, Option(help="Also list unindexed output folders in this directory.")] = None,
+) -> None:
+    """
+    List the output folders, least recently used first.
+    """
+    folders = get_folders(tmp_root)
+    for folder in folders:
+        logger.info(
+            dict(
+                action="list",
+                path=folder.path,
+                inp=folder.inp,
+                size=format_size(folder.size),
+                used=f"{datetime.fromtimestamp(folder.used):%Y-%m-%d %H:%M}",
+                held=is_held(folder.path),
+            )
+        )
+
+    logger.info(dict(action="list", folders=len(folders), size=format_size(sum(folder.size for folder in folders))))
+
+
+@app.command(name="clean")
+def clean_folders(
+    max_size: Annotated[int, Option(help="The total bytes to keep, 0 for no limit.")] = OUTPUT_MAX_SIZE,
+    max_age: Annotated[float, Option(help="The days a folder may go unused, 0 for no limit.")] = OUTPUT_MAX_AGE,
+    tmp_root: Annotated[OptionalPath, Option(help="Also evict unindexed output folders in this directory.")] = None,
+    dry_run: Annotated[bool, Option(help="Only list the folders that would be removed?")] = False,
+) -> None:
+    """
+    Remove the least recently used output folders, then the stored resources that no output folder uses anymore.
+    """
+    evicted = evict(get_folders(tmp_root), max_size=max_size, max_age=max_age, dry_run=dry_run)
+    logger.info(dict(action="clean", folders=len(evicted), size=format_size(sum(folder.size for folder in evicted))))
+
+    blobs = collect_blobs(dry_run=dry_run)
+    logger.info(dict(action="clean", blobs=len(blobs), size=format_size(sum(size for _, size in blobs)), dry_run=dry_run))
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Annotated
+from typing import Any
+from typing import IO
+
+from typer import Option
+from typer import Typer
+
+from mdsphinx.config import CONFIG_ROOT
+from mdsphinx.config import DAEMON_IDLE_TIMEOUT
+from mdsphinx.config import DEFAULT_ENVIRONMENT
+from mdsphinx.core.environment import VirtualEnvironment
+from mdsphinx.core.sphinxd import HEADER
+from mdsphinx.logger import logger
+from mdsphinx.types import OptionalString
+
+
+app = Typer(help="Manage warm sphinx build daemons.")
+
+DAEMONS: Path = CONFIG_ROOT / "daemons"
+SERVER: Path = Path(__file__).with_name("sphinxd.py")
+
+
+def get_socket_path(venv: VirtualEnvironment) -> Path:
+    """
+    Get the socket of the daemon for the environment, which changes whenever its packages change.
+    """
+    key = hashlib.sha256(f"{venv.path}:{venv.capabilities.stamp}".encode()).hexdigest()[:12]
+    return DAEMONS / f"{venv.name}.{key}.sock"
+
+
+def request(path: Path, message: dict[str, Any], fds: tuple[int, ...] = ()) -> dict[str, Any]:
+    data = json.dumps(message).encode()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(path))
+        socket.send_fds(client, [HEADER.pack(len(data)) + data], list(fds))
+
+        reply = b""
+        while len(reply) < HEADER.size or len(reply) < HEADER.size + HEADER.unpack_from(reply)[0]:
+            if not (chunk := client.recv(1 << 16)):
+                raise ConnectionError(f"daemon closed the connection: {path}")
+            reply += chunk
+
+    result: dict[str, Any] = json.loads(reply[HEADER.size :])
+    return result
+
+
+def start(venv: VirtualEnvironment, timeout: float = 30.0) -> Path:
+    """
+    Start the daemon for the environment if it is not already running and wait for it to accept requests.
+    """
+    path = get_socket_path(venv)
+    try:
+        request(path, dict(command="ping"))
+        return path
+    except OSError:
+        pass
+
+    DAEMONS.mkdir(parents=True, exist_ok=True)
+    logger.info(dict(action="daemon", name=venv.name, socket=path, message="starting"))
+    with DAEMONS.joinpath(f"{path.stem}.log").open("a") as log:
+        subprocess.Popen(
+            (str(venv.python), str(SERVER), "--socket", str(path), "--idle-timeout", str(DAEMON_IDLE_TIMEOUT)),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=log,
+            start_new_session=True,
+        )
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            request(path, dict(command="ping"))
+            return path
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def sphinx_build(venv: VirtualEnvironment, *args: str | Path, daemon: bool = False, stdout: IO[str] | None = None) -> None:
+    """
+    Run sphinx-build through the environment's daemon, falling back to a new process if the daemon is unavailable.
+
+    The output goes to stdout and stderr, or to the given stream if any.
+    """
+    if daemon:
+        try:
+            path = start(venv)
+            logger.info(json.dumps(dict(action="run", daemon=str(path), command=("sphinx-build", *map(str, args))), indent=2))
+            reply = request(
+                path,
+                dict(argv=list(map(str, args)), cwd=str(Path.cwd()), env=dict(os.environ)),
+                fds=(sys.stdout.fileno(), sys.stderr.fileno()) if stdout is None else (stdout.fileno(), stdout.fileno()),
+            )
+        except (OSError, ValueError) as error:
+            logger.warning(dict(action="daemon", name=venv.name, message=f"falling back to sphinx-build: {error}"))
+        else:
+            if reply["returncode"]:
+                raise subprocess.CalledProcessError(reply["returncode"], ("sphinx-build", *map(str, args)))
+            return
+
+    venv.run("sphinx-build", *args, **({} if stdout is None else dict(stdout=stdout, stderr=subprocess.STDOUT)))
+
+
+@app.command(name="start")
+def start_daemon(
+    env_name: Annotated[str, Option(help="The environment name.")] = DEFAULT_ENVIRONMENT,
+) -> None:
+    """
+    Start the build daemon of an environment.
+    """
+    start(VirtualEnvironment.from_db(env_name))
+
+
+@app.command(name="stop")
+def stop_daemons(
+    env_name: Annotated[OptionalString, Option(help="The environment name, or all environments if not given.")] = None,
+) -> None:
+    """
+    Stop running build daemons.
+    """
+    for path in sorted(DAEMONS.glob(f"{'*' if env_name is None else env_name}.*.sock")):
+        try:
+            request(path, dict(command="stop"))
+            logger.info(dict(action="stop", socket=path))
+        except OSError:
+            logger.warning(dict(action="stop", socket=path, message="removing stale socket"))
+            path.unlink(missing_ok=True)
+
+
+@app.command(name="list")
+def display_daemons() -> None:
+    """
+    List running build daemons.
+    """
+    paths = sorted(DAEMONS.glob("*.sock"))
+    for i, path in enumerate(paths):
+        try:
+            reply = request(path, dict(command="ping"))
+            logger.info(dict(action="list", index=i, socket=path, pid=reply["pid"], executable=reply["executable"]))
+        except OSError:
+            logger.warning(dict(action="list", index=i, socket=path, message="not responding"))
+
+    if not paths:
+        logger.warning(dict(action="list", message="no daemons found"))
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
-import shelve
+import contextlib
+import functools
+import re
 import shutil
 import sys
+import time
 from collections.abc import Generator
-from contextlib import contextmanager
+from collections.abc import Sequence
 from dataclasses import dataclass
+from dataclasses import field
+from enum import Enum
 from pathlib import Path
 from subprocess import CompletedProcess
-from subprocess import DEVNULL
 from typing import Annotated
 from typing import Any
 
@@ -20,15 +24,56 @@ from typer import Typer
 from mdsphinx.config import DEFAULT_ENVIRONMENT
 from mdsphinx.config import DEFAULT_ENVIRONMENT_PACKAGES
 from mdsphinx.config import ENVIRONMENTS
-from mdsphinx.config import ENVIRONMENTS_REGISTRY
+from mdsphinx.config import WHEELHOUSE
 from mdsphinx.logger import logger
 from mdsphinx.logger import run
+from mdsphinx.registry import locked
+from mdsphinx.registry import Record
+from mdsphinx.registry import Registry
+from mdsphinx.registry import snapshot
+from mdsphinx.trace import span
+from mdsphinx.trace import tracing
 from mdsphinx.types import MultipleStrings
+from mdsphinx.types import OptionalPath
 
 
 app = Typer(help="Manage environments.")
 
 
+class Installer(str, Enum):
+    auto = "auto"
+    pip = "pip"
+    uv = "uv"
+
+    def resolve(self) -> Installer:
+        """
+        Pick uv for auto when it is on the path, since it resolves and installs much faster than pip.
+        """
+        if self is not Installer.auto:
+            return self
+        return Installer.uv if shutil.which("uv") is not None else Installer.pip
+
+
+def index_args(installer: Installer, wheelhouse: Path | None = None, offline: bool = False) -> list[str]:
+    """
+    Get the options that make an installer look in the wheelhouse first, and only there and in its own cache when offline.
+    """
+    args = ["--find-links", str(wheelhouse)] if wheelhouse is not None and wheelhouse.is_dir() else []
+    if offline:
+        args.append("--offline" if installer is Installer.uv else "--no-index")
+    return args
+
+
+def is_script(path: Path) -> bool:
+    """
+    Check whether a file of a venv's bin/ names the venv's path, leaving compiled executables alone.
+    """
+    if path.name.startswith("activate"):
+        return True
+    with path.open("rb") as stream:
+        return stream.read(2) == b"#!"
+
+
 @dataclass
 class VirtualEnvironment:
     name: str
@@ -36,11 +81,10 @@ class VirtualEnvironment:
 
     @classmethod
     def from_db(cls, name: str) -> VirtualEnvironment:
-        with environments() as db:
-            venv = cls(name, safe_get_env(db, name))
-            logger.info(f"venv.name: {venv.name}")
-            logger.info(f"venv.path: {venv.path}")
-            return venv
+        venv = cls(name, safe_get_env(snapshot(), name))
+        logger.info(f"venv.name: {venv.name}")
+        logger.info(f"venv.path: {venv.path}")
+        return venv
 
     @classmethod
     def from_name(cls, name: str) -> VirtualEnvironment:
@@ -50,13 +94,34 @@ class VirtualEnvironment:
     def python(self) -> Path:
         return self.path / "bin" / "python"
 
+    @property
+    def site_packages(self) -> Path:
+        try:
+            with self.path.joinpath("pyvenv.cfg").open("r") as stream:
+                for line in stream:
+                    key, _, value = line.partition("=")
+                    if key.strip() in {"version", "version_info"}:
+                        major, minor, *_ = value.strip().split(".")
+                        return self.path / "lib" / f"python{major}.{minor}" / "site-packages"
+        except (OSError, ValueError):
+            pass
+
+        for path in self.path.glob("lib/python*/site-packages"):
+            return path
+        else:
+            return self.path / "lib" / "site-packages"
+
+    @functools.cached_property
+    def capabilities(self) -> Capabilities:
+        return Capabilities.load(self)
+
     def run(self, command: str | Path, *args: str | Path, **kwargs: Any) -> CompletedProcess[str]:
         return run(str(self.path / "bin" / command), *args, **kwargs)
 
     def pyrun(self, package: str | Path, *args: str | Path, **kwargs: Any) -> CompletedProcess[str]:
         return run(str(self.python), "-m", package, *args, **kwargs)
 
-    def create(self, base_python: Path, recreate: bool = False, prompt: bool = True) -> bool:
+    def make_room(self, recreate: bool = False, prompt: bool = True) -> bool:
         if self.path.exists():
             if recreate:
                 if not self.remove(prompt=prompt):
@@ -66,8 +131,51 @@ class VirtualEnvironment:
                 return False
 
         self.path.parent.mkdir(parents=True, exist_ok=True)
+        return True
+
+    def create(self, base_python: Path, recreate: bool = False, prompt: bool = True, installer: Installer = Installer.pip) -> bool:
+        if not self.make_room(recreate=recreate, prompt=prompt):
+            return False
+
+        if installer is Installer.uv:
+            # pip is not seeded, it is installed with the other packages
+            return not bool(run("uv", "venv", "--python", str(base_python), str(self.path)).returncode)
         return not bool(run(str(base_python), "-m", "venv", str(self.path)).returncode)
 
+    def clone(self, other: VirtualEnvironment) -> int:
+        """
+        Copy this environment to the path of the other, hardlinking every file but the scripts and pyvenv.cfg that name its path.
+
+        Installers replace files instead of editing them, so installing into either environment later leaves the other intact.
+        Only the #! scripts and activate scripts of bin/ are rewritten, the files of site-packages keep naming this environment
+        (.pth files, direct_url.json and editable installs), so the clone depends on it staying where it is.
+
+        Returns:
+            The number of files that had to be copied or rewritten.
+        """
+        from mdsphinx.mirror import copy
+        from mdsphinx.mirror import try_link
+
+        old, new = bytes(self.path), bytes(other.path)
+        copied = 0
+        for root, dir_names, file_names in self.path.walk():
+            target = other.path / root.relative_to(self.path)
+            target.mkdir(parents=True, exist_ok=True)
+            for src, dst in ((root / base, target / base) for base in (*dir_names, *file_names)):
+                if src.is_symlink():
+                    link = src.readlink()
+                    dst.symlink_to(other.path / link.relative_to(self.path) if link.is_relative_to(self.path) else link)
+                elif not src.is_file():
+                    continue
+                elif src == self.path / "pyvenv.cfg" or root == self.path / "bin" and is_script(src):
+                    dst.write_bytes(src.read_bytes().replace(old, new))
+                    shutil.copymode(src, dst)
+                    copied += 1
+                elif not try_link(src, dst):
+                    copy(src, dst)
+                    copied += 1
+        return copied
+
     def remove(self, prompt: bool = True) -> bool:
         if self.path.exists():
             if not prompt or confirm(f"Remove {self.path}?", default=False):
@@ -82,22 +190,80 @@ class VirtualEnvironment:
             logger.error(dict(action="remove", name=self.name, path=self.path, message="environment not found"))
             return False
 
-    def install(self, package: str) -> None:
-        self.pyrun("pip", "install", package, "--upgrade")
+    def install(self, *packages: str, installer: Installer = Installer.pip, options: Sequence[str] = ()) -> None:
+        """
+        Install or upgrade the packages together, so that their dependencies are resolved once.
+        """
+        if installer is Installer.uv:
+            run("uv", "pip", "install", "--python", str(self.python), "--upgrade", *options, *packages)
+        else:
+            self.pyrun("pip", "install", "--upgrade", *options, *packages)
+        self.__dict__.pop("capabilities", None)
 
     def has_package(self, package: str) -> bool:
-        return not bool(self.pyrun("pip", "show", package, check=False, stdout=DEVNULL, stderr=DEVNULL, echo=False).returncode)
+        return canonicalize_name(package) in self.capabilities.packages
 
 
-@contextmanager
-def environments() -> Generator[shelve.Shelf[Path]]:
-    with shelve.open(str(ENVIRONMENTS_REGISTRY), writeback=True) as shelf:
-        yield shelf
+def canonicalize_name(name: str) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
 
 
-def safe_get_env(db: shelve.Shelf[Path], name: str) -> Path:
+@dataclass(frozen=True)
+class Capabilities:
+    """
+    A snapshot of the distributions installed in a virtual environment.
+    """
+
+    site_packages: Path
+    stamp: int
+    packages: dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, venv: VirtualEnvironment) -> Capabilities:
+        """
+        Get the cached snapshot, rescanning the site-packages directory if it changed since the last scan.
+        """
+        site_packages = venv.site_packages
+        try:
+            stamp = site_packages.stat().st_mtime_ns
+        except FileNotFoundError:
+            stamp = 0
+
+        record = snapshot().environments.get(venv.name)
+        if record is not None and record.path == venv.path and record.capabilities is not None:
+            cached = cls.from_json(record.capabilities)
+            if cached.site_packages == site_packages and cached.stamp == stamp:
+                return cached
+
+        logger.debug(dict(action="scan", name=venv.name, path=site_packages))
+        fresh = cls.scan(site_packages, stamp)
+        if record is not None and record.path == venv.path:
+            with locked() as registry:
+                if (current := registry.environments.get(venv.name)) is not None and current.path == venv.path:
+                    current.capabilities = fresh.to_json()
+        return fresh
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> Capabilities:
+        return cls(site_packages=Path(data["site_packages"]), stamp=data["stamp"], packages=data["packages"])
+
+    def to_json(self) -> dict[str, Any]:
+        return dict(site_packages=str(self.site_packages), stamp=self.stamp, packages=self.packages)
+
+    @classmethod
+    def scan(cls, site_packages: Path, stamp: int) -> Capabilities:
+        packages: dict[str, str] = {}
+        if site_packages.is_dir():
+            for path in site_packages.iterdir():
+                if path.suffix in {".dist-info", ".egg-info"}:
+                    name, _, version = path.stem.partition("-")
+                    packages[canonicalize_name(name)] = version.split("-")[0]
+        return cls(site_packages, stamp, packages)
+
+
+def safe_get_env(registry: Registry, name: str) -> Path:
     try:
-        return db[name]
+        return registry.environments[name].path
     except KeyError:
         logger.error(dict(action="get", name=name, message="environment not found"))
         logger.error(dict(action="get", name=name, message="use 'mdsphinx env add' to add an existing environment"))
@@ -113,12 +279,12 @@ def add_env(
     """
     Add a new environment to the registry.
     """
-    with environments() as db:
-        if name in db:
+    with locked() as registry:
+        if name in registry.environments:
             logger.warning(dict(action="add", name=name, message="overwriting environment"))
 
         logger.info(dict(action="add", name=name))
-        db[name] = path
+        registry.environments[name] = Record(path=path)
 
 
 @app.command(name="del")
@@ -128,10 +294,10 @@ def del_env(
     """
     Remove an environment from the registry.
     """
-    with environments() as db:
-        if name in db:
+    with locked() as registry:
+        if name in registry.environments:
             logger.info(dict(action="del", name=name))
-            del db[name]
+            del registry.environments[name]
         else:
             logger.warning(dict(action="del", name=name, message="environment not found"))
 
@@ -141,12 +307,11 @@ def display_envs() -> None:
     """
     List all environments in the registry.
     """
-    with environments() as db:
-        if db:
-            for i, (name, path) in enumerate(db.items()):
-                logger.info(dict(action="list", index=i, name=name, path=path))
-        else:
-            logger.warning(dict(action="list", message="no environments found"))
+    if environments := snapshot().environments:
+        for i, (name, record) in enumerate(environments.items()):
+            logger.info(dict(action="list", index=i, name=name, path=record.path))
+    else:
+        logger.warning(dict(action="list", message="no environments found"))
 
 
 @app.command(name="create")
@@ -157,27 +322,113 @@ def create_env(
     recreate: Annotated[bool, Option(help="Recreate the environment?")] = False,
     upgrade: Annotated[bool, Option(help="Upgrade existing libraries?")] = False,
     prompt: Annotated[bool, Option(help="Prompt for removal?")] = True,
+    wheelhouse: Annotated[OptionalPath, Option(help="A folder of wheels to install from before the package index.")] = WHEELHOUSE,
+    offline: Annotated[bool, Option(help="Install only from the wheelhouse and the installer cache?")] = False,
+    installer: Annotated[Installer, Option(help="The installer to use, auto picks uv when it is on the path.")] = Installer.auto,
+    trace: Annotated[OptionalPath, Option(help="Write a Chrome trace of where the time went to this file.")] = None,
 ) -> None:
     """
     Create a new virtual environment with the latest version of sphinx.
     """
+    installer = installer.resolve()
+    options = index_args(installer, wheelhouse, offline)
     venv = VirtualEnvironment.from_name(name)
-    if not venv.create(python, recreate=recreate, prompt=prompt) and not upgrade:
-        return
 
-    # noinspection PyBroadException
+    with tracing(trace, "create"):
+        with timed("create", name, "venv"):
+            created = venv.create(python, recreate=recreate, prompt=prompt, installer=installer)
+        if not created and not upgrade:
+            return
+
+        # noinspection PyBroadException
+        try:
+            with timed("create", name, "install"):
+                venv.install(
+                    "pip",
+                    "sphinx",
+                    *(packages if packages is not None else DEFAULT_ENVIRONMENT_PACKAGES),
+                    installer=installer,
+                    options=options,
+                )
+        except Exception:
+            logger.exception(dict(action="create", name=name, message="unhandled exception"))
+            venv.remove(prompt=False)
+            return
+
+    add_env(name, venv.path)
+
+
+@contextlib.contextmanager
+def timed(action: str, name: str, phase: str) -> Generator[None]:
+    start = time.perf_counter()
     try:
-        venv.install("pip")
-        venv.install("sphinx")
-        for package in packages if packages is not None else DEFAULT_ENVIRONMENT_PACKAGES:
-            venv.install(package)
-    except Exception:
-        logger.exception(dict(action="create", name=name, message="unhandled exception"))
-        venv.remove(prompt=False)
+        with span(phase):
+            yield
+    finally:
+        logger.info(dict(action=action, name=name, phase=phase, seconds=round(time.perf_counter() - start, 2)))
+
+
+@app.command(name="clone")
+def clone_env(
+    name: Annotated[str, Option(help="The name of the new environment.")],
+    source: Annotated[str, Option(help="The registered environment to clone.")] = DEFAULT_ENVIRONMENT,
+    packages: Annotated[MultipleStrings, Option("--package", help="Extra packages to install on top.")] = None,
+    recreate: Annotated[bool, Option(help="Recreate the environment?")] = False,
+    prompt: Annotated[bool, Option(help="Prompt for removal?")] = True,
+    wheelhouse: Annotated[OptionalPath, Option(help="A folder of wheels to install from before the package index.")] = WHEELHOUSE,
+    offline: Annotated[bool, Option(help="Install only from the wheelhouse and the installer cache?")] = False,
+    installer: Annotated[Installer, Option(help="The installer to use, auto picks uv when it is on the path.")] = Installer.auto,
+    trace: Annotated[OptionalPath, Option(help="Write a Chrome trace of where the time went to this file.")] = None,
+) -> None:
+    """
+    Create a new virtual environment from a registered one, sharing its installed files through hardlinks.
+    """
+    installer = installer.resolve()
+    base = VirtualEnvironment.from_db(source)
+    venv = VirtualEnvironment.from_name(name)
+    if not venv.make_room(recreate=recreate, prompt=prompt):
+        return
+
+    with tracing(trace, "clone"):
+        # noinspection PyBroadException
+        try:
+            with timed("clone", name, "clone"):
+                copied = base.clone(venv)
+            logger.info(dict(action="clone", name=name, source=source, copied=copied))
+            if packages:
+                with timed("clone", name, "install"):
+                    venv.install(*packages, installer=installer, options=index_args(installer, wheelhouse, offline))
+        except Exception:
+            logger.exception(dict(action="clone", name=name, message="unhandled exception"))
+            venv.remove(prompt=False)
+            return
 
     add_env(name, venv.path)
 
 
+@app.command(name="download")
+def download_wheels(
+    python: Annotated[Path, Option(help="The python executable the wheels are for.")] = Path(sys.executable),
+    packages: Annotated[MultipleStrings, Option("--package", help="Extra packages to download.")] = None,
+    wheelhouse: Annotated[Path, Option(help="The folder to download the wheels to.")] = WHEELHOUSE,
+) -> None:
+    """
+    Download the wheels of an environment and their dependencies, so that it can be created offline.
+    """
+    wheelhouse.mkdir(parents=True, exist_ok=True)
+    run(
+        str(python),
+        "-m",
+        "pip",
+        "download",
+        "--dest",
+        str(wheelhouse),
+        "pip",
+        "sphinx",
+        *(packages if packages is not None else DEFAULT_ENVIRONMENT_PACKAGES),
+    )
+
+
 @app.command(name="remove")
 def remove_env(
     name: Annotated[str, Option(help="The environment name.")] = DEFAULT_ENVIRONMENT,
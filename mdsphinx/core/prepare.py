@@ -2,36 +2,52 @@ from __future__ import annotations
 
 import dataclasses
 import functools
-import shutil
+import logging
+import multiprocessing
+import os
 import textwrap
-from collections.abc import Callable
+import traceback
 from collections.abc import Generator
 from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from string import ascii_uppercase
 from typing import Annotated
 from typing import Any
-from typing import cast
 from typing import ClassVar
+from typing import TYPE_CHECKING
 
-import networkx as nx
-from jinja2 import Environment
-from jinja2 import PackageLoader
-from jinja2 import StrictUndefined
-from jinja2_mermaid_extension import MermaidExtension
-from jinja2_mermaid_extension import TikZExtension
-from natsort import os_sorted
 from typer import Option
 
+from mdsphinx.bytecode import template_cache
 from mdsphinx.config import DEFAULT_ENVIRONMENT
+from mdsphinx.config import DIAGRAM_JOBS
+from mdsphinx.config import DIAGRAM_TIMEOUT
 from mdsphinx.config import NOW
 from mdsphinx.config import TMP_ROOT
 from mdsphinx.core.environment import VirtualEnvironment
 from mdsphinx.core.quickstart import sphinx_quickstart
 from mdsphinx.logger import logger
+from mdsphinx.manifest import digest_context
+from mdsphinx.manifest import digest_file
+from mdsphinx.manifest import Entry
+from mdsphinx.manifest import Manifest
+from mdsphinx.mirror import mirror
+from mdsphinx.mirror import MirrorMode
+from mdsphinx.scheduler import Job
+from mdsphinx.scheduler import scheduler
 from mdsphinx.tempdir import get_out_root
+from mdsphinx.trace import count
+from mdsphinx.trace import peak_memory
+from mdsphinx.trace import span
+from mdsphinx.trace import tracer
+from mdsphinx.trace import tracing
 from mdsphinx.types import OptionalPath
 
+if TYPE_CHECKING:
+    from jinja2 import Environment
+    from jinja2 import Template
+
 
 EPILOG = ""
 
@@ -43,46 +59,94 @@ def prepare(
     tmp_root: Annotated[Path, Option(help="The directory for temporary output.")] = TMP_ROOT,
     overwrite: Annotated[bool, Option(help="Force creation of new output folder in --tmp-root?")] = False,
     reconfigure: Annotated[bool, Option(help="Remove existing sphinx conf.py file?")] = False,
-) -> None:
+    jobs: Annotated[int, Option("--jobs", "-j", min=1, help="The number of parallel render jobs.")] = 1,
+    mirror_mode: Annotated[MirrorMode, Option("--mirror", help="How to mirror resources to the output.")] = MirrorMode.copy,
+    diagram_jobs: Annotated[int, Option(min=1, help="The number of diagram jobs to run at once.")] = DIAGRAM_JOBS,
+    diagram_timeout: Annotated[float, Option(min=0, help="Seconds before a diagram job is killed, 0 for no limit.")] = DIAGRAM_TIMEOUT,
+    trace: Annotated[OptionalPath, Option(help="Write a Chrome trace of where the time went to this file.")] = None,
+) -> Renderer:
     """
     Preprocess the input files.
     """
+    from mdsphinx.diagrams import wait_for_diagrams
+
     inp = inp.resolve()
     tmp_root = tmp_root.resolve()
-    out_root = get_out_root(inp.name, root=tmp_root)
 
     if not inp.exists():
         raise FileNotFoundError(inp)
 
-    venv = VirtualEnvironment.from_db(env_name)
-    sphinx_quickstart(inp, out_root, venv, remove=reconfigure)
+    scheduler().configure(diagram_jobs, diagram_timeout)
 
-    if context is None:
-        for root in (inp.parent, Path.cwd()):
-            for base in ("context.yml", "context.yaml"):
-                path = root / base
-                if path.exists():
-                    context = path
-                    break
-
-    renderer = Renderer.create(
-        context=context,
-        inp_path=inp if inp.is_file() else None,
-        inp_root=inp if inp.is_dir() else inp.parent,
-        out_root=get_out_root(inp.name, root=tmp_root, overwrite=overwrite),
-    )
+    with tracing(trace, "prepare"), span("prepare"):
+        out_root = get_out_root(inp, root=tmp_root, overwrite=overwrite)
+
+        with span("venv"):
+            venv = VirtualEnvironment.from_db(env_name)
+
+        with span("quickstart"):
+            sphinx_quickstart(inp, out_root, venv, remove=reconfigure)
+
+        with span("context"):
+            renderer = Renderer.create(
+                context=context if context is not None else find_context(inp),
+                inp_path=inp if inp.is_file() else None,
+                inp_root=inp if inp.is_dir() else inp.parent,
+                out_root=out_root,
+                mirror_mode=mirror_mode,
+            )
+
+        with span("render", jobs=jobs):
+            renderer.render(jobs=jobs)
 
-    renderer.render()
-    renderer.create_index()
+        with span("index"):
+            renderer.create_index()
+
+        with span("diagrams"):
+            try:
+                wait_for_diagrams()
+            except BaseException:
+                renderer.forget_missing_diagrams()
+                raise
 
     if not renderer.index.exists():
         raise FileNotFoundError(renderer.index)
 
+    return renderer
+
+
+def find_context(inp: Path) -> Path | None:
+    for root in (inp.parent, Path.cwd()):
+        for base in ("context.yml", "context.yaml"):
+            path = root / base
+            if path.exists():
+                return path
+    return None
+
 
-@functools.lru_cache(maxsize=1)
-def env() -> Environment:
-    instance = Environment(
-        loader=PackageLoader("mdsphinx", "templates"), undefined=StrictUndefined, extensions=[MermaidExtension, TikZExtension]
+@functools.lru_cache(maxsize=8)
+def env(inp_root: Path | None = None) -> Environment:
+    """
+    Get the environment that renders the sources below inp_root, where templates are looked up in inp_root first.
+    """
+    from jinja2 import BaseLoader
+    from jinja2 import ChoiceLoader
+    from jinja2 import FileSystemLoader
+    from jinja2 import PackageLoader
+    from jinja2 import StrictUndefined
+
+    from mdsphinx.context import TrackingEnvironment
+    from mdsphinx.diagrams import MermaidExtension
+    from mdsphinx.diagrams import TikZExtension
+
+    loader: BaseLoader = PackageLoader("mdsphinx", "templates")
+    if inp_root is not None:
+        loader = ChoiceLoader([FileSystemLoader(inp_root), loader])
+    instance = TrackingEnvironment(
+        loader=loader,
+        undefined=StrictUndefined,
+        extensions=[MermaidExtension, TikZExtension],
+        bytecode_cache=template_cache().bytecode_cache(),
     )
     instance.globals["indent"] = indent
     instance.globals["titleize"] = titleize
@@ -104,25 +168,64 @@ def titleize(s: str, c: str | int = 0, exclude_if: bool = False) -> str:
     return f"{c * len(s.strip())}\n{s.strip()}\n{c * len(s.strip())}"
 
 
+@dataclasses.dataclass(frozen=True)
+class IndexEntry:
+    """
+    One line of a toctree, with the path of the document relative to the directory of the index.
+
+    Sorting by the relative path gives the same order as sorting by the full path, at a fraction of the cost.
+    """
+
+    path: str
+    title: str
+    target: str
+
+
+@dataclasses.dataclass
+class IndexNode:
+    """
+    A directory of the generated index with the sources and subdirectories listed in its toctree.
+    """
+
+    path: Path
+    title: str
+    depth: int
+    entries: list[IndexEntry] = dataclasses.field(default_factory=list)
+
+
 @dataclasses.dataclass(frozen=True)
 class Renderer:
     inp_root: Path
     out_root: Path
     inp_path: Path | None = None
     context: dict[str, Any] = dataclasses.field(default_factory=dict)
+    mirror_mode: MirrorMode = MirrorMode.copy
 
     SOURCES: ClassVar[frozenset[str]] = frozenset({".md", ".markdown", ".rst", ".txt"})
     RESOURCES: ClassVar[frozenset[str]] = frozenset({".png", ".jpg", ".jpeg", ".gif", ".svg", ".pdf", ".html"})
     EXCLUDED_NAMES: ClassVar[frozenset[str]] = frozenset(
         {".git", ".github", ".vscode", "__pycache__", ".venv", "venv", ".idea", "_static", "_templates"}
     )
+    VOLATILE_KEYS: ClassVar[frozenset[str]] = frozenset({"date", "time"})
+    # the variables set for each source, which never come from the context file
+    INJECTED_KEYS: ClassVar[frozenset[str]] = frozenset(
+        {"source", "tikz_input_root", "tikz_output_root", "mermaid_input_root", "mermaid_output_root"}
+    )
+    WRITE_BUFFER_SIZE: ClassVar[int] = 2**20
 
     @property
     def index(self) -> Path:
         path = self.out_root.joinpath("source", "index.md")
         return path if path.exists() else path.with_suffix(".rst")
 
-    def render(self) -> None:
+    @functools.cached_property
+    def manifest(self) -> Manifest:
+        return Manifest.load(self.out_root)
+
+    def render(self, jobs: int = 1) -> None:
+        if jobs < 1:
+            raise ValueError(f"Can not render with {jobs} jobs, expected at least 1")
+
         logger.info("inp_path: %s", self.inp_path)
         logger.info("inp_root: %s", self.inp_root)
         logger.info("out_root: %s", self.out_root)
@@ -130,8 +233,176 @@ class Renderer:
         self.out_root.mkdir(parents=True, exist_ok=True)
         self._render_content(".gitignore", "*\n", render=False)
 
+        if changed := self.manifest.invalidate(digest_context(self.context, exclude=self.VOLATILE_KEYS)):
+            logger.info(f"context changed: {', '.join(sorted(changed))}")
+
+        if changed := self.manifest.invalidate_templates(self._digest_templates(self.manifest.templates)):
+            logger.info(f"templates changed: {', '.join(sorted(changed))}")
+
+        seen: set[str] = set()
+        try:
+            if jobs == 1:
+                seen.update(map(self._render_path, self._get_input_paths()))
+            else:
+                seen.update(self._render_parallel(self._get_input_paths(), jobs=jobs))
+
+            for path in self.manifest.prune(seen):
+                logger.info(f"removed: {path}")
+                path.unlink(missing_ok=True)
+        finally:
+            self._save_manifest()
+
+        cache = template_cache()
+        logger.info(f"template cache: {cache.hits} hits, {cache.misses} misses")
+        cache.evict()
+
+    def update(self, paths: Iterable[Path]) -> bool:
+        """
+        Render the changed input paths and remove the outputs of deleted ones, regenerating the index if sources come or go.
+
+        Returns:
+            True if any output was changed.
+        """
+        from natsort import os_sorted
+
+        before = dict(self.manifest.entries)
+        try:
+            for path in os_sorted({*paths, *self._get_dependents(paths)}):
+                self._update_path(path)
+        finally:
+            self._save_manifest()
+
+        after = self.manifest.entries
+        if {k for k, v in before.items() if v.kind == "source"} != {k for k, v in after.items() if v.kind == "source"}:
+            self.create_index()
+
+        return any(before.get(key) is not after.get(key) for key in before.keys() | after.keys())
+
+    def _get_dependents(self, paths: Iterable[Path]) -> Generator[Path]:
+        """
+        Yield the sources that include one of the paths, marking them to be rendered again.
+        """
+        names = {path.relative_to(self.inp_root).as_posix() for path in paths if path.is_relative_to(self.inp_root)}
+        for key, entry in self.manifest.entries.items():
+            if not names.isdisjoint(entry.templates):
+                entry.volatile = True
+                yield self.inp_root / key
+
+    def _digest_templates(self, names: Iterable[str]) -> dict[str, str]:
+        digests: dict[str, str] = {}
+        for name in names:
+            try:
+                digests[name] = digest_file(self.inp_root / name)
+            except OSError:
+                digests[name] = ""
+        return digests
+
+    def forget_missing_diagrams(self) -> list[Path]:
+        """
+        Forget the sources whose diagrams were not generated, after a diagram job failed, so that the next run renders them again.
+
+        Returns:
+            The input paths of the forgotten sources.
+        """
+        forgotten: list[Path] = []
+        for key, entry in list(self.manifest.entries.items()):
+            if self._has_missing_diagrams(entry):
+                logger.info(f"forget: {key}")
+                del self.manifest.entries[key]
+                forgotten.append(self.inp_root / key)
+        self._save_manifest()
+        return forgotten
+
+    def _has_missing_diagrams(self, entry: Entry) -> bool:
+        return any(not self.out_root.joinpath(diagram).exists() for diagram in entry.diagrams)
+
+    def _save_manifest(self) -> None:
+        names = {name for entry in self.manifest.entries.values() for name in entry.templates}
+        self.manifest.templates = self._digest_templates(names)
+        self.manifest.save()
+
+    def _update_path(self, path: Path) -> None:
+        from natsort import os_sorted
+
+        if path.is_dir():
+            for child in os_sorted(path.rglob("*")):
+                if child.is_file() and self._is_input_path(child):
+                    self._render_path(child)
+        elif path.is_file():
+            if self._is_input_path(path):
+                self._render_path(path)
+        elif path.is_relative_to(self.inp_root):
+            for output in self.manifest.forget(path.relative_to(self.inp_root).as_posix()):
+                logger.info(f"removed: {output}")
+                output.unlink(missing_ok=True)
+
+    def _render_path(self, path: Path) -> str:
+        if path.suffix.lower() in self.SOURCES:
+            return self._render_source(path)
+        else:
+            return self._render_resource(path)
+
+    def _render_parallel(self, paths: Iterable[Path], jobs: int) -> list[str]:
+        """
+        Render the paths in worker processes, replaying their logs and manifest entries in submission order.
+        """
+        keys: list[str] = []
+        # never fork, the caller may be running threads of its own, such as the builds of batch
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=multiprocessing.get_context(method),
+            initializer=_init_worker,
+            initargs=(self, logging.getLogger().getEffectiveLevel(), tracer().enabled),
+        ) as executor:
+            futures = [executor.submit(_render_in_worker, path) for path in paths]
+            try:
+                for future in futures:
+                    result = future.result()
+                    for record in result.records:
+                        logging.getLogger(record.name).handle(record)
+                    if result.error is not None:
+                        raise result.error
+                    if result.entry is not None:
+                        self.manifest.entries[result.key] = result.entry
+                    template_cache().hits += result.hits
+                    template_cache().misses += result.misses
+                    for job in result.jobs:
+                        scheduler().submit(job)
+                    for name, n in result.counts.items():
+                        count(name, n)
+                    keys.append(result.key)
+            except BaseException:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+        return keys
+
+    def is_excluded_dir(self, path: Path) -> bool:
+        return path.name.startswith(".") or path.name in self.EXCLUDED_NAMES or path == self.out_root
+
+    def is_unwatched_dir(self, path: Path) -> bool:
+        # partials are kept in _templates, which is not rendered but holds what the sources include
+        return self.is_excluded_dir(path) and path.name != "_templates"
+
+    def _is_input_path(self, path: Path) -> bool:
+        """
+        Check if a file would be found by walking the input root.
+        """
+        if not path.is_relative_to(self.inp_root):
+            return False
+
+        if any(self.is_excluded_dir(self.inp_root / parent) for parent in path.relative_to(self.inp_root).parents[:-1]):
+            return False
+
+        if path.suffix.lower() in self.SOURCES:
+            return self.inp_path is None or path == self.inp_path
+
+        return path.suffix in self.RESOURCES and (self.inp_path is None or path.parent == self.inp_root)
+
+    def _get_input_paths(self) -> Generator[Path]:
         for root, d_bases, f_bases in self.inp_root.walk():
-            if root.name.startswith(".") or root.name in self.EXCLUDED_NAMES or root == self.out_root:
+            if self.is_excluded_dir(root):
                 d_bases[:] = []
                 continue
 
@@ -142,10 +413,10 @@ class Renderer:
                     if self.inp_path is not None and path != self.inp_path:
                         continue
 
-                    self._render_source(path)
+                    yield path
 
                 elif path.suffix in self.RESOURCES:
-                    self._render_resource(path)
+                    yield path
 
             if self.inp_path is not None:
                 break
@@ -160,88 +431,49 @@ class Renderer:
         ):
             return
 
-        graph = self._make_source_graph(self.index.parent)
-        for node, data in graph.nodes(data=True):
-            if data["type"] == "D":
-                rendered = (
-                    env()
-                    .get_template("index.rst.jinja")
-                    .render(
-                        title=data["title"],
-                        depth=data["depth"],
-                        documents=os_sorted(self._get_documents(graph, node), key=lambda x: x[0]),
-                    )
-                )
-                index = data["path"].joinpath("index.rst")
-                logger.info("generate: %s", index)
-                with index.open("w") as stream:
-                    stream.write(rendered)
-
-    @staticmethod
-    def _get_documents(graph: nx.DiGraph, top_node: Path) -> Any:
-        for fp in cast(Callable[[Any], Iterable[Any]], graph.successors)(top_node):
-            d = graph.nodes[fp]
-            if d["type"] == "S":
-                yield fp, d
-            elif d["type"] == "D":
-                yield fp.joinpath("index.rst"), d
-
-    def _make_source_graph(self, top: Path) -> nx.DiGraph:  # noqa: C901
-        graph = nx.DiGraph()
+        from natsort import os_sorted
 
+        for node in self._make_source_tree(self.index.parent):
+            rendered = (
+                env()
+                .get_template("index.rst.jinja")
+                .render(title=node.title, depth=node.depth, documents=os_sorted(node.entries, key=lambda entry: entry.path))
+            )
+            index = node.path.joinpath("index.rst")
+            if index.exists() and index.read_text() == rendered:
+                logger.debug("unchanged: %s", index)
+                continue
+            logger.info("generate: %s", index)
+            with index.open("w") as stream:
+                stream.write(rendered)
+
+    def _make_source_tree(self, top: Path) -> list[IndexNode]:
+        """
+        Walk the sources once, then add each directory with sources to its parent, bottom up.
+
+        Returns:
+            The directories that need an index, parents before children.
+        """
+        nodes = {top: IndexNode(path=top, title=self.inp_root.name, depth=0)}
         for root, dir_names, file_names in top.walk(top_down=True):
-            # get depth
-            depth = len(root.relative_to(top).parts)
+            node = nodes[root]
 
-            # ensure root node
-            if root not in graph:
-                title = str(self.inp_root.name)
-                graph.add_node(root, type="D", path=root, depth=depth, title=title, target=root.with_suffix(""))
-
-            # add valid dir nodes
             dir_names[:] = [d for d in dir_names if d not in self.EXCLUDED_NAMES]
             for base in dir_names:
-                path = root / base
-                if path not in graph:
-                    graph.add_node(
-                        path,
-                        type="D",
-                        path=path,
-                        depth=depth + 1,
-                        title=path.name,
-                        target=path.joinpath("index").relative_to(root),
-                    )
-                    graph.add_edge(root, path)
-
-            # add valid source nodes
+                nodes[root / base] = IndexNode(path=root / base, title=base, depth=node.depth + 1)
+
             for base in file_names:
-                if base in {"index.md", "index.rst"}:
-                    continue
+                stem, suffix = os.path.splitext(base)
+                if base not in {"index.md", "index.rst"} and suffix.lower() in self.SOURCES:
+                    node.entries.append(IndexEntry(path=base, title=stem, target=stem))
 
-                path = root / base
-                if path.suffix.lower() in self.SOURCES:
-                    graph.add_node(
-                        path,
-                        type="S",
-                        path=path,
-                        depth=depth + 1,
-                        title=path.with_suffix("").name,
-                        target=path.relative_to(root).with_suffix(""),
-                    )
-                    graph.add_edge(root, path)
-
-        # prune directory with zero content
-        to_remove = set()
-        for node, data in graph.nodes(data=True):
-            if data["type"] == "D":
-                if not any(
-                    graph.nodes[n]["type"] == "S" for n in cast(Callable[[Any, Any], Iterable[Any]], nx.descendants)(graph, node)
-                ):
-                    to_remove.add(node)
-
-        graph.remove_nodes_from(to_remove)
-
-        return graph
+        # children come after their parents, so walking backwards sees every child before its parent
+        for node in reversed(nodes.values()):
+            if node.entries and node.path != top:
+                entry = IndexEntry(path=f"{node.title}/index.rst", title=node.title, target=f"{node.title}/index")
+                nodes[node.path.parent].entries.append(entry)
+
+        return [node for node in nodes.values() if node.entries]
 
     @classmethod
     def _get_index_paths(cls, top: Path, recursive: bool = False) -> Generator[Path]:
@@ -278,21 +510,9 @@ class Renderer:
         if context is None:
             return {}
 
-        match context.suffix.lower():
-            case ".json":
-                import json
+        from mdsphinx.context import load_context
 
-                with context.open("r") as stream:
-                    data: dict[str, Any] = json.load(stream)
-                    return {} if not isinstance(data, dict) else data
-            case ".yaml" | ".yml":
-                import yaml
-
-                with context.open("r") as stream:
-                    data = yaml.load(stream, Loader=yaml.FullLoader)
-                    return {} if not isinstance(data, dict) else data
-            case _:
-                raise ValueError(f"Can not load context from {context}")
+        return load_context(context)
 
     def _render_content(self, stem: Path | str, content: str, render: bool = False) -> None:
         out_path = self.out_root / stem
@@ -315,15 +535,54 @@ class Renderer:
         with out_path.open("w") as stream:
             stream.write(rendered)
 
-    def _render_source(self, source: Path) -> None:
-        out_path = self.out_root.joinpath("source") / source.relative_to(self.inp_root)
+    def _is_unchanged(self, key: str, out_path: Path, stat: os.stat_result, digest: str | None = None) -> bool:
+        """
+        Check the manifest to see if the input was already rendered to an output that still exists, with all its diagrams.
+        """
+        if (entry := self.manifest.entries.get(key)) is None or entry.volatile or not out_path.exists():
+            return False
+
+        if self._has_missing_diagrams(entry):
+            return False
+
+        if entry.matches(stat):
+            return True
+
+        if digest is not None and entry.digest == digest:
+            entry.size, entry.mtime_ns = stat.st_size, stat.st_mtime_ns
+            return True
+
+        return False
+
+    def _render_source(self, source: Path) -> str:
+        key = source.relative_to(self.inp_root).as_posix()
+        out_path = self.out_root.joinpath("source") / key
+        stat = source.stat()
+
+        if self._is_unchanged(key, out_path, stat):
+            logger.debug(f"unchanged: {out_path}")
+            return key
+
+        digest = digest_file(source)
+        if self._is_unchanged(key, out_path, stat, digest):
+            logger.debug(f"unchanged: {out_path}")
+            return key
+
         logger.info(f"rendered: {out_path}")
+        count("files rendered")
         out_path.parent.mkdir(parents=True, exist_ok=True)
 
-        with source.open("r") as stream:
-            template = env().from_string(stream.read())
-            rendered = template.render(
-                **self.context,
+        from mdsphinx.context import recording
+
+        with peak_memory(key), recording() as reads:
+            # the source is digested from the file and only held as the string that is compiled, until its template is ready
+            with source.open(encoding="utf-8", newline="") as stream:
+                text = stream.read()
+            template, names = template_cache().from_string(env(self.inp_root), text)
+            del text
+            self._stream_template(
+                template,
+                out_path,
                 source=source,
                 tikz_input_root=source.parent,
                 tikz_output_root=out_path.parent,
@@ -331,11 +590,125 @@ class Renderer:
                 mermaid_output_root=out_path.parent,
             )
 
-        with out_path.open("w") as stream:
-            stream.write(rendered)
+        self.manifest.entries[key] = Entry(
+            kind="source",
+            digest=digest,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            outputs=[out_path.relative_to(self.out_root).as_posix()],
+            volatile=not self.VOLATILE_KEYS.isdisjoint(names | reads.names),
+            keys=sorted((names | reads.names) - self.INJECTED_KEYS),
+            templates=sorted(p.relative_to(self.inp_root).as_posix() for p in reads.templates if p.is_relative_to(self.inp_root)),
+            diagrams=sorted(p.relative_to(self.out_root).as_posix() for p in reads.diagrams if p.is_relative_to(self.out_root)),
+        )
+
+        return key
+
+    def _stream_template(self, template: Template, out_path: Path, **kwargs: Any) -> None:
+        """
+        Write the output in chunks as it is rendered, so that a large output is never held in memory as a whole.
+
+        The chunks go to a temporary file that replaces the output once complete, so a failure never leaves a partial output.
+        """
+        tmp_path = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+        try:
+            with tmp_path.open("w", buffering=self.WRITE_BUFFER_SIZE) as stream:
+                stream.writelines(template.generate(**self.context, **kwargs))
+            os.replace(tmp_path, out_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def _render_resource(self, resource: Path) -> str:
+        key = resource.relative_to(self.inp_root).as_posix()
+        out_path = self.out_root.joinpath("source") / key
+        stat = resource.stat()
+
+        if self._is_unchanged(key, out_path, stat):
+            logger.debug(f"unchanged: {out_path}")
+            return key
+
+        digest = digest_file(resource)
+        if self._is_unchanged(key, out_path, stat, digest):
+            logger.debug(f"unchanged: {out_path}")
+            return key
 
-    def _render_resource(self, resource: Path) -> None:
-        out_path = self.out_root.joinpath("source") / resource.relative_to(self.inp_root)
         logger.info(f"mirror: {out_path}")
         out_path.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy(resource, out_path)
+        count("files mirrored")
+        count("bytes copied", mirror(resource, out_path, mode=self.mirror_mode, digest=digest))
+
+        self.manifest.entries[key] = Entry(
+            kind="resource",
+            digest=digest,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            outputs=[out_path.relative_to(self.out_root).as_posix()],
+        )
+
+        return key
+
+
+class _RecordBuffer(logging.Handler):
+    def __init__(self, level: int) -> None:
+        super().__init__(level)
+        self.records: list[logging.LogRecord] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        record.msg, record.args, record.exc_info, record.exc_text = record.getMessage(), None, None, None
+        self.records.append(record)
+
+
+@dataclasses.dataclass(frozen=True)
+class _WorkerResult:
+    key: str
+    entry: Entry | None
+    records: list[logging.LogRecord]
+    error: Exception | None = None
+    hits: int = 0
+    misses: int = 0
+    jobs: list[Job] = dataclasses.field(default_factory=list)
+    counts: dict[str, int] = dataclasses.field(default_factory=dict)
+
+
+_worker: tuple[Renderer, _RecordBuffer] | None = None
+
+
+def _init_worker(renderer: Renderer, level: int, trace: bool) -> None:
+    global _worker
+    buffer = _RecordBuffer(level)
+    logging.root.handlers[:] = [buffer]
+    logging.root.setLevel(level)
+    scheduler().deferred = True
+    # spans stay in the worker, only the counts are sent back to the parent, without those inherited from it
+    tracer().enabled = trace
+    tracer().drain()
+    _worker = renderer, buffer
+
+
+def _render_in_worker(path: Path) -> _WorkerResult:
+    import jinja2_mermaid_extension.base
+
+    assert _worker is not None, "worker was not initialized"
+    renderer, buffer = _worker
+    buffer.records = []
+    cache = template_cache()
+    cache.hits = cache.misses = 0
+    key = path.relative_to(renderer.inp_root).as_posix()
+    try:
+        key = renderer._render_path(path)
+        jinja2_mermaid_extension.base.runner().wait()
+    except Exception as error:
+        error.add_note(traceback.format_exc())
+        scheduler().drain()
+        tracer().drain()
+        return _WorkerResult(key, None, buffer.records, error)
+
+    return _WorkerResult(
+        key,
+        renderer.manifest.entries.get(key),
+        buffer.records,
+        hits=cache.hits,
+        misses=cache.misses,
+        jobs=scheduler().drain(),
+        counts=tracer().drain(),
+    )
@@ -1,25 +1,39 @@
 import dataclasses
 import shutil
-import webbrowser
+import subprocess
 from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from pathlib import Path
 from typing import Annotated
+from typing import Any
+from typing import IO
+from typing import TypeVar
 
-import jinja2_mermaid_extension.base
 from typer import Option
 
 from mdsphinx.config import DEFAULT_ENVIRONMENT
+from mdsphinx.config import DIAGRAM_JOBS
+from mdsphinx.config import DIAGRAM_TIMEOUT
 from mdsphinx.config import LATEX_COMMAND
 from mdsphinx.config import TMP_ROOT
+from mdsphinx.core.cache import auto_evict
+from mdsphinx.core.daemon import sphinx_build
 from mdsphinx.core.environment import VirtualEnvironment
 from mdsphinx.core.prepare import prepare
+from mdsphinx.latex import run_latex
 from mdsphinx.logger import logger
-from mdsphinx.logger import run
-from mdsphinx.tempdir import get_out_root
+from mdsphinx.mirror import mirror
+from mdsphinx.mirror import MirrorMode
+from mdsphinx.tempdir import find_out_root
+from mdsphinx.trace import span
+from mdsphinx.trace import tracing
 from mdsphinx.types import OptionalPath
 
 
+T = TypeVar("T")
+
+
 class Format(Enum):
     pdf = "pdf"
     html = "html"
@@ -95,6 +109,7 @@ Examples
 mdsphinx process example.md  --to pdf  --using latex --as example.pdf
 mdsphinx process example.rst --to html --using default --as example.html
 mdsphinx process ./directory --to html --using single-page --as example.html
+mdsphinx process ./directory --to html --to pdf --using default --using latex --as example.pdf
 """.replace(
     "\n", "\n\n"
 )
@@ -102,8 +117,8 @@ mdsphinx process ./directory --to html --using single-page --as example.html
 
 def process(  # noqa: C901
     inp: Annotated[Path, "The input path or directory with markdown files."],
-    format_key: Annotated[Format, Option("--to", help="The desired format.")] = Format.pdf,
-    builder_key: Annotated[str, Option("--using", help="The desired builder.")] = "default",
+    format_keys: Annotated[list[Format], Option("--to", help="The desired format, repeat to build several.")] = [Format.pdf],
+    builder_keys: Annotated[list[str], Option("--using", help="The desired builder, once or once per --to.")] = ["default"],
     out: Annotated[OptionalPath, Option("--as", help="The desired builder.")] = None,
     env_name: Annotated[str, Option(help="The environment name.")] = DEFAULT_ENVIRONMENT,
     tmp_root: Annotated[Path, Option(help="The directory for temporary output.")] = TMP_ROOT,
@@ -112,68 +127,216 @@ def process(  # noqa: C901
     show_output: Annotated[bool, Option(help="Open the generated output file?")] = False,
     just_build: Annotated[bool, Option(help="Just build the output without preparing the sources?")] = False,
     just_check_connection: Annotated[bool, Option(help="Just check the connection to the publish endpoint and exit?")] = False,
+    jobs: Annotated[int, Option("--jobs", "-j", min=1, help="The number of parallel render jobs.")] = 1,
+    mirror_mode: Annotated[MirrorMode, Option("--mirror", help="How to mirror resources to the output.")] = MirrorMode.copy,
+    diagram_jobs: Annotated[int, Option(min=1, help="The number of diagram jobs to run at once.")] = DIAGRAM_JOBS,
+    diagram_timeout: Annotated[float, Option(min=0, help="Seconds before a diagram job is killed, 0 for no limit.")] = DIAGRAM_TIMEOUT,
+    daemon: Annotated[bool, Option(help="Build with a warm sphinx daemon of the environment?")] = False,
+    trace: Annotated[OptionalPath, Option(help="Write a Chrome trace of where the time went to this file.")] = None,
 ) -> None:
     """
     Render markdown to the desired format.
     """
     inp = inp.resolve()
     tmp_root = tmp_root.resolve()
-    out_root = get_out_root(inp.name, root=tmp_root)
 
     if not inp.exists():
         raise FileNotFoundError(inp)
 
+    targets = get_targets(format_keys, builder_keys)
+
+    with tracing(trace, "process"):
+        if just_build:
+            out_root = find_out_root(inp, root=tmp_root)
+        else:
+            out_root = prepare(
+                inp=inp,
+                env_name=env_name,
+                tmp_root=tmp_root,
+                overwrite=overwrite,
+                reconfigure=reconfigure,
+                jobs=jobs,
+                mirror_mode=mirror_mode,
+                diagram_jobs=diagram_jobs,
+                diagram_timeout=diagram_timeout,
+            ).out_root
+
+        if not out_root.joinpath("source").exists():
+            raise FileNotFoundError(out_root)
+
+        with span("venv"):
+            venv = VirtualEnvironment.from_db(env_name)
+
+        if Format.confluence in format_keys:
+            with span("connection-test"):
+                venv.run(
+                    "python", "-m", "sphinxcontrib.confluencebuilder", "connection-test", "--work-dir", out_root.joinpath("source")
+                )
+            if just_check_connection:
+                return
+
+        build_many(out_root, venv, targets, daemon=daemon)
+
+        for format_key, builder_key in targets:
+            builder = get_builder(format_key, builder_key)
+
+            if out is not None and (builder.export or len(targets) == 1):
+                with span("export", format=format_key.value, builder=builder_key):
+                    export(out_root, format_key, builder_key, out, top=tmp_root)
+
+            if show_output:
+                if builder.output is not None:
+                    open_url(url=builder.output(out_root), top=tmp_root)
+                else:
+                    raise NotImplementedError(f"Cant open {format_key.value} output.")
+
+        with span("evict"):
+            auto_evict()
+
+
+def get_targets(format_keys: list[Format], builder_keys: list[str]) -> list[tuple[Format, str]]:
+    if len(builder_keys) == 1:
+        builder_keys = builder_keys * len(format_keys)
+
+    if len(builder_keys) != len(format_keys):
+        raise ValueError("--using must be given once or once per --to")
+
+    targets = list(zip(format_keys, builder_keys))
+    for format_key, builder_key in targets:
+        get_builder(format_key, builder_key)
+
+    return targets
+
+
+def get_builder(format_key: Format, builder_key: str) -> Builder:
     try:
-        builder: Builder = LOOKUP_BUILDER[format_key][builder_key]
+        return LOOKUP_BUILDER[format_key][builder_key]
     except KeyError:
         raise KeyError(f"--using {builder_key} must be one of {', '.join(LOOKUP_BUILDER[format_key].keys())}")
 
-    if not just_build:
-        prepare(inp=inp, env_name=env_name, tmp_root=tmp_root, overwrite=overwrite, reconfigure=reconfigure)
-        jinja2_mermaid_extension.base.runner().wait()
-
-    if not out_root.joinpath("source").exists():
-        raise FileNotFoundError(out_root)
-
-    venv = VirtualEnvironment.from_db(env_name)
-
-    if format_key == Format.confluence:
-        venv.run("python", "-m", "sphinxcontrib.confluencebuilder", "connection-test", "--work-dir", out_root.joinpath("source"))
-        if just_check_connection:
-            return
-
-    # fmt: off
-    venv.run(
-        "sphinx-build",
-        "-b",
-        builder.name,
-        out_root.joinpath("source"),
-        out_root.joinpath("build", format_key.value),
-        *(("--tag", "is_single_page") if builder_key == "single.page" else ()),
-    )
-    # fmt: on
-
-    if format_key == Format.pdf and builder.name == "latex":
-        for command in LATEX_COMMAND:
-            kwargs = dict(tex=get_output(out_root, "build", "pdf", pattern="index.tex"))
-            run(*(part.format(**kwargs) for part in command))
-
-    if out is not None:
-        if builder.export and builder.output is not None:
-            save_url(url=builder.output(out_root), out=out, top=tmp_root)
-        else:
-            logger.error(dict(action="save", message=f"Exporting {format_key.value} is not yet supported."))
 
-    if show_output:
-        if builder.output is not None:
-            open_url(url=builder.output(out_root), top=tmp_root)
-        else:
-            raise NotImplementedError(f"Cant open {format_key.value} output.")
+def build(
+    out_root: Path,
+    venv: VirtualEnvironment,
+    format_key: Format,
+    builder_key: str,
+    daemon: bool = False,
+    stdout: IO[str] | None = None,
+    doctrees: Path | None = None,
+) -> None:
+    """
+    Build the prepared sources in the output folder, reusing the results of earlier builds.
+    """
+    builder = get_builder(format_key, builder_key)
+    streams: dict[str, Any] = {} if stdout is None else dict(stdout=stdout, stderr=subprocess.STDOUT)
+
+    with span("build", format=format_key.value, builder=builder_key):
+        # fmt: off
+        with span("sphinx", daemon=daemon):
+            sphinx_build(
+                venv,
+                "-b",
+                builder.name,
+                out_root.joinpath("source"),
+                out_root.joinpath("build", format_key.value),
+                "-d",
+                doctrees if doctrees is not None else out_root.joinpath("build", ".doctrees"),
+                *(("--tag", "is_single_page") if builder_key == "single.page" else ()),
+                daemon=daemon,
+                stdout=stdout,
+            )
+        # fmt: on
+
+        if format_key == Format.pdf and builder.name == "latex":
+            with span("latex"):
+                run_latex(get_output(out_root, "build", "pdf", pattern="index.tex"), LATEX_COMMAND, **streams)
+
+
+def build_many(out_root: Path, venv: VirtualEnvironment, targets: list[tuple[Format, str]], daemon: bool = False) -> None:
+    """
+    Build several outputs from the same sources, which are only read once into the shared doctree cache.
+
+    The first build reads the sources alone, after which builds to different folders write their output at once.
+    Each of those starts from its own copy of the doctree cache, since sphinx rewrites the pickled environment in place.
+    """
+    (first, *same_format), *others = get_chains(targets, key=lambda target: target[0])
+    build(out_root, venv, *first, daemon=daemon)
+
+    chains = [chain for chain in (same_format, *others) if chain]
+    if len(chains) == 1:
+        for format_key, builder_key in chains[0]:
+            build(out_root, venv, format_key, builder_key, daemon=daemon)
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, len(chains)), thread_name_prefix="mdsphinx-build") as executor:
+        futures = [
+            executor.submit(build_chain, out_root, venv, chain, daemon, copy_doctrees(out_root, chain[0][0])) for chain in chains
+        ]
+        for future in futures:
+            future.result()
+
+
+def get_chains(targets: list[T], key: Callable[[T], Format]) -> list[list[T]]:
+    """
+    Group targets by format, since builds of the same format share a build folder and must run one after the other.
+    """
+    chains: dict[Format, list[T]] = {}
+    for target in targets:
+        chains.setdefault(key(target), []).append(target)
+    return list(chains.values())
+
+
+def build_chain(
+    out_root: Path,
+    venv: VirtualEnvironment,
+    targets: list[tuple[Format, str]],
+    daemon: bool = False,
+    doctrees: Path | None = None,
+) -> None:
+    for format_key, builder_key in targets:
+        log = get_log_path(out_root, format_key, builder_key)
+        logger.info(dict(action="build", format=format_key.value, builder=builder_key, log=log))
+        try:
+            with log.open("w") as stream:
+                build(out_root, venv, format_key, builder_key, daemon=daemon, stdout=stream, doctrees=doctrees)
+        except Exception as error:
+            error.add_note(f"see {log}")
+            raise
+
+
+def copy_doctrees(out_root: Path, format_key: Format) -> Path:
+    """
+    Copy the shared doctree cache for a chain of builds that runs next to others, skipping files that already match.
+    """
+    src = out_root.joinpath("build", ".doctrees")
+    dst = out_root.joinpath("build", f".doctrees.{format_key.value}")
+    for path in src.rglob("*"):
+        if path.is_file():
+            target = dst.joinpath(path.relative_to(src))
+            target.parent.mkdir(parents=True, exist_ok=True)
+            mirror(path, target, MirrorMode.copy)
+    return dst
+
+
+def get_log_path(out_root: Path, format_key: Format, builder_key: str) -> Path:
+    path = out_root.joinpath("build", f"{format_key.value}.{builder_key}.log")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def export(out_root: Path, format_key: Format, builder_key: str, out: Path, top: Path = TMP_ROOT) -> None:
+    builder = get_builder(format_key, builder_key)
+    if builder.export and builder.output is not None:
+        save_url(url=builder.output(out_root), out=out, top=top)
+    else:
+        logger.error(dict(action="save", message=f"Exporting {format_key.value} is not yet supported."))
 
 
 def open_url(url: Path, top: Path = TMP_ROOT) -> None:
     if url.exists():
         logger.info(dict(action="open", url=url if not url.is_relative_to(top) else url.relative_to(top)))
+        import webbrowser
+
         webbrowser.open(url.as_uri(), new=2)
     else:
         raise FileNotFoundError(url)
@@ -43,7 +43,7 @@ def get_main_sphinx_config() -> Path | None:
 
 
 def get_base_sphinx_config(venv: VirtualEnvironment) -> Path | None:
-    for path in venv.path.glob("lib/python*/site-packages/sphinx/templates/quickstart/conf.py.jinja"):
+    if (path := venv.site_packages.joinpath("sphinx", "templates", "quickstart", "conf.py.jinja")).exists():
         return path
     else:
         return None
@@ -0,0 +1,182 @@
+# A warm sphinx-build server, executed with the python of a virtual environment.
+# This script must only depend on the standard library and the packages installed in that environment.
+import argparse
+import importlib
+import json
+import os
+import socket
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+HEADER = struct.Struct("!Q")
+PRELOAD = ("docutils", "sphinx.application", "myst_parser", "sphinxcontrib.confluencebuilder", "furo", "nbsphinx")
+
+
+def recv_request(conn: socket.socket) -> tuple[dict[str, Any], list[int]]:
+    data, fds, _, _ = socket.recv_fds(conn, 1 << 16, 2)
+    try:
+        if len(data) < HEADER.size:
+            raise ConnectionError("incomplete request")
+
+        (size,) = HEADER.unpack_from(data)
+        data = data[HEADER.size :]
+        while len(data) < size:
+            if not (chunk := conn.recv(size - len(data))):
+                raise ConnectionError("incomplete request")
+            data += chunk
+
+        return json.loads(data), fds
+    except BaseException:
+        for fd in fds:
+            os.close(fd)
+        raise
+
+
+def send_reply(conn: socket.socket, reply: dict[str, Any]) -> None:
+    data = json.dumps(reply).encode()
+    conn.sendall(HEADER.pack(len(data)) + data)
+
+
+def fork_build(request: dict[str, Any], fds: list[int], inherited: list[socket.socket]) -> int:
+    """
+    Run one build in a forked child, so that no state leaks between projects.
+
+    The child closes the inherited sockets, so that it never keeps the server or the connection of another client open.
+    """
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            for sock in inherited:
+                sock.close()
+            os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+            os.dup2(fds[0], 1)
+            os.dup2(fds[1], 2)
+            os.chdir(request["cwd"])
+            os.environ.clear()
+            os.environ.update(request["env"])
+            sys.argv = ["sphinx-build", *request["argv"]]
+            code = int(importlib.import_module("sphinx.cmd.build").main(request["argv"]))
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    return pid
+
+
+def handle(conn: socket.socket, children: dict[int, socket.socket], server: socket.socket) -> bool:
+    """
+    Handle one request, returning False if the server should stop.
+
+    The output streams sent with the request are closed here, a forked build has its own copies.
+    """
+    fds: list[int] = []
+    try:
+        conn.settimeout(10.0)
+        request, fds = recv_request(conn)
+        match request.get("command", "build"):
+            case "stop":
+                send_reply(conn, dict(returncode=0))
+                conn.close()
+                return False
+            case "ping":
+                send_reply(conn, dict(returncode=0, pid=os.getpid(), executable=sys.executable))
+                conn.close()
+            case _:
+                children[fork_build(request, fds, [server, conn, *children.values()])] = conn
+    except (OSError, ValueError, KeyError) as error:
+        print(f"sphinxd: {error}", file=sys.stderr)
+        conn.close()
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+    return True
+
+
+def reap(children: dict[int, socket.socket]) -> None:
+    for pid, conn in list(children.items()):
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            with children.pop(pid):
+                try:
+                    send_reply(conn, dict(returncode=os.waitstatus_to_exitcode(status)))
+                except OSError as error:
+                    print(f"sphinxd: {error}", file=sys.stderr)
+
+
+def is_alive(path: Path) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(str(path))
+            return True
+        except OSError:
+            return False
+
+
+def serve(server: socket.socket, idle_timeout: float) -> None:
+    """
+    Accept requests until stopped or idle for too long.
+    """
+    children: dict[int, socket.socket] = {}
+    server.settimeout(0.1)
+    last_active = time.monotonic()
+    try:
+        while True:
+            reap(children)
+            try:
+                conn, _ = server.accept()
+            except TimeoutError:
+                if children:
+                    last_active = time.monotonic()
+                elif time.monotonic() - last_active > idle_timeout:
+                    break
+                continue
+
+            last_active = time.monotonic()
+            if not handle(conn, children, server):
+                break
+    finally:
+        while children:
+            reap(children)
+            time.sleep(0.1)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", type=Path, required=True)
+    parser.add_argument("--idle-timeout", type=float, default=600.0)
+    args = parser.parse_args()
+
+    for name in PRELOAD:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+    if is_alive(args.socket):
+        return 0
+
+    args.socket.unlink(missing_ok=True)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        old_umask = os.umask(0o077)
+        try:
+            server.bind(str(args.socket))
+        finally:
+            os.umask(old_umask)
+
+        server.listen()
+        try:
+            serve(server, args.idle_timeout)
+        finally:
+            args.socket.unlink(missing_ok=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import subprocess
+from pathlib import Path
+from typing import Annotated
+
+from typer import Option
+
+from mdsphinx.config import DEFAULT_ENVIRONMENT
+from mdsphinx.config import DIAGRAM_JOBS
+from mdsphinx.config import DIAGRAM_TIMEOUT
+from mdsphinx.config import TMP_ROOT
+from mdsphinx.core.environment import VirtualEnvironment
+from mdsphinx.core.prepare import find_context
+from mdsphinx.core.prepare import prepare
+from mdsphinx.core.prepare import Renderer
+from mdsphinx.core.process import build
+from mdsphinx.core.process import Format
+from mdsphinx.core.process import get_builder
+from mdsphinx.core.quickstart import get_custom_templatedir
+from mdsphinx.core.quickstart import LATEX_MAIN_TEMPLATE
+from mdsphinx.core.quickstart import SPHINX_CFG_TEMPLATE
+from mdsphinx.core.quickstart import sphinx_quickstart
+from mdsphinx.logger import logger
+from mdsphinx.mirror import MirrorMode
+from mdsphinx.types import OptionalPath
+from mdsphinx.watcher import watcher
+
+
+EPILOG = """
+Examples
+
+mdsphinx watch ./directory --to html --using default
+mdsphinx watch example.md --to html --daemon
+""".replace(
+    "\n", "\n\n"
+)
+
+
+def watch(
+    inp: Annotated[Path, "The input path or directory with markdown files."],
+    format_key: Annotated[Format, Option("--to", help="The desired format.")] = Format.html,
+    builder_key: Annotated[str, Option("--using", help="The desired builder.")] = "default",
+    context: Annotated[OptionalPath, Option(help="JSON/YAML variables to inject when rendering")] = None,
+    env_name: Annotated[str, Option(help="The environment name.")] = DEFAULT_ENVIRONMENT,
+    tmp_root: Annotated[Path, Option(help="The directory for temporary output.")] = TMP_ROOT,
+    jobs: Annotated[int, Option("--jobs", "-j", min=1, help="The number of parallel render jobs.")] = 1,
+    mirror_mode: Annotated[MirrorMode, Option("--mirror", help="How to mirror resources to the output.")] = MirrorMode.copy,
+    diagram_jobs: Annotated[int, Option(min=1, help="The number of diagram jobs to run at once.")] = DIAGRAM_JOBS,
+    diagram_timeout: Annotated[float, Option(min=0, help="Seconds before a diagram job is killed, 0 for no limit.")] = DIAGRAM_TIMEOUT,
+    daemon: Annotated[bool, Option(help="Build with a warm sphinx daemon of the environment?")] = False,
+    debounce: Annotated[float, Option(help="Seconds without changes to wait for before rebuilding.")] = 0.5,
+    poll: Annotated[bool, Option(help="Poll for changes instead of using inotify?")] = False,
+    interval: Annotated[float, Option(help="Seconds between scans when polling.")] = 1.0,
+) -> None:
+    """
+    Rebuild the output whenever the input files change.
+    """
+    inp = inp.resolve()
+    tmp_root = tmp_root.resolve()
+    context = context.resolve() if context is not None else find_context(inp)
+    get_builder(format_key, builder_key)
+
+    venv = VirtualEnvironment.from_db(env_name)
+    renderer = prepare(
+        inp=inp,
+        context=context,
+        env_name=env_name,
+        tmp_root=tmp_root,
+        jobs=jobs,
+        mirror_mode=mirror_mode,
+        diagram_jobs=diagram_jobs,
+        diagram_timeout=diagram_timeout,
+    )
+    # the sources that lost a diagram to a failed job, rendered again with the next change
+    retry = rebuild(renderer, venv, format_key, builder_key, daemon=daemon)
+
+    import yaml
+    from jinja2 import TemplateError
+
+    config_root = get_custom_templatedir(inp) or inp.parent
+    config_files = {config_root / SPHINX_CFG_TEMPLATE, config_root / LATEX_MAIN_TEMPLATE}
+
+    with watcher(
+        [renderer.inp_root],
+        files={*config_files, *((context,) if context is not None else ())},
+        skip=renderer.is_unwatched_dir,
+        poll=poll,
+        interval=interval,
+    ) as changes:
+        logger.info(dict(action="watch", inp=inp, out_root=renderer.out_root, message="waiting for changes, press ctrl+c to stop"))
+        try:
+            while True:
+                paths = changes.wait(debounce=debounce)
+                logger.debug(dict(action="watch", changes=sorted(map(str, paths))))
+
+                try:
+                    renderer, changed = refresh(renderer, paths | retry, context=context, jobs=jobs)
+                except (TemplateError, yaml.YAMLError, OSError, ValueError, RuntimeError) as error:
+                    # an input may be half saved or deleted while rendering, the next change renders it again
+                    logger.error(dict(action="render", message=f"{type(error).__name__}: {error}"))
+                    retry = finish_diagrams(renderer) or set()
+                    continue
+
+                if not config_files.isdisjoint(paths):
+                    sphinx_quickstart(inp, renderer.out_root, venv, remove=True)
+                    changed = True
+
+                if changed:
+                    retry = rebuild(renderer, venv, format_key, builder_key, daemon=daemon)
+        except KeyboardInterrupt:
+            logger.info(dict(action="watch", message="stopped"))
+
+
+def refresh(renderer: Renderer, paths: set[Path], context: Path | None, jobs: int = 1) -> tuple[Renderer, bool]:
+    """
+    Render what changed, starting over with a new renderer if the context changed.
+    """
+    if context is None or context not in paths:
+        return renderer, renderer.update(paths)
+
+    renderer = Renderer.create(
+        context=context,
+        inp_path=renderer.inp_path,
+        inp_root=renderer.inp_root,
+        out_root=renderer.out_root,
+        mirror_mode=renderer.mirror_mode,
+    )
+    renderer.render(jobs=jobs)
+    renderer.create_index()
+    return renderer, True
+
+
+def rebuild(renderer: Renderer, venv: VirtualEnvironment, format_key: Format, builder_key: str, daemon: bool = False) -> set[Path]:
+    """
+    Build the output, reporting failures without ending the watch.
+
+    Returns:
+        The sources to render again, because a diagram job failed.
+    """
+    if (retry := finish_diagrams(renderer)) is not None:
+        return retry
+
+    try:
+        build(renderer.out_root, venv, format_key, builder_key, daemon=daemon)
+    except (subprocess.CalledProcessError, FileNotFoundError, TimeoutError) as error:
+        logger.error(dict(action="build", message=str(error)))
+    else:
+        logger.info(dict(action="build", out_root=renderer.out_root, message="up to date"))
+
+    return set()
+
+
+def finish_diagrams(renderer: Renderer) -> set[Path] | None:
+    """
+    Wait for the diagram jobs, reporting a failure without ending the watch.
+
+    Returns:
+        None if every job succeeded, else the sources that lost a diagram, which are forgotten so that they render again.
+    """
+    from mdsphinx.diagrams import wait_for_diagrams
+
+    try:
+        wait_for_diagrams()
+    except Exception as error:
+        # whatever the failed job raised, or the error of the scheduler for the jobs it cancelled after it
+        logger.error(dict(action="diagrams", message=f"{type(error).__name__}: {error}"))
+        return set(renderer.forget_missing_diagrams())
+
+    return None
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import dataclasses
+import functools
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+from collections.abc import Callable
+from collections.abc import Generator
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+from typing import ClassVar
+
+import jinja2_mermaid_extension.base
+import jinja2_mermaid_extension.callback
+import jinja2_mermaid_extension.run
+from jinja2_mermaid_extension.callback import MermaidOptions
+from jinja2_mermaid_extension.callback import TikZOptions
+
+from mdsphinx.config import CACHE_ROOT
+from mdsphinx.config import DIAGRAM_CACHE_SIZE
+from mdsphinx.context import record_diagram
+from mdsphinx.logger import logger
+from mdsphinx.lru import evict_lru
+from mdsphinx.manifest import digest_file
+from mdsphinx.mirror import copy
+from mdsphinx.scheduler import remaining
+from mdsphinx.scheduler import scheduler
+from mdsphinx.trace import count
+from mdsphinx.trace import span
+
+
+@dataclasses.dataclass
+class DiagramCache:
+    """
+    A content addressed cache of generated diagrams, evicting the least recently used ones beyond max_size bytes.
+    """
+
+    root: Path
+    max_size: int
+
+    # options that only say where to work, not what to generate
+    IGNORED_OPTIONS: ClassVar[frozenset[str]] = frozenset({"inp_root", "out_root", "temp_dir", "delete_temp_dir"})
+
+    def key(self, kind: str, inp: Path | str, ext: str, **kwargs: Any) -> str:
+        data = dict(
+            kind=kind,
+            version=jinja2_mermaid_extension.__version__,
+            renderer=get_renderer_version(kind, kwargs),
+            inp=f"file:{digest_file(inp)}" if isinstance(inp, Path) else inp,
+            ext=ext.lower(),
+            options={k: v for k, v in kwargs.items() if k not in self.IGNORED_OPTIONS},
+        )
+        return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+    def path(self, key: str, ext: str) -> Path:
+        return self.root / key[:2] / f"{key}{ext.lower()}"
+
+    def run(self, kind: str, callback: Callable[..., None], inp: Path | str, out: Path, **kwargs: Any) -> bool:
+        """
+        Place a cached copy of the diagram at out, or call the callback to generate and cache it.
+
+        Returns:
+            True if the diagram was found in the cache.
+        """
+        if self.max_size <= 0:
+            callback(inp=inp, out=out, **kwargs)
+            return False
+
+        key = self.key(kind, inp, out.suffix, **kwargs)
+        if self.fetch(key, out):
+            logger.info(f"cached diagram: {out}")
+            return True
+
+        callback(inp=inp, out=out, **kwargs)
+        if out.exists():
+            self.store(key, out)
+        return False
+
+    def fetch(self, key: str, out: Path) -> bool:
+        blob = self.path(key, out.suffix)
+        try:
+            # the modification time is the clock of the least recently used eviction
+            os.utime(blob)
+            copy(blob, out)
+        except FileNotFoundError:
+            return False
+
+        return True
+
+    def store(self, key: str, out: Path) -> None:
+        blob = self.path(key, out.suffix)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=blob.parent, suffix=".tmp")
+        os.close(fd)
+        try:
+            copy(out, Path(tmp_name))
+            os.replace(tmp_name, blob)
+            os.utime(blob)
+        finally:
+            Path(tmp_name).unlink(missing_ok=True)
+
+    def evict(self) -> None:
+        if self.max_size <= 0:
+            return
+
+        for path in evict_lru(self.root, self.max_size):
+            logger.debug(f"evict diagram: {path}")
+
+
+@functools.cache
+def get_tool_version(*command: str) -> str:
+    try:
+        return subprocess.run(command, capture_output=True, text=True, check=True, timeout=60).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def get_renderer_version(kind: str, options: dict[str, Any]) -> str:
+    """
+    Identify the program that generates the diagram, so that upgrading it invalidates the diagrams it made.
+    """
+    if kind == "mermaid":
+        if options.get("use_local_mmdc_instead", MermaidOptions.use_local_mmdc_instead):
+            return get_tool_version("mmdc", "--version")
+        image = options.get("mermaid_docker_image", MermaidOptions.mermaid_docker_image)
+        # the id of the local image changes when a tag such as latest is pulled again
+        return get_tool_version("docker", "image", "inspect", "--format", "{{.Id}}", image) or image
+
+    latex_command = options.get("latex_command", TikZOptions.latex_command)
+    return get_tool_version(latex_command[0], "--version") if latex_command else ""
+
+
+@functools.lru_cache(maxsize=1)
+def diagram_cache() -> DiagramCache:
+    return DiagramCache(CACHE_ROOT / "diagrams", max_size=DIAGRAM_CACHE_SIZE)
+
+
+def resolve_input(inp: Path | str, inp_root: Path, suffix: str) -> Path | str:
+    if isinstance(inp, str) and inp.endswith(suffix):
+        return Path(inp) if Path(inp).is_absolute() else inp_root / inp
+    return inp
+
+
+def run(command: Iterable[str], **kwargs: Any) -> None:
+    """
+    Run a command of the diagram extension with its own runner, killing it if the scheduled job running it times out.
+
+    Outside of a scheduled job there is no deadline, so the extension behaves as it does without mdsphinx.
+    """
+    command = tuple(command)
+    with span(Path(command[0]).name, command=" ".join(command)):
+        count("subprocesses")
+        jinja2_mermaid_extension.run.run(command, timeout=remaining(), **kwargs)
+
+
+# the callbacks of the extension run their commands through the runner their module imported, which is the only step wrapped
+setattr(jinja2_mermaid_extension.callback, "run", run)
+
+
+@dataclasses.dataclass(frozen=True)
+class DiagramJob:
+    """
+    A picklable request to generate one diagram, so that it can be handed between processes.
+    """
+
+    kind: str
+    inp: Path | str
+    out: Path
+    options: dict[str, Any] = dataclasses.field(default_factory=dict)
+
+    CALLBACKS: ClassVar[dict[str, Callable[..., None]]] = {
+        "mermaid": jinja2_mermaid_extension.callback.mermaid,
+        "tikz": jinja2_mermaid_extension.callback.tikz,
+    }
+
+    @property
+    def key(self) -> Path:
+        return self.out
+
+    def __call__(self) -> str:
+        try:
+            cached = diagram_cache().run(self.kind, self.CALLBACKS[self.kind], inp=self.inp, out=self.out, **self.options)
+        except subprocess.TimeoutExpired as error:
+            raise TimeoutError(f"{self.kind} diagram timed out after {error.timeout:.0f}s: {self.out}") from error
+        count(f"diagrams {'cached' if cached else 'generated'}")
+        return "cached" if cached else "generated"
+
+
+def wait_for_diagrams() -> None:
+    """
+    Wait for the diagrams of rendered sources, including those submitted by the threads of the extension.
+    """
+    jinja2_mermaid_extension.base.runner().wait()
+    scheduler().wait()
+    diagram_cache().evict()
+
+
+class MermaidExtension(jinja2_mermaid_extension.MermaidExtension):
+    @staticmethod
+    def modify(**kwargs: Any) -> Generator[tuple[str, Any]]:
+        # the scheduler already runs the jobs in the background, submitting them on the rendering thread records them
+        yield from jinja2_mermaid_extension.MermaidExtension.modify(**{**kwargs, "parallel": False})
+
+    def callback(self, inp: Path | str, out: Path, inp_root: Path, out_root: Path, **kwargs: Any) -> None:
+        record_diagram(out)
+        scheduler().submit(DiagramJob("mermaid", resolve_input(inp, inp_root, ".mmd"), out, kwargs))
+
+
+class TikZExtension(jinja2_mermaid_extension.TikZExtension):
+    @staticmethod
+    def modify(**kwargs: Any) -> Generator[tuple[str, Any]]:
+        yield from jinja2_mermaid_extension.TikZExtension.modify(**{**kwargs, "parallel": False})
+
+    def callback(self, inp: Path | str, out: Path, inp_root: Path, out_root: Path, **kwargs: Any) -> None:
+        record_diagram(out)
+        scheduler().submit(DiagramJob("tikz", resolve_input(inp, inp_root, ".tex"), out, kwargs))
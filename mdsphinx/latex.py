@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+from mdsphinx.logger import logger
+from mdsphinx.logger import run
+from mdsphinx.manifest import digest_file
+
+STATE_NAME = ".mdsphinx-latex.json"
+
+# files written by latex engines, everything else in the folder is an input
+AUX_SUFFIXES = frozenset({".aux", ".toc", ".out", ".lof", ".lot", ".idx", ".ind", ".ilg", ".bbl", ".blg", ".glo", ".gls", ".nav"})
+OUTPUT_SUFFIXES = AUX_SUFFIXES | frozenset({".pdf", ".log", ".fls", ".fdb_latexmk", ".gz", ".xdv", ".dvi", ".tmp"})
+
+
+def digest_files(paths: Iterable[Path], root: Path) -> str:
+    h = hashlib.sha256()
+    for path in sorted(paths):
+        h.update(path.relative_to(root).as_posix().encode())
+        h.update(b"\0")
+        h.update(digest_file(path).encode())
+    return h.hexdigest()
+
+
+def get_inputs(root: Path) -> Iterable[Path]:
+    for path in root.rglob("*"):
+        if path.is_file() and path.name != STATE_NAME and path.suffix.lower() not in OUTPUT_SUFFIXES:
+            yield path
+
+
+def get_aux(root: Path) -> Iterable[Path]:
+    for path in root.iterdir():
+        if path.is_file() and path.suffix.lower() in AUX_SUFFIXES:
+            yield path
+
+
+def run_latex(tex: Path, commands: tuple[tuple[str, ...], ...], **kwargs: Any) -> bool:
+    """
+    Run the commands to turn tex into a pdf, unless the inputs and commands are the same as on the last successful run.
+
+    A command that repeats the one before it, such as the second pass of pdflatex, is skipped if the aux files did not change.
+
+    Returns:
+        True if any command was run.
+    """
+    root = tex.parent
+    state_path = root / STATE_NAME
+    commands = tuple(tuple(part.format(tex=tex) for part in command) for command in commands)
+    key = hashlib.sha256(json.dumps([commands, digest_files(get_inputs(root), root)]).encode()).hexdigest()
+
+    try:
+        with state_path.open("r") as stream:
+            state = json.load(stream)
+    except (FileNotFoundError, ValueError):
+        state = {}
+
+    if state.get("key") == key and tex.with_suffix(".pdf").exists():
+        logger.info(dict(action="latex", tex=tex, message="unchanged, skipping"))
+        return False
+
+    state_path.unlink(missing_ok=True)
+    aux_changed = True
+    for i, command in enumerate(commands):
+        if i > 0 and command == commands[i - 1] and not aux_changed:
+            logger.info(dict(action="latex", command=command, message="aux files unchanged, skipping rerun"))
+            continue
+
+        before = digest_files(get_aux(root), root)
+        run(*command, cwd=root, **kwargs)
+        aux_changed = before != digest_files(get_aux(root), root)
+
+    tmp_path = state_path.with_suffix(f".{os.getpid()}.tmp")
+    with tmp_path.open("w") as stream:
+        json.dump(dict(key=key), stream)
+    os.replace(tmp_path, state_path)
+    return True
@@ -11,6 +11,11 @@ logger = logging.getLogger("mdsphinx")
 def run(
     *args: str | Path, action: str = "run", check: bool = True, echo: bool = True, **kwargs: Any
 ) -> subprocess.CompletedProcess[str]:
+    from mdsphinx.trace import count
+    from mdsphinx.trace import span
+
     if echo:
         logger.info(json.dumps(dict(action=action, command=tuple(map(str, args))), indent=2))
-    return subprocess.run(args, check=check, **kwargs)
+    with span(Path(args[0]).name, command=" ".join(map(str, args))):
+        count("subprocesses")
+        return subprocess.run(args, check=check, **kwargs)
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+
+# the size bound of the stores laid out as root/xx/name, such as the compiled template and diagram caches
+def evict_lru(root: Path, max_size: int) -> list[Path]:
+    """
+    Remove the least recently modified files of a store laid out as root/xx/name until at most max_size bytes remain.
+
+    Returns:
+        The removed files.
+    """
+    files: list[tuple[int, int, Path]] = []
+    for path in root.glob("*/*"):
+        if path.suffix == ".tmp":
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime_ns, stat.st_size, path))
+
+    removed: list[Path] = []
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_size:
+            break
+        path.unlink(missing_ok=True)
+        removed.append(path)
+        total -= size
+
+    return removed
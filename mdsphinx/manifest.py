@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import os
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+from typing import ClassVar
+
+from mdsphinx.logger import logger
+
+
+def digest_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def digest_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as stream:
+        while chunk := stream.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def digest_context(context: dict[str, Any], exclude: Iterable[str] = ()) -> dict[str, str]:
+    """
+    Digest each top level value of the context on its own, so that a change can be traced to the keys that changed.
+    """
+    excluded = frozenset(exclude)
+    return {
+        key: digest_bytes(json.dumps(value, sort_keys=True, default=digest_value).encode())
+        for key, value in context.items()
+        if key not in excluded
+    }
+
+
+def digest_value(value: Any) -> str:
+    # values kept in side files digest their contents, without loading them
+    if callable(digest := getattr(value, "digest", None)):
+        return str(digest())
+    return str(value)
+
+
+@dataclasses.dataclass
+class Entry:
+    """
+    The state of a single input file at the time it was last rendered or mirrored.
+    """
+
+    kind: str
+    digest: str
+    size: int
+    mtime_ns: int
+    outputs: list[str] = dataclasses.field(default_factory=list)
+    volatile: bool = False
+    keys: list[str] = dataclasses.field(default_factory=list)
+    templates: list[str] = dataclasses.field(default_factory=list)
+    diagrams: list[str] = dataclasses.field(default_factory=list)
+
+    def matches(self, stat: os.stat_result) -> bool:
+        return self.size == stat.st_size and self.mtime_ns == stat.st_mtime_ns
+
+
+@dataclasses.dataclass
+class Manifest:
+    """
+    A record of the inputs rendered into an output root, used to skip unchanged inputs on later runs.
+    """
+
+    path: Path
+    context: dict[str, str] = dataclasses.field(default_factory=dict)
+    templates: dict[str, str] = dataclasses.field(default_factory=dict)
+    entries: dict[str, Entry] = dataclasses.field(default_factory=dict)
+
+    NAME: ClassVar[str] = "manifest.json"
+    VERSION: ClassVar[int] = 3
+
+    @classmethod
+    def load(cls, out_root: Path) -> Manifest:
+        path = out_root / cls.NAME
+        try:
+            with path.open("r") as stream:
+                data = json.load(stream)
+        except FileNotFoundError:
+            return cls(path)
+        except ValueError:
+            logger.warning(dict(action="manifest", path=path, message="ignoring corrupt manifest"))
+            return cls(path)
+
+        if not isinstance(data, dict) or data.get("version") != cls.VERSION:
+            return cls(path)
+
+        return cls(
+            path,
+            context=data.get("context", {}),
+            templates=data.get("templates", {}),
+            entries={key: Entry(**value) for key, value in data.get("entries", {}).items()},
+        )
+
+    def save(self) -> None:
+        data = dict(
+            version=self.VERSION,
+            context=self.context,
+            templates=self.templates,
+            entries={key: dataclasses.asdict(value) for key, value in sorted(self.entries.items())},
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp_path.open("w") as stream:
+            json.dump(data, stream, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def invalidate(self, context: dict[str, str]) -> set[str]:
+        """
+        Record the digests of a new context and mark the sources that used a changed key to be rendered again.
+
+        Returns:
+            The keys that were added, removed or changed.
+        """
+        changed = {key for key in self.context.keys() | context.keys() if self.context.get(key) != context.get(key)}
+        for entry in self.entries.values():
+            entry.volatile |= entry.kind == "source" and not changed.isdisjoint(entry.keys)
+        self.context = context
+        return changed
+
+    def invalidate_templates(self, templates: dict[str, str]) -> set[str]:
+        """
+        Record the digests of the templates included by sources and mark the sources that used a changed one to be rendered again.
+
+        Returns:
+            The templates that changed.
+        """
+        changed = {name for name, digest in self.templates.items() if templates.get(name) != digest}
+        for entry in self.entries.values():
+            entry.volatile |= not changed.isdisjoint(entry.templates)
+        self.templates = templates
+        return changed
+
+    def prune(self, seen: Iterable[str]) -> Iterable[Path]:
+        """
+        Forget the entries that were not seen and yield the outputs they produced.
+        """
+        for key in set(self.entries) - set(seen):
+            for output in self.entries.pop(key).outputs:
+                yield self.path.parent / output
+
+    def forget(self, key: str) -> Iterable[Path]:
+        """
+        Forget the entry of a deleted input, or the entries below a deleted directory, and yield the outputs they produced.
+        """
+        return self.prune([other for other in self.entries if other != key and not other.startswith(f"{key}/")])
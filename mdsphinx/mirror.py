@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import os
+import shutil
+from enum import Enum
+from pathlib import Path
+
+from mdsphinx.config import CACHE_ROOT
+from mdsphinx.logger import logger
+from mdsphinx.manifest import digest_file
+
+# linux ioctl request number to share the extents of one file with another
+FICLONE = 0x40049409
+
+
+class MirrorMode(str, Enum):
+    copy = "copy"
+    link = "link"
+    store = "store"
+
+
+def mirror(src: Path, dst: Path, mode: MirrorMode = MirrorMode.copy, digest: str | None = None, store: Path | None = None) -> int:
+    """
+    Mirror a file, skipping the work if the destination already matches.
+
+    Parameters:
+        src: The file to mirror.
+        dst: The destination path.
+        mode: Copy the data, hardlink to the source, or hardlink through a content addressed store.
+        digest: The digest of the source, if already known.
+        store: The root of the content addressed store.
+
+    Returns:
+        The number of bytes that had to be copied.
+    """
+    if is_same_file(src, dst, digest=digest):
+        return 0
+
+    dst.unlink(missing_ok=True)
+
+    match mode:
+        case MirrorMode.link:
+            if try_link(src, dst):
+                return 0
+        case MirrorMode.store:
+            blob = put_blob(src, digest=digest, store=store)
+            if try_link(blob, dst):
+                return 0
+
+    return copy(src, dst)
+
+
+def is_same_file(src: Path, dst: Path, digest: str | None = None) -> bool:
+    try:
+        a, b = src.stat(), dst.stat()
+    except FileNotFoundError:
+        return False
+
+    if (a.st_dev, a.st_ino) == (b.st_dev, b.st_ino):
+        return True
+
+    if a.st_size != b.st_size:
+        return False
+
+    if a.st_mtime_ns == b.st_mtime_ns:
+        return True
+
+    return (digest if digest is not None else digest_file(src)) == digest_file(dst)
+
+
+def put_blob(src: Path, digest: str | None = None, store: Path | None = None) -> Path:
+    """
+    Add a file to the content addressed store and return the path of the stored blob.
+    """
+    digest = digest if digest is not None else digest_file(src)
+    blob = (store if store is not None else CACHE_ROOT / "blobs") / digest[:2] / digest
+    if not blob.exists():
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp_blob = blob.with_suffix(f".{os.getpid()}.tmp")
+        # never link the source itself, an in-place edit would corrupt the blob
+        copy(src, tmp_blob)
+        os.replace(tmp_blob, blob)
+    return blob
+
+
+def collect_blobs(store: Path | None = None, dry_run: bool = False) -> list[tuple[Path, int]]:
+    """
+    Remove the blobs of the content addressed store that no output folder links to anymore.
+
+    A blob removed just before a mirror links it makes that mirror fall back to a copy.
+
+    Returns:
+        The removed blobs and their sizes.
+    """
+    store = store if store is not None else CACHE_ROOT / "blobs"
+    removed: list[tuple[Path, int]] = []
+    for path in store.glob("*/*"):
+        if path.suffix == ".tmp":
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if stat.st_nlink == 1:
+            if not dry_run:
+                path.unlink(missing_ok=True)
+            removed.append((path, stat.st_size))
+
+    return removed
+
+
+def try_link(src: Path, dst: Path) -> bool:
+    try:
+        os.link(src, dst)
+        return True
+    except OSError as error:
+        logger.debug(f"can not link {dst} to {src}: {error}")
+        return False
+
+
+def copy(src: Path, dst: Path) -> int:
+    """
+    Copy a file using the cheapest mechanism the platform offers, preserving its times.
+    """
+    with src.open("rb") as fsrc, dst.open("wb") as fdst:
+        copied = try_clone(fsrc.fileno(), fdst.fileno()) or try_copy_file_range(fsrc.fileno(), fdst.fileno())
+
+    if not copied:
+        # uses sendfile or fcopyfile where the platform supports it
+        shutil.copyfile(src, dst)
+
+    shutil.copystat(src, dst)
+    return dst.stat().st_size
+
+
+def try_clone(src_fd: int, dst_fd: int) -> bool:
+    try:
+        import fcntl
+
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except (ImportError, OSError):
+        return False
+
+
+def try_copy_file_range(src_fd: int, dst_fd: int) -> bool:
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    try:
+        while os.copy_file_range(src_fd, dst_fd, 1 << 30):
+            pass
+        return True
+    except OSError:
+        return False
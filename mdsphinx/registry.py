@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import fcntl
+import json
+import os
+from collections.abc import Generator
+from pathlib import Path
+from typing import Any
+from typing import ClassVar
+
+from mdsphinx import config
+from mdsphinx.logger import logger
+
+
+@dataclasses.dataclass
+class Record:
+    """
+    A registered environment and what is known about it.
+    """
+
+    path: Path
+    capabilities: dict[str, Any] | None = None
+
+
+@dataclasses.dataclass
+class Registry:
+    """
+    The registered environments, kept in one JSON file that is replaced atomically on every change.
+
+    Changes are made while holding an exclusive lock, so that concurrent commands never lose each other's changes.
+    """
+
+    path: Path
+    environments: dict[str, Record] = dataclasses.field(default_factory=dict)
+
+    VERSION: ClassVar[int] = 1
+
+    @classmethod
+    def load(cls, path: Path) -> Registry:
+        try:
+            with path.open("r") as stream:
+                data = json.load(stream)
+        except FileNotFoundError:
+            return cls(path)
+        except ValueError:
+            logger.warning(dict(action="registry", path=path, message="ignoring corrupt registry"))
+            return cls(path)
+
+        if not isinstance(data, dict) or data.get("version") != cls.VERSION:
+            return cls(path)
+
+        return cls(
+            path,
+            environments={
+                name: Record(path=Path(value["path"]), capabilities=value.get("capabilities"))
+                for name, value in data.get("environments", {}).items()
+            },
+        )
+
+    def save(self) -> None:
+        data = dict(
+            version=self.VERSION,
+            environments={
+                name: dict(path=str(record.path), capabilities=record.capabilities)
+                for name, record in sorted(self.environments.items())
+            },
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp_path.open("w") as stream:
+            json.dump(data, stream, indent=2)
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(tmp_path, self.path)
+
+
+# the registries read by this process, reused until their file is replaced
+_snapshots: dict[Path, tuple[tuple[int, int, int], Registry]] = {}
+
+
+def snapshot(path: Path | None = None) -> Registry:
+    """
+    Get the registry for reading, parsing the file again only if it changed since the last call.
+
+    The snapshot is shared, so change the registry through locked() instead.
+    """
+    path = path if path is not None else config.ENVIRONMENTS_REGISTRY
+
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        if not legacy_paths(path):
+            return Registry(path)
+        with locked(path):
+            pass
+        stat = path.stat()
+
+    stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    if (cached := _snapshots.get(path)) is not None and cached[0] == stamp:
+        return cached[1]
+
+    registry = Registry.load(path)
+    _snapshots[path] = stamp, registry
+    return registry
+
+
+@contextlib.contextmanager
+def locked(path: Path | None = None) -> Generator[Registry]:
+    """
+    Get the latest registry for changing, saving it when the block exits without an error.
+    """
+    path = path if path is not None else config.ENVIRONMENTS_REGISTRY
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with path.with_suffix(".lock").open("a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        registry = Registry.load(path)
+        if not path.exists():
+            registry.environments.update(load_legacy(path))
+        yield registry
+        registry.save()
+
+
+def legacy_paths(path: Path) -> list[Path]:
+    # earlier versions kept the registry in a shelve, whose files are named after it with a suffix that depends on dbm
+    legacy = path.with_suffix("")
+    return [
+        p for p in legacy.parent.glob(f"{legacy.name}*") if p.name == legacy.name or p.suffix in {".db", ".dat", ".dir", ".bak"}
+    ]
+
+
+def load_legacy(path: Path) -> dict[str, Record]:
+    """
+    Read the environments of the shelve registry of earlier versions, which is left in place.
+    """
+    if not legacy_paths(path):
+        return {}
+
+    import dbm
+    import shelve
+
+    try:
+        with shelve.open(str(path.with_suffix("")), flag="r") as shelf:
+            environments = {name: Record(path=Path(value)) for name, value in shelf.items()}
+    except (*dbm.error, OSError) as error:
+        logger.warning(dict(action="registry", path=path.with_suffix(""), message=f"can not migrate registry: {error}"))
+        return {}
+
+    logger.info(dict(action="registry", path=path, message=f"migrated {len(environments)} environments"))
+    return environments
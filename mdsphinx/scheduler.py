@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import dataclasses
+import functools
+import threading
+import time
+from collections.abc import Hashable
+from concurrent.futures import FIRST_EXCEPTION
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from typing import Protocol
+
+from mdsphinx.config import DIAGRAM_JOBS
+from mdsphinx.config import DIAGRAM_TIMEOUT
+from mdsphinx.logger import logger
+from mdsphinx.trace import span
+
+
+class Job(Protocol):
+    @property
+    def key(self) -> Hashable: ...
+
+    def __call__(self) -> str:
+        """
+        Do the work and return a short status.
+        """
+        ...
+
+
+@dataclasses.dataclass(frozen=True)
+class Timing:
+    key: Hashable
+    status: str
+    seconds: float
+
+
+_local = threading.local()
+
+
+def remaining() -> float | None:
+    """
+    Get the seconds left before the job running on this thread times out, if any.
+    """
+    deadline: float | None = getattr(_local, "deadline", None)
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+@dataclasses.dataclass
+class Scheduler:
+    """
+    Run external jobs on a bounded number of threads, failing fast on the first error.
+
+    A deferred scheduler only collects jobs, so that worker processes can hand them to the scheduler of the parent.
+    """
+
+    max_jobs: int = DIAGRAM_JOBS
+    timeout: float = DIAGRAM_TIMEOUT
+    deferred: bool = False
+    pending: list[Job] = dataclasses.field(default_factory=list)
+    futures: dict[Hashable, Future[Timing]] = dataclasses.field(default_factory=dict)
+    error: BaseException | None = None
+
+    def __post_init__(self) -> None:
+        self.configure(self.max_jobs, self.timeout)
+
+    @functools.cached_property
+    def executor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix="mdsphinx-job")
+
+    def configure(self, max_jobs: int, timeout: float) -> None:
+        """
+        Bound the jobs that start from now on, with a new pool of threads if their number changed.
+        """
+        if max_jobs < 1:
+            raise ValueError(f"Can not run {max_jobs} diagram jobs at once, expected at least 1")
+
+        if timeout < 0:
+            raise ValueError(f"Can not time diagram jobs out after {timeout} seconds, expected 0 or more")
+
+        if max_jobs != self.max_jobs and "executor" in vars(self):
+            # the jobs on the old pool still finish, and wait() still waits for them
+            vars(self).pop("executor").shutdown(wait=False)
+
+        self.max_jobs, self.timeout = max_jobs, timeout
+
+    def submit(self, job: Job) -> None:
+        if self.error is not None:
+            raise RuntimeError(f"not scheduling {job.key} after an earlier job failed") from self.error
+
+        if job.key in self.futures or any(job.key == other.key for other in self.pending):
+            return
+
+        if self.deferred:
+            self.pending.append(job)
+        else:
+            self.futures[job.key] = self.executor.submit(self._run, job)
+
+    def drain(self) -> list[Job]:
+        jobs, self.pending = self.pending, []
+        return jobs
+
+    def _run(self, job: Job) -> Timing:
+        start = time.monotonic()
+        _local.deadline = start + self.timeout if self.timeout > 0 else None
+        try:
+            with span("job", key=job.key):
+                status = job()
+        except BaseException as error:
+            if self.error is None:
+                self.error = error
+                self.cancel()
+            raise
+        finally:
+            _local.deadline = None
+        return Timing(job.key, status, time.monotonic() - start)
+
+    def cancel(self) -> None:
+        for future in list(self.futures.values()):
+            future.cancel()
+
+    def wait(self) -> list[Timing]:
+        """
+        Wait for every job, raising the first error, and report how long each one took.
+        """
+        timings: list[Timing] = []
+        try:
+            wait(self.futures.values(), return_when=FIRST_EXCEPTION)
+            if self.error is not None:
+                self.cancel()
+                raise self.error
+            timings.extend(future.result() for future in self.futures.values())
+        finally:
+            self.futures.clear()
+            self.error = None
+            self.report(timings)
+
+        return timings
+
+    @staticmethod
+    def report(timings: list[Timing]) -> None:
+        if not timings:
+            return
+
+        for timing in sorted(timings, key=lambda t: t.seconds, reverse=True):
+            logger.info(f"{timing.seconds:8.2f}s {timing.status:<9} {timing.key}")
+
+        logger.info(f"{sum(t.seconds for t in timings):8.2f}s total     {len(timings)} jobs")
+
+
+@functools.lru_cache(maxsize=1)
+def scheduler() -> Scheduler:
+    return Scheduler()
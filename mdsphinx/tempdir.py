@@ -1,34 +1,151 @@
+from __future__ import annotations
+
+import dataclasses
+import fcntl
+import hashlib
+import json
+import os
 import re
 from collections.abc import Generator
 from datetime import datetime
 from pathlib import Path
 from tempfile import mkdtemp
 
+from mdsphinx import config
 from mdsphinx.config import TMP_ROOT
 
+LOCK_NAME = ".mdsphinx.lock"
+
+# the lock file descriptors of the folders held by this process, closed when it exits
+_held: dict[Path, int] = {}
+
+
+@dataclasses.dataclass
+class OutRoots:
+    """
+    The working directories created for one input in one temporary root, oldest first.
+
+    Each input has its own small JSON file in the config root, so finding its latest directory never scans the temporary root.
+    """
+
+    path: Path
+    inp: Path
+    root: Path
+    history: list[Path] = dataclasses.field(default_factory=list)
 
-def get_out_root(key: str, root: Path = TMP_ROOT, overwrite: bool = False) -> Path:
+    @classmethod
+    def load(cls, inp: Path, root: Path = TMP_ROOT) -> OutRoots:
+        inp, root = inp.resolve(), root.resolve()
+        digest = hashlib.sha256(f"{inp}\0{root}".encode()).hexdigest()[:32]
+        path = config.OUT_ROOTS / f"{digest}.json"
+        return cls(path=path, inp=inp, root=root, history=read_history(path))
+
+    @classmethod
+    def load_all(cls) -> Generator[OutRoots]:
+        for path in sorted(config.OUT_ROOTS.glob("*.json")):
+            try:
+                with path.open("r") as stream:
+                    data = json.load(stream)
+                yield cls(path=path, inp=Path(data["inp"]), root=Path(data["root"]), history=[Path(p) for p in data["history"]])
+            except (ValueError, KeyError, TypeError):
+                continue
+
+    def add(self, path: Path) -> None:
+        """
+        Append the folder to the latest history on disk, locked so that concurrent runs never drop each other's folders.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.with_suffix(".lock").open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.history = [*read_history(self.path), path]
+            self.save()
+
+    def save(self) -> None:
+        """
+        Save the history, dropping the folders that no longer exist.
+        """
+        self.history = [path for path in self.history if path.is_dir()]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp_path.open("w") as stream:
+            json.dump(dict(inp=str(self.inp), root=str(self.root), history=[str(path) for path in self.history]), stream, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def read_history(path: Path) -> list[Path]:
     try:
-        if overwrite:
-            return make_next_directory(key, root=root)
-        return find_latest_directory(key, root=root)
-    except FileNotFoundError:
-        return make_next_directory(key, root=root)
+        with path.open("r") as stream:
+            return [Path(entry) for entry in json.load(stream)["history"]]
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        return []
+
 
+def hold(out_root: Path) -> bool:
+    """
+    Hold a shared lock on the folder until this process exits, so that it is never evicted while in use.
+
+    Returns:
+        False if the folder does not exist.
+    """
+    if out_root in _held:
+        if out_root.joinpath(LOCK_NAME).exists():
+            return True
+        os.close(_held.pop(out_root))
 
-def make_next_directory(key: str, root: Path = TMP_ROOT) -> Path:
     try:
-        latest = int(find_latest_directory(key, root=root).name.split(".")[-1])
-    except FileNotFoundError:
-        latest = -1
+        fd = os.open(out_root / LOCK_NAME, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+    except (FileNotFoundError, NotADirectoryError):
+        return False
+
+    # the folder may have been evicted while waiting for the lock
+    fcntl.flock(fd, fcntl.LOCK_SH)
+    if not out_root.joinpath(LOCK_NAME).exists():
+        os.close(fd)
+        return False
+
+    # the lock file records when the folder was last used
+    os.utime(fd)
+    _held[out_root] = fd
+    return True
+
+
+def find_out_root(inp: Path, root: Path = TMP_ROOT) -> Path:
+    out_roots = OutRoots.load(inp, root=root)
+    for path in reversed(out_roots.history):
+        if hold(path):
+            return path
+
+    raise FileNotFoundError(f"no output folder for {out_roots.inp} in {out_roots.root}")
+
+
+def get_out_root(inp: Path, root: Path = TMP_ROOT, overwrite: bool = False) -> Path:
+    if not overwrite:
+        try:
+            return find_out_root(inp, root=root)
+        except FileNotFoundError:
+            pass
+
+    out_roots = OutRoots.load(inp, root=root)
+    path = make_next_directory(out_roots.inp.name, root=out_roots.root, index=len(out_roots.history))
+    out_roots.add(path)
+    hold(path)
+    return path
+
+
+def make_next_directory(key: str, root: Path = TMP_ROOT, index: int | None = None) -> Path:
+    if index is None:
+        try:
+            index = int(find_latest_directory(key, root=root).name.split(".")[-1]) + 1
+        except FileNotFoundError:
+            index = 0
 
-    return Path(mkdtemp(prefix=f"{key}.{datetime.now():%Y-%m-%d}.", suffix=f".{latest + 1:}", dir=root))
+    return Path(mkdtemp(prefix=f"{key}.{datetime.now():%Y-%m-%d}.", suffix=f".{index}", dir=root))
 
 
 def find_latest_directory(key: str, root: Path = TMP_ROOT) -> Path:
-    def _() -> Generator[tuple[datetime, int, Path], None, None]:
+    def _() -> Generator[tuple[datetime, int, Path]]:
         for path in root.glob(f"{key}.*"):
-            if match := re.match(rf"{key}\.(?P<DT>\d\d\d\d-\d\d-\d\d)\..*?\.(?P<ID>\d)", path.name):
+            if match := re.fullmatch(rf"{re.escape(key)}\.(?P<DT>\d\d\d\d-\d\d-\d\d)\..*?\.(?P<ID>\d+)", path.name):
                 yield datetime.strptime(match.group("DT"), "%Y-%m-%d"), int(match.group("ID")), path
 
     if found := sorted(_(), key=lambda t: (t[0], t[1])):
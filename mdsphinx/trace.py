@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections.abc import Generator
+from pathlib import Path
+from typing import Any
+
+from mdsphinx.logger import logger
+
+
+@dataclasses.dataclass
+class Span:
+    name: str
+    depth: int
+    tid: int
+    start: int
+    end: int = 0
+    args: dict[str, Any] = dataclasses.field(default_factory=dict)
+
+    @property
+    def seconds(self) -> float:
+        return (self.end - self.start) / 1e9
+
+
+@dataclasses.dataclass
+class Tracer:
+    """
+    Record nested spans on each thread and counters, attributing each count to the innermost span of its thread.
+
+    A disabled tracer records nothing, so spans and counts cost next to nothing outside of --trace.
+    """
+
+    enabled: bool = False
+    spans: list[Span] = dataclasses.field(default_factory=list)
+    counts: dict[str, int] = dataclasses.field(default_factory=dict)
+    threads: dict[int, str] = dataclasses.field(default_factory=dict)
+    lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+    local: threading.local = dataclasses.field(default_factory=threading.local)
+
+    def _stack(self) -> list[Span]:
+        stack: list[Span] | None = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args: Any) -> Generator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        stack = self._stack()
+        span = Span(name=name, depth=len(stack), tid=threading.get_native_id(), start=time.perf_counter_ns(), args=args)
+        stack.append(span)
+        try:
+            yield
+        finally:
+            stack.pop()
+            span.end = time.perf_counter_ns()
+            with self.lock:
+                self.spans.append(span)
+                self.threads.setdefault(span.tid, threading.current_thread().name)
+
+    def count(self, name: str, n: int = 1) -> None:
+        if not self.enabled:
+            return
+
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+        if stack := self._stack():
+            stack[-1].args[name] = stack[-1].args.get(name, 0) + n
+
+    def drain(self) -> dict[str, int]:
+        with self.lock:
+            counts, self.counts = self.counts, {}
+        return counts
+
+    def save(self, path: Path) -> None:
+        """
+        Write the spans as Chrome trace events, for chrome://tracing or https://ui.perfetto.dev.
+        """
+        pid = os.getpid()
+        events: list[dict[str, Any]] = [
+            dict(name="thread_name", ph="M", pid=pid, tid=tid, args=dict(name=name)) for tid, name in self.threads.items()
+        ]
+        for span in sorted(self.spans, key=lambda s: s.start):
+            args = {key: value if isinstance(value, int | float | bool) else str(value) for key, value in span.args.items()}
+            events.append(
+                dict(
+                    name=span.name, ph="X", ts=span.start / 1e3, dur=(span.end - span.start) / 1e3, pid=pid, tid=span.tid, args=args
+                )
+            )
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w") as stream:
+            json.dump(dict(traceEvents=events, displayTimeUnit="ms", otherData=dict(counts=self.counts)), stream)
+
+    def report(self) -> None:
+        """
+        Log the total time and calls of each span, in the order they first started, followed by the counts.
+        """
+        totals: dict[tuple[int, str], list[float]] = {}
+        for span in sorted(self.spans, key=lambda s: s.start):
+            totals.setdefault((span.depth, span.name), []).append(span.seconds)
+
+        logger.info(f"{'seconds':>8} {'calls':>6}  span")
+        for (depth, name), seconds in totals.items():
+            logger.info(f"{sum(seconds):8.2f} {len(seconds):6d}  {'  ' * depth}{name}")
+
+        for name, n in sorted(self.counts.items()):
+            logger.info(f"{n:15d}  {name}")
+
+
+@functools.lru_cache(maxsize=1)
+def tracer() -> Tracer:
+    return Tracer()
+
+
+def span(name: str, **args: Any) -> contextlib.AbstractContextManager[None]:
+    return tracer().span(name, **args)
+
+
+def count(name: str, n: int = 1) -> None:
+    tracer().count(name, n)
+
+
+@contextlib.contextmanager
+def tracing(path: Path | None, name: str) -> Generator[None]:
+    """
+    Trace the block as one span and save the trace to path, unless path is None or a trace is already running.
+    """
+    instance = tracer()
+    if path is None or instance.enabled:
+        yield
+        return
+
+    instance.spans, instance.counts, instance.threads = [], {}, {}
+    instance.enabled = True
+    try:
+        with instance.span(name):
+            yield
+    finally:
+        instance.enabled = False
+        instance.save(path)
+        instance.report()
+        logger.info(dict(action="trace", path=path))
+
+
+@contextlib.contextmanager
+def peak_memory(label: str) -> Generator[None]:
+    """
+    Log the peak memory allocated by python inside the block, but only in verbose mode since tracing allocations is slow.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        yield
+        return
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        logger.debug(f"peak memory: {(peak - start) / 2**20:.1f} MiB {label}")
@@ -2,4 +2,5 @@ from pathlib import Path
 from typing import Optional
 
 OptionalPath = Optional[Path]
+OptionalString = Optional[str]
 MultipleStrings = Optional[list[str]]
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import abc
+import ctypes
+import os
+import select
+import struct
+import time
+from collections.abc import Callable
+from collections.abc import Iterable
+from pathlib import Path
+from types import TracebackType
+
+from mdsphinx.logger import logger
+
+# see inotify(7)
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_EVENT = struct.Struct("iIII")
+
+
+def never(path: Path) -> bool:
+    return False
+
+
+class Watcher(abc.ABC):
+    """
+    Collect the files that change below the root directories, or the extra files that are watched on their own.
+    """
+
+    def __init__(self, roots: Iterable[Path], files: Iterable[Path] = (), skip: Callable[[Path], bool] = never) -> None:
+        self.roots = tuple(roots)
+        self.files = frozenset(files)
+        self.skip = skip
+
+    @abc.abstractmethod
+    def poll(self, timeout: float | None) -> set[Path]:
+        """
+        Wait up to timeout seconds, or forever if None, for changes.
+        """
+
+    def wait(self, debounce: float = 0.5) -> set[Path]:
+        """
+        Wait for changes, then keep collecting them until none arrive for debounce seconds.
+        """
+        changes: set[Path] = set()
+        while not changes:
+            changes |= self.poll(None)
+
+        while more := self.poll(debounce):
+            changes |= more
+
+        return changes
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> Watcher:
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, exc: BaseException | None, tb: TracebackType | None) -> None:
+        self.close()
+
+
+class PollingWatcher(Watcher):
+    def __init__(
+        self,
+        roots: Iterable[Path],
+        files: Iterable[Path] = (),
+        skip: Callable[[Path], bool] = never,
+        interval: float = 1.0,
+    ) -> None:
+        super().__init__(roots, files, skip)
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self) -> dict[Path, tuple[int, int]]:
+        snapshot: dict[Path, tuple[int, int]] = {}
+        for top in self.roots:
+            for root, dir_names, file_names in top.walk():
+                dir_names[:] = [base for base in dir_names if not self.skip(root / base)]
+                for base in file_names:
+                    self._stat(root / base, snapshot)
+
+        for path in self.files:
+            self._stat(path, snapshot)
+
+        return snapshot
+
+    @staticmethod
+    def _stat(path: Path, snapshot: dict[Path, tuple[int, int]]) -> None:
+        try:
+            stat = path.stat()
+            snapshot[path] = stat.st_size, stat.st_mtime_ns
+        except FileNotFoundError:
+            pass
+
+    def poll(self, timeout: float | None) -> set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            time.sleep(self.interval if deadline is None else max(0.0, min(self.interval, deadline - time.monotonic())))
+            snapshot = self.scan()
+            changes = {path for path in snapshot.keys() | self.snapshot.keys() if snapshot.get(path) != self.snapshot.get(path)}
+            self.snapshot = snapshot
+            if changes or (deadline is not None and time.monotonic() >= deadline):
+                return changes
+
+
+class InotifyWatcher(Watcher):
+    MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, roots: Iterable[Path], files: Iterable[Path] = (), skip: Callable[[Path], bool] = never) -> None:
+        super().__init__(roots, files, skip)
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd: int = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()), "inotify_init1")
+
+        # watch descriptor -> (directory, is inside a root?)
+        self.dirs: dict[int, tuple[Path, bool]] = {}
+        try:
+            for root in self.roots:
+                self.add_tree(root)
+            for path in self.files:
+                if path.parent.is_dir():
+                    self.add_watch(path.parent, recursive=False)
+        except OSError:
+            self.close()
+            raise
+
+    def add_watch(self, path: Path, recursive: bool) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()), str(path))
+        self.dirs[wd] = path, recursive or self.dirs.get(wd, (path, False))[1]
+
+    def add_tree(self, top: Path) -> set[Path]:
+        """
+        Watch a directory and its subdirectories, returning the files already inside of them.
+        """
+        found: set[Path] = set()
+        for root, dir_names, file_names in top.walk():
+            self.add_watch(root, recursive=True)
+            dir_names[:] = [base for base in dir_names if not self.skip(root / base)]
+            found.update(root / base for base in file_names)
+        return found
+
+    def poll(self, timeout: float | None) -> set[Path]:
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return set()
+
+        changes: set[Path] = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, size = IN_EVENT.unpack_from(data, offset)
+            name = data[offset + IN_EVENT.size : offset + IN_EVENT.size + size].rstrip(b"\0")
+            offset += IN_EVENT.size + size
+            changes |= self.handle(wd, mask, os.fsdecode(name))
+
+        return changes
+
+    def handle(self, wd: int, mask: int, name: str) -> set[Path]:
+        if mask & IN_Q_OVERFLOW:
+            logger.warning(dict(action="watch", message="event queue overflowed, rescanning everything"))
+            return set(self.roots) | set(self.files)
+
+        if mask & IN_IGNORED:
+            self.dirs.pop(wd, None)
+            return set()
+
+        if wd not in self.dirs:
+            return set()
+
+        root, recursive = self.dirs[wd]
+        path = root / name
+        if path in self.files:
+            return {path}
+
+        if not recursive or (mask & IN_ISDIR and self.skip(path)):
+            return set()
+
+        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+            try:
+                return {path} | self.add_tree(path)
+            except OSError as error:
+                logger.warning(dict(action="watch", path=path, message=f"can not watch new directory: {error}"))
+
+        return {path}
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def watcher(
+    roots: Iterable[Path],
+    files: Iterable[Path] = (),
+    skip: Callable[[Path], bool] = never,
+    poll: bool = False,
+    interval: float = 1.0,
+) -> Watcher:
+    """
+    Watch with inotify where the platform supports it, falling back to polling.
+    """
+    roots, files = tuple(roots), tuple(files)
+    if not poll:
+        try:
+            return InotifyWatcher(roots, files, skip)
+        except (OSError, AttributeError, TypeError) as error:
+            logger.warning(dict(action="watch", message=f"falling back to polling: {error}"))
+
+    return PollingWatcher(roots, files, skip, interval=interval)
@@ -12,7 +12,16 @@ from mdsphinx.__main__ import app
         pytest.param(("env", "list", "--help"), id="mdsphinx env list"),
         pytest.param(("env", "create", "--help"), id="mdsphinx env create"),
         pytest.param(("env", "remove", "--help"), id="mdsphinx env remove"),
+        pytest.param(("env", "download", "--help"), id="mdsphinx env download"),
+        pytest.param(("env", "clone", "--help"), id="mdsphinx env clone"),
+        pytest.param(("daemon", "start", "--help"), id="mdsphinx daemon start"),
+        pytest.param(("daemon", "stop", "--help"), id="mdsphinx daemon stop"),
+        pytest.param(("daemon", "list", "--help"), id="mdsphinx daemon list"),
+        pytest.param(("cache", "list", "--help"), id="mdsphinx cache list"),
+        pytest.param(("cache", "clean", "--help"), id="mdsphinx cache clean"),
         pytest.param(("prepare", "--help"), id="mdsphinx prepare"),
+        pytest.param(("watch", "--help"), id="mdsphinx watch"),
+        pytest.param(("batch", "--help"), id="mdsphinx batch"),
         pytest.param(("render", "pdf", "--help"), id="mdsphinx render pdf"),
         pytest.param(("render", "html", "--help"), id="mdsphinx render html"),
         pytest.param(("render", "confluence", "--help"), id="mdsphinx render confluence"),
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+import pytest
+
+from mdsphinx.core.batch import load_targets
+from mdsphinx.core.batch import Target
+from mdsphinx.core.process import Format
+
+
+def test_load_targets(tmp_path: Path) -> None:
+    path = tmp_path / "documents.yml"
+    path.write_text(
+        """
+defaults:
+  env-name: custom
+documents:
+  - a.md
+  - inp: b
+    to: [html, pdf]
+    as: {pdf: out/b.pdf}
+"""
+    )
+
+    assert load_targets(path) == [
+        Target(tmp_path / "a.md", Format.pdf, env_name="custom"),
+        Target(tmp_path / "b", Format.html, env_name="custom"),
+        Target(tmp_path / "b", Format.pdf, env_name="custom", out=tmp_path / "out" / "b.pdf"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        pytest.param('{"inp": "a.md", "to": "html", "as": "a.html"}', id="export"),
+        pytest.param('{"inp": "a.md", "format": "html"}', id="unknown"),
+        pytest.param('{"to": "html"}', id="missing"),
+    ],
+)
+def test_load_targets_invalid(tmp_path: Path, document: str) -> None:
+    path = tmp_path / "documents.json"
+    path.write_text(f'{{"documents": [{document}]}}')
+    with pytest.raises(ValueError):
+        load_targets(path)
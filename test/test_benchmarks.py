@@ -0,0 +1,48 @@
+import dataclasses
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.corpus import Corpus
+from benchmarks.suite import find_regressions
+from benchmarks.suite import Report
+
+
+def test_corpus(tmp_path: Path) -> None:
+    inp, context = Corpus(files=20, depth=2, fanout=2, resources=3, diagrams=2).generate(tmp_path)
+    sources = sorted(inp.rglob("*.md"))
+    assert len(sources) == 20
+    assert len(list(inp.rglob("*.png"))) == 3
+    assert sum("{% mermaid" in path.read_text() for path in sources) == 2
+    assert context.parent == inp.parent
+
+
+def test_find_regressions() -> None:
+    corpus = dataclasses.asdict(Corpus())
+    baseline = Report(corpus=corpus, cases=dict(fast=[0.0001], slow=[1.0, 1.0, 1.0], same=[1.0]))
+    current = Report(corpus=corpus, cases=dict(fast=[0.0005], slow=[1.5, 1.5, 0.5], same=[1.05], new=[1.0]))
+    assert find_regressions(baseline, current, threshold=0.1, min_delta=0.001) == ["slow"]
+
+
+def suite(*args: str | Path, config_root: Path) -> None:
+    subprocess.run(
+        (sys.executable, "-m", "benchmarks.suite", *args),
+        cwd=Path(__file__).parents[1],
+        env={**os.environ, "MDSPHINX_CONFIG_ROOT": str(config_root)},
+        check=True,
+    )
+
+
+def test_suite(tmp_path: Path) -> None:
+    output = tmp_path / "results.json"
+    suite("run", "--files", "10", "--resources", "2", "--diagrams", "1", "--repeat", "1", config_root=tmp_path / "config")
+    suite("run", "--files", "10", "--repeat", "1", "--case", "prepare", "--output", output, config_root=tmp_path / "config")
+    suite("compare", output, output, config_root=tmp_path / "config")
+
+    with output.open("r") as stream:
+        data = json.load(stream)
+    assert list(data["cases"]) == ["prepare"]
+    assert data["corpus"]["files"] == 10
+    assert not tmp_path.joinpath("config").exists()
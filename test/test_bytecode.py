@@ -0,0 +1,23 @@
+from pathlib import Path
+
+from jinja2 import Environment
+from jinja2 import FileSystemLoader
+
+from mdsphinx.bytecode import TemplateCache
+
+
+def test_bytecode_cache_shares_store(tmp_path: Path) -> None:
+    tmp_path.joinpath("inp").mkdir()
+    tmp_path.joinpath("inp", "partial.md").write_text("Hello {{ name }}!")
+    cache = TemplateCache(tmp_path / "cache", max_size=1)
+
+    def render() -> str:
+        instance = Environment(loader=FileSystemLoader(tmp_path / "inp"), bytecode_cache=cache.bytecode_cache())
+        return instance.get_template("partial.md").render(name="world")
+
+    assert render() == "Hello world!"
+    assert len(list(cache.root.glob("*/*"))) == 1
+    assert render() == "Hello world!"
+
+    cache.evict()
+    assert list(cache.root.glob("*/*")) == []
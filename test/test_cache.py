@@ -0,0 +1,52 @@
+import dataclasses
+import os
+import time
+from pathlib import Path
+
+from mdsphinx.core.cache import evict
+from mdsphinx.core.cache import Folder
+from mdsphinx.core.cache import is_held
+from mdsphinx.tempdir import hold
+from mdsphinx.tempdir import LOCK_NAME
+
+
+def make_folder(root: Path, name: str, days: float) -> Folder:
+    path = root / name
+    path.mkdir()
+    path.joinpath("data").write_bytes(b"x" * 8192)
+    path.joinpath(LOCK_NAME).touch()
+    used = time.time() - days * 86400
+    os.utime(path / LOCK_NAME, (used, used))
+    return Folder.scan(path, inp=None)
+
+
+def test_evict_least_recently_used(tmp_path: Path) -> None:
+    folders = [make_folder(tmp_path, name, days) for name, days in [("new", 0), ("old", 2), ("mid", 1)]]
+
+    evicted = evict(folders, max_size=folders[0].size * 2, dry_run=True)
+    assert [folder.path.name for folder in evicted] == ["old"]
+
+    evicted = evict(folders, max_size=folders[0].size)
+    assert [folder.path.name for folder in evicted] == ["old", "mid"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["new"]
+
+
+def test_evict_by_age_skips_held(tmp_path: Path) -> None:
+    folders = [make_folder(tmp_path, name, days) for name, days in [("a", 10), ("b", 20), ("c", 1)]]
+
+    assert hold(tmp_path / "a")
+    assert is_held(tmp_path / "a")
+    assert not is_held(tmp_path / "b")
+
+    evicted = evict(folders, max_age=5)
+    assert [folder.path.name for folder in evicted] == ["b"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a", "c"]
+
+
+def test_evict_by_age_keeps_newest_of_input(tmp_path: Path) -> None:
+    folders = [make_folder(tmp_path, name, days) for name, days in [("a.0", 30), ("a.1", 20), ("b.0", 10), ("c", 40)]]
+    folders = [dataclasses.replace(folder, inp=tmp_path / folder.path.name.split(".")[0]) for folder in folders[:3]] + folders[3:]
+
+    evicted = evict(folders, max_age=5)
+    assert sorted(folder.path.name for folder in evicted) == ["a.0", "c"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.1", "b.0"]
@@ -0,0 +1,88 @@
+import os
+from pathlib import Path
+
+import pytest
+import yaml
+
+from mdsphinx.context import LazyFile
+from mdsphinx.context import load_context
+from mdsphinx.core.prepare import Renderer
+from mdsphinx.manifest import digest_context
+
+
+@pytest.fixture
+def context(tmp_path: Path) -> Path:
+    tmp_path.joinpath("data").mkdir()
+    tmp_path.joinpath("data", "items.jsonl").write_text('{"name": "a"}\n\n{"name": "b"}\n')
+    tmp_path.joinpath("data", "table.csv").write_text("x,y\n1,2\n3,4\n")
+    tmp_path.joinpath("data", "broken.json").write_text("{")
+    path = tmp_path / "context.yml"
+    path.write_text(
+        "title: Catalog\nitems: !include data/items.jsonl\ntable: !include data/table.csv\nbroken: !include data/broken.json\n"
+    )
+    return path
+
+
+def test_load_context_is_lazy(context: Path, tmp_path: Path) -> None:
+    data = load_context(context)
+    assert data["title"] == "Catalog"
+    assert data["items"] == LazyFile(tmp_path / "data" / "items.jsonl")
+    assert data["items"].value == [dict(name="a"), dict(name="b")]
+    assert data["table"].value == [dict(x="1", y="2"), dict(x="3", y="4")]
+
+
+def test_load_context_is_cached(context: Path) -> None:
+    assert load_context(context)["title"] == "Catalog"
+
+    # a cached result is used while the size and modification time of the file match
+    stat = context.stat()
+    context.write_text(context.read_text().replace("Catalog", "Changed"))
+    os.utime(context, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load_context(context)["title"] == "Catalog"
+
+    os.utime(context, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert load_context(context)["title"] == "Changed"
+
+
+def test_render_loads_used_files(context: Path, tmp_path: Path) -> None:
+    inp_root = tmp_path / "inp"
+    inp_root.mkdir()
+    inp_root.joinpath("a.md").write_text("# {{ title }}\n{% for item in items %}- {{ item.name }}\n{% endfor %}")
+
+    Renderer.create(context, inp_root=inp_root, out_root=tmp_path / "out").render()
+
+    # the broken side file is never used, so it is never read
+    assert tmp_path.joinpath("out", "source", "a.md").read_text() == "# Catalog\n- a\n- b\n"
+
+
+def test_digest_context_follows_side_files(context: Path, tmp_path: Path) -> None:
+    before = digest_context(load_context(context))
+    tmp_path.joinpath("data", "table.csv").write_text("x,y\n1,2\n")
+    assert digest_context(load_context(context)) != before
+
+
+def test_include_unknown_format(context: Path, tmp_path: Path) -> None:
+    context.write_text("notes: !include notes.txt\n")
+    with pytest.raises(ValueError, match="Can not include"):
+        load_context(context)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        pytest.param("catalog:\n  items: !include data/items.jsonl\n", id="mapping"),
+        pytest.param("catalogs:\n  - !include data/items.jsonl\n", id="sequence"),
+        pytest.param("!include data/items.jsonl\n", id="document"),
+    ],
+)
+def test_include_nested(context: Path, text: str) -> None:
+    context.write_text(text)
+    with pytest.raises(yaml.YAMLError, match="only supported for the top level"):
+        load_context(context)
+
+
+def test_include_in_side_file(context: Path, tmp_path: Path) -> None:
+    tmp_path.joinpath("data", "more.yml").write_text("items: !include items.jsonl\n")
+    context.write_text("more: !include data/more.yml\n")
+    with pytest.raises(yaml.YAMLError, match="only supported for the top level"):
+        load_context(context)["more"].value
@@ -0,0 +1,73 @@
+import subprocess
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+import jinja2_mermaid_extension.callback
+import jinja2_mermaid_extension.run
+import pytest
+
+from mdsphinx import diagrams
+from mdsphinx.diagrams import DiagramCache
+from mdsphinx.diagrams import DiagramJob
+
+
+def test_diagram_cache(tmp_path: Path) -> None:
+    calls: list[Path] = []
+
+    def callback(inp: Path | str, out: Path, **kwargs: Any) -> None:
+        calls.append(out)
+        out.write_text(f"{inp} {kwargs}")
+
+    cache = DiagramCache(tmp_path / "cache", max_size=1 << 20)
+    for out_root in (tmp_path / "a", tmp_path / "b"):
+        out_root.mkdir()
+        cache.run("mermaid", callback, inp="graph TD", out=out_root / "x.png", out_root=out_root, theme="dark")
+
+    assert calls == [tmp_path / "a" / "x.png"]
+    assert tmp_path.joinpath("b", "x.png").read_text() == tmp_path.joinpath("a", "x.png").read_text()
+
+    cache.run("mermaid", callback, inp="graph TD", out=tmp_path / "b" / "y.png", theme="light")
+    assert calls[-1] == tmp_path / "b" / "y.png"
+
+
+def test_diagram_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    def callback(inp: Path | str, out: Path, **kwargs: Any) -> None:
+        out.write_text(str(inp) * 100)
+
+    cache = DiagramCache(tmp_path / "cache", max_size=250)
+    for inp in ("a", "b", "c"):
+        cache.run("tikz", callback, inp=inp, out=tmp_path / f"{inp}.png")
+
+    assert len(list(cache.root.glob("*/*"))) == 3
+    cache.evict()
+
+    blobs = sorted(path.read_text()[0] for path in cache.root.glob("*/*"))
+    assert blobs == ["b", "c"]
+
+
+def test_diagram_cache_key_follows_renderer(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    cache = DiagramCache(tmp_path / "cache", max_size=1 << 20)
+    monkeypatch.setattr(diagrams, "get_tool_version", lambda *command: "tectonic 0.15.0")
+    before = cache.key("tikz", "x", ".png")
+    monkeypatch.setattr(diagrams, "get_tool_version", lambda *command: "tectonic 0.16.0")
+    assert cache.key("tikz", "x", ".png") != before
+
+
+def test_callback_runs_commands_with_deadline(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    timeouts: list[float | None] = []
+
+    def library_run(command: Iterable[str], **kwargs: Any) -> None:
+        timeouts.append(kwargs["timeout"])
+        subprocess.run(tuple(command), **kwargs)
+
+    monkeypatch.setattr(jinja2_mermaid_extension.run, "run", library_run)
+    monkeypatch.setattr(diagrams, "remaining", lambda: 30.0)
+    latex_command = ("sh", "-c", 'cp "$0" "${{0%.tex}}.pdf"', "{inp_tex}")
+    tmp_path.joinpath("work").mkdir()
+    callback = DiagramJob.CALLBACKS["tikz"]
+    callback(inp=r"\draw (0,0) -- (1,1);", out=tmp_path / "x.pdf", temp_dir=tmp_path / "work", latex_command=latex_command)
+
+    assert timeouts == [30.0]
+    assert r"\draw (0,0) -- (1,1);" in tmp_path.joinpath("x.pdf").read_text()
+    assert callback is jinja2_mermaid_extension.callback.tikz
@@ -0,0 +1,74 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from mdsphinx.core import environment
+from mdsphinx.core.environment import index_args
+from mdsphinx.core.environment import Installer
+from mdsphinx.core.environment import VirtualEnvironment
+
+
+def test_index_args(tmp_path: Path) -> None:
+    assert index_args(Installer.pip) == []
+    assert index_args(Installer.pip, tmp_path / "missing") == []
+    assert index_args(Installer.pip, tmp_path, offline=True) == ["--find-links", str(tmp_path), "--no-index"]
+    assert index_args(Installer.uv, tmp_path, offline=True) == ["--find-links", str(tmp_path), "--offline"]
+
+
+def test_installer_resolve(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("mdsphinx.core.environment.shutil.which", lambda name: None)
+    assert Installer.auto.resolve() is Installer.pip
+    monkeypatch.setattr("mdsphinx.core.environment.shutil.which", lambda name: f"/usr/bin/{name}")
+    assert Installer.auto.resolve() is Installer.uv
+    assert Installer.pip.resolve() is Installer.pip
+
+
+@pytest.mark.parametrize(
+    "installer, expected",
+    [
+        pytest.param(Installer.pip, ("{python}", "-m", "pip", "install", "--upgrade"), id="pip"),
+        pytest.param(Installer.uv, ("uv", "pip", "install", "--python", "{python}", "--upgrade"), id="uv"),
+    ],
+)
+def test_install_in_one_pass(
+    installer: Installer, expected: tuple[str, ...], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    commands: list[tuple[str, ...]] = []
+
+    def run(*args: str | Path, **kwargs: Any) -> None:
+        commands.append(tuple(map(str, args)))
+
+    monkeypatch.setattr(environment, "run", run)
+    venv = VirtualEnvironment("a", tmp_path / "a")
+    venv.install("pip", "sphinx", "furo", installer=installer, options=["--no-index"])
+
+    prefix = tuple(arg.format(python=venv.python) for arg in expected)
+    assert commands == [(*prefix, "--no-index", "pip", "sphinx", "furo")]
+
+
+def test_clone(tmp_path: Path) -> None:
+    base = VirtualEnvironment("a", tmp_path / "a")
+    site_packages = base.path / "lib" / "python3.12" / "site-packages"
+    site_packages.mkdir(parents=True)
+    site_packages.joinpath("sphinx.py").write_text("")
+    base.path.joinpath("lib64").symlink_to("lib")
+    base.path.joinpath("bin").mkdir()
+    base.path.joinpath("bin", "python").symlink_to("/usr/bin/python3")
+    base.path.joinpath("bin", "sphinx-build").write_text(f"#!{base.python}\n")
+    base.path.joinpath("bin", "sphinx-build").chmod(0o755)
+    base.path.joinpath("bin", "activate").write_text(f"VIRTUAL_ENV={base.path}\n")
+    base.path.joinpath("bin", "launcher").write_bytes(b"\x7fELF" + bytes(base.path))
+    base.path.joinpath("pyvenv.cfg").write_text(f"version = 3.12.0\ncommand = python -m venv {base.path}\n")
+
+    venv = VirtualEnvironment("b", tmp_path / "b")
+    assert base.clone(venv) == 3
+
+    assert venv.site_packages.joinpath("sphinx.py").samefile(site_packages / "sphinx.py")
+    assert venv.path.joinpath("lib64").readlink() == Path("lib")
+    assert venv.python.readlink() == Path("/usr/bin/python3")
+    assert venv.path.joinpath("bin", "sphinx-build").read_text() == f"#!{venv.python}\n"
+    assert venv.path.joinpath("bin", "sphinx-build").stat().st_mode & 0o777 == 0o755
+    assert venv.path.joinpath("bin", "activate").read_text() == f"VIRTUAL_ENV={venv.path}\n"
+    assert venv.path.joinpath("bin", "launcher").samefile(base.path / "bin" / "launcher")
+    assert venv.path.joinpath("pyvenv.cfg").read_text() == f"version = 3.12.0\ncommand = python -m venv {venv.path}\n"
@@ -0,0 +1,39 @@
+import sys
+from pathlib import Path
+
+from mdsphinx.latex import run_latex
+
+# a fake engine that writes the pdf, and an aux file that only changes when the tex does
+ENGINE = """
+import sys
+from pathlib import Path
+tex = Path(sys.argv[1])
+tex.with_suffix(".aux").write_text(tex.read_text())
+with tex.with_suffix(".log").open("a") as stream:
+    stream.write("run\\n")
+tex.with_suffix(".pdf").write_text(tex.read_text())
+"""
+
+
+def test_run_latex(tmp_path: Path) -> None:
+    engine = tmp_path / "engine.py"
+    engine.write_text(ENGINE)
+    root = tmp_path / "pdf"
+    root.mkdir()
+    tex = root / "index.tex"
+    tex.write_text("a")
+    root.joinpath("image.png").write_bytes(b"png")
+    commands = ((sys.executable, str(engine), "{tex}"),) * 3
+
+    def runs() -> int:
+        return len(tex.with_suffix(".log").read_text().splitlines())
+
+    assert run_latex(tex, commands)
+    assert runs() == 2
+
+    assert not run_latex(tex, commands)
+    assert runs() == 2
+
+    root.joinpath("image.png").write_bytes(b"new")
+    assert run_latex(tex, commands)
+    assert runs() == 3
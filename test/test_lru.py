@@ -0,0 +1,16 @@
+import os
+from pathlib import Path
+
+from mdsphinx.lru import evict_lru
+
+
+def test_evict_lru(tmp_path: Path) -> None:
+    for i, name in enumerate(("aa/old", "bb/mid", "aa/new")):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b"x" * 10)
+        os.utime(path, ns=(i, i))
+
+    assert evict_lru(tmp_path, max_size=20) == [tmp_path / "aa" / "old"]
+    assert evict_lru(tmp_path, max_size=20) == []
+    assert evict_lru(tmp_path, max_size=0) == [tmp_path / "bb" / "mid", tmp_path / "aa" / "new"]
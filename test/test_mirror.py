@@ -0,0 +1,51 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from mdsphinx.mirror import collect_blobs
+from mdsphinx.mirror import mirror
+from mdsphinx.mirror import MirrorMode
+
+
+@pytest.mark.parametrize("mode", list(MirrorMode))
+def test_mirror(mode: MirrorMode, tmp_path: Path) -> None:
+    src = tmp_path / "src.png"
+    src.write_bytes(os.urandom(4096))
+
+    for name in ("a", "b"):
+        dst = tmp_path / name / "src.png"
+        dst.parent.mkdir()
+        mirror(src, dst, mode=mode, store=tmp_path / "store")
+        assert dst.read_bytes() == src.read_bytes()
+        assert mirror(src, dst, mode=mode, store=tmp_path / "store") == 0
+
+    if mode == MirrorMode.store:
+        assert len(list(tmp_path.joinpath("store").rglob("*"))) == 2
+        assert tmp_path.joinpath("a", "src.png").samefile(tmp_path.joinpath("b", "src.png"))
+
+
+def test_mirror_updates_changed(tmp_path: Path) -> None:
+    src, dst = tmp_path / "src.png", tmp_path / "dst.png"
+    src.write_bytes(b"a")
+    mirror(src, dst)
+
+    src.write_bytes(b"bb")
+    assert mirror(src, dst) == 2
+    assert dst.read_bytes() == b"bb"
+
+
+def test_collect_blobs(tmp_path: Path) -> None:
+    src = tmp_path / "src.png"
+    src.write_bytes(os.urandom(4096))
+    for name in ("a", "b"):
+        tmp_path.joinpath(name).mkdir()
+        mirror(src, tmp_path / name / "src.png", mode=MirrorMode.store, store=tmp_path / "store")
+
+    tmp_path.joinpath("a", "src.png").unlink()
+    assert collect_blobs(tmp_path / "store") == []
+
+    tmp_path.joinpath("b", "src.png").unlink()
+    assert [size for _, size in collect_blobs(tmp_path / "store", dry_run=True)] == [4096]
+    assert [size for _, size in collect_blobs(tmp_path / "store")] == [4096]
+    assert list(tmp_path.joinpath("store").glob("*/*")) == []
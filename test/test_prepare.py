@@ -0,0 +1,224 @@
+import logging
+from pathlib import Path
+from typing import Any
+
+import pytest
+from jinja2 import UndefinedError
+
+from mdsphinx.core.prepare import Renderer
+from mdsphinx.core.watch import finish_diagrams
+from mdsphinx.diagrams import diagram_cache
+from mdsphinx.diagrams import DiagramJob
+from mdsphinx.diagrams import wait_for_diagrams
+from mdsphinx.manifest import Manifest
+
+
+@pytest.fixture
+def inp_root(tmp_path: Path) -> Path:
+    root = tmp_path / "inp"
+    root.joinpath("x").mkdir(parents=True)
+    root.joinpath("a.md").write_text("# {{ a }}\n")
+    root.joinpath("x", "b.md").write_text("# b\n")
+    root.joinpath("x", "c.png").write_bytes(b"\x89PNG")
+    return root
+
+
+def render(inp_root: Path, out_root: Path, caplog: pytest.LogCaptureFixture, **context: int) -> set[str]:
+    caplog.clear()
+    Renderer.create(dict(context), inp_root=inp_root, out_root=out_root).render()
+    return {
+        Path(message.split(": ", maxsplit=1)[1]).relative_to(out_root / "source").as_posix()
+        for message in caplog.messages
+        if message.startswith(("rendered: ", "mirror: "))
+    }
+
+
+def test_render_skips_unchanged(inp_root: Path, tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    out_root = tmp_path / "out"
+    assert render(inp_root, out_root, caplog, a=1) == {"a.md", "x/b.md", "x/c.png"}
+    assert render(inp_root, out_root, caplog, a=1) == set()
+
+    inp_root.joinpath("x", "b.md").write_text("# B\n")
+    assert render(inp_root, out_root, caplog, a=1) == {"x/b.md"}
+
+
+def test_render_context_change(inp_root: Path, tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    out_root = tmp_path / "out"
+    render(inp_root, out_root, caplog, a=1)
+    assert render(inp_root, out_root, caplog, a=2) == {"a.md"}
+    assert out_root.joinpath("source", "a.md").read_text() == "# 2"
+
+
+def test_render_context_keys(inp_root: Path, tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    inp_root.joinpath("c.md").write_text("{% macro m() %}{{ b }}{% endmacro %}# {{ m() }}\n")
+    out_root = tmp_path / "out"
+    assert render(inp_root, out_root, caplog, a=1, b=1) == {"a.md", "c.md", "x/b.md", "x/c.png"}
+    assert render(inp_root, out_root, caplog, a=1, b=2) == {"c.md"}
+    assert render(inp_root, out_root, caplog, a=1, b=2, d=3) == set()
+    assert render(inp_root, out_root, caplog, a=2, b=2) == {"a.md"}
+    assert Manifest.load(out_root).entries["c.md"].keys == ["b"]
+
+
+def test_render_removes_deleted(inp_root: Path, tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    out_root = tmp_path / "out"
+    render(inp_root, out_root, caplog, a=1)
+
+    inp_root.joinpath("x", "b.md").unlink()
+    render(inp_root, out_root, caplog, a=1)
+
+    assert not out_root.joinpath("source", "x", "b.md").exists()
+    assert "x/b.md" not in Manifest.load(out_root).entries
+
+
+def test_render_parallel(inp_root: Path, tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    serial = render(inp_root, tmp_path / "serial", caplog, a=1)
+    serial_messages = [m.replace(str(tmp_path / "serial"), "") for m in caplog.messages if not m.startswith("template cache")]
+
+    caplog.clear()
+    Renderer.create(dict(a=1), inp_root=inp_root, out_root=tmp_path / "parallel").render(jobs=2)
+    parallel_messages = [m.replace(str(tmp_path / "parallel"), "") for m in caplog.messages if not m.startswith("template cache")]
+
+    assert serial == {"a.md", "x/b.md", "x/c.png"}
+    assert serial_messages == parallel_messages
+    assert Manifest.load(tmp_path / "serial").entries == Manifest.load(tmp_path / "parallel").entries
+
+
+def test_render_rejects_jobs(inp_root: Path, tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match="at least 1"):
+        Renderer.create(dict(a=1), inp_root=inp_root, out_root=tmp_path / "out").render(jobs=0)
+
+
+def test_update(inp_root: Path, tmp_path: Path) -> None:
+    out_root = tmp_path / "out"
+    renderer = Renderer.create(dict(a=1), inp_root=inp_root, out_root=out_root)
+    renderer.render()
+    renderer.create_index()
+    assert not renderer.update([inp_root / "a.md"])
+
+    inp_root.joinpath("x", "d.md").write_text("# d\n")
+    inp_root.joinpath("x", "b.md").unlink()
+    assert renderer.update([inp_root / "x" / "d.md", inp_root / "x" / "b.md", inp_root / "x" / "d.md~"])
+
+    assert out_root.joinpath("source", "x", "d.md").exists()
+    assert not out_root.joinpath("source", "x", "b.md").exists()
+    assert "   d <d>" in out_root.joinpath("source", "x", "index.rst").read_text()
+    assert set(Manifest.load(out_root).entries) == {"a.md", "x/c.png", "x/d.md"}
+
+
+def test_create_index(inp_root: Path, tmp_path: Path) -> None:
+    inp_root.joinpath("empty").mkdir()
+    inp_root.joinpath("y", "z").mkdir(parents=True)
+    inp_root.joinpath("y", "z", "c.png").write_bytes(b"\x89PNG")
+    inp_root.joinpath("x", "x10.md").write_text("# 10\n")
+    inp_root.joinpath("x", "x9.md").write_text("# 9\n")
+
+    out_root = tmp_path / "out"
+    renderer = Renderer.create(dict(a=1), inp_root=inp_root, out_root=out_root)
+    renderer.render()
+    renderer.create_index()
+
+    assert out_root.joinpath("source", "index.rst").read_text().splitlines()[-2:] == ["   a <a>", "   x <x/index>"]
+    assert out_root.joinpath("source", "x", "index.rst").read_text().splitlines()[-3:] == ["   b <b>", "   x9 <x9>", "   x10 <x10>"]
+    assert not out_root.joinpath("source", "y", "index.rst").exists()
+
+
+def test_render_streams_output(inp_root: Path, tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    inp_root.joinpath("big.md").write_text("{% for i in range(n) %}{{ '%080d' % i }}\n{% endfor %}")
+    out_root = tmp_path / "out"
+
+    with caplog.at_level(logging.DEBUG, logger="mdsphinx"):
+        Renderer.create(dict(a=1, n=100_000), inp_root=inp_root, out_root=out_root).render()
+
+    assert out_root.joinpath("source", "big.md").stat().st_size == 100_000 * 81
+    (peak,) = (float(m.split()[2]) for m in caplog.messages if m.startswith("peak memory") and m.endswith("big.md"))
+    assert peak < 4
+
+
+def test_render_failure_keeps_output(inp_root: Path, tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    out_root = tmp_path / "out"
+    render(inp_root, out_root, caplog, a=1)
+
+    inp_root.joinpath("a.md").write_text("# {{ a }}\n{{ missing }}\n")
+    with pytest.raises(UndefinedError):
+        render(inp_root, out_root, caplog, a=1)
+
+    assert out_root.joinpath("source", "a.md").read_text() == "# 1"
+    assert [path.name for path in out_root.joinpath("source").iterdir() if path.suffix == ".tmp"] == []
+
+
+def test_render_partials(inp_root: Path, tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    inp_root.joinpath("_templates").mkdir()
+    inp_root.joinpath("_templates", "header.md").write_text("> {{ a }}\n")
+    inp_root.joinpath("_templates", "macros.md").write_text("{% macro shout(s) %}{{ s | upper }}{% endmacro %}")
+    inp_root.joinpath("c.md").write_text('{% include "_templates/header.md" %}\n# c\n')
+    inp_root.joinpath("x", "d.md").write_text('{% import "_templates/macros.md" as m %}# {{ m.shout("d") }}\n')
+
+    out_root = tmp_path / "out"
+    assert render(inp_root, out_root, caplog, a=1) == {"a.md", "c.md", "x/b.md", "x/c.png", "x/d.md"}
+    assert out_root.joinpath("source", "c.md").read_text() == "> 1\n# c"
+    assert out_root.joinpath("source", "x", "d.md").read_text() == "# D"
+    assert Manifest.load(out_root).entries["c.md"].keys == ["a"]
+
+    inp_root.joinpath("_templates", "macros.md").write_text("{% macro shout(s) %}{{ s | upper }}!{% endmacro %}")
+    assert render(inp_root, out_root, caplog, a=1) == {"x/d.md"}
+    assert out_root.joinpath("source", "x", "d.md").read_text() == "# D!"
+
+    assert render(inp_root, out_root, caplog, a=2) == {"a.md", "c.md"}
+
+    inp_root.joinpath("_templates", "header.md").write_text("> {{ a }}!\n")
+    renderer = Renderer.create(dict(a=2), inp_root=inp_root, out_root=out_root)
+    assert renderer.update([inp_root / "_templates" / "header.md"])
+    assert out_root.joinpath("source", "c.md").read_text() == "> 2!\n# c"
+
+
+def test_render_missing_diagram(
+    inp_root: Path, tmp_path: Path, caplog: pytest.LogCaptureFixture, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def fail(inp: Path | str, out: Path, **kwargs: Any) -> None:
+        raise RuntimeError("docker is not running")
+
+    def stub(inp: Path | str, out: Path, **kwargs: Any) -> None:
+        out.write_text(str(inp))
+
+    out_root = tmp_path / "out"
+    inp_root.joinpath("a.md").write_text("{% mermaid -%}\next: .png\nname: graph\ndiagram: graph TD\n{% endmermaid %}\n")
+    monkeypatch.setattr(diagram_cache(), "max_size", 0)
+
+    monkeypatch.setitem(DiagramJob.CALLBACKS, "mermaid", fail)
+    assert "a.md" in render(inp_root, out_root, caplog)
+    assert Manifest.load(out_root).entries["a.md"].diagrams == ["source/graph.png"]
+    with pytest.raises(RuntimeError, match="docker is not running"):
+        wait_for_diagrams()
+
+    # the source is rendered again while its diagram is missing
+    assert render(inp_root, out_root, caplog) == {"a.md"}
+    with pytest.raises(RuntimeError, match="docker is not running"):
+        wait_for_diagrams()
+
+    Renderer.create({}, inp_root=inp_root, out_root=out_root).forget_missing_diagrams()
+    assert "a.md" not in Manifest.load(out_root).entries
+
+    monkeypatch.setitem(DiagramJob.CALLBACKS, "mermaid", stub)
+    assert render(inp_root, out_root, caplog) == {"a.md"}
+    wait_for_diagrams()
+    assert out_root.joinpath("source", "graph.png").read_text() == "graph TD"
+    assert render(inp_root, out_root, caplog) == set()
+
+
+def test_watch_survives_failed_diagram(inp_root: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def fail(inp: Path | str, out: Path, **kwargs: Any) -> None:
+        raise RuntimeError("docker is not running")
+
+    inp_root.joinpath("a.md").write_text("{% mermaid -%}\next: .png\nname: graph\ndiagram: graph TD\n{% endmermaid %}\n")
+    monkeypatch.setattr(diagram_cache(), "max_size", 0)
+    monkeypatch.setitem(DiagramJob.CALLBACKS, "mermaid", fail)
+    renderer = Renderer.create({}, inp_root=inp_root, out_root=tmp_path / "out")
+    renderer.render()
+
+    assert finish_diagrams(renderer) == {inp_root / "a.md"}
+    assert "a.md" not in Manifest.load(renderer.out_root).entries
+
+    monkeypatch.setitem(DiagramJob.CALLBACKS, "mermaid", lambda inp, out, **kwargs: out.write_text(inp))
+    assert renderer.update({inp_root / "a.md"})
+    assert finish_diagrams(renderer) is None
+    assert renderer.out_root.joinpath("source", "graph.png").read_text() == "graph TD"
@@ -0,0 +1,20 @@
+from pathlib import Path
+
+from mdsphinx.core.process import copy_doctrees
+from mdsphinx.core.process import Format
+
+
+def test_copy_doctrees(tmp_path: Path) -> None:
+    shared = tmp_path / "build" / ".doctrees"
+    shared.joinpath("sub").mkdir(parents=True)
+    shared.joinpath("environment.pickle").write_bytes(b"env")
+    shared.joinpath("sub", "a.doctree").write_bytes(b"a")
+
+    own = copy_doctrees(tmp_path, Format.pdf)
+    assert own == tmp_path / "build" / ".doctrees.pdf"
+    assert own.joinpath("environment.pickle").read_bytes() == b"env"
+    assert own.joinpath("sub", "a.doctree").read_bytes() == b"a"
+    assert not own.joinpath("environment.pickle").samefile(shared / "environment.pickle")
+
+    own.joinpath("environment.pickle").write_bytes(b"pdf")
+    assert shared.joinpath("environment.pickle").read_bytes() == b"env"
@@ -0,0 +1,80 @@
+import shelve
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from mdsphinx import config
+from mdsphinx.core.environment import add_env
+from mdsphinx.core.environment import Capabilities
+from mdsphinx.core.environment import del_env
+from mdsphinx.core.environment import VirtualEnvironment
+from mdsphinx.registry import locked
+from mdsphinx.registry import Record
+from mdsphinx.registry import snapshot
+
+
+@pytest.fixture
+def registry(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    path = tmp_path / "config" / "registry.json"
+    monkeypatch.setattr(config, "ENVIRONMENTS_REGISTRY", path)
+    return path
+
+
+def test_add_and_del(registry: Path, tmp_path: Path) -> None:
+    assert snapshot().environments == {}
+
+    add_env("a", tmp_path / "a")
+    add_env("b", tmp_path / "b")
+    assert snapshot().environments == {"a": Record(tmp_path / "a"), "b": Record(tmp_path / "b")}
+    assert VirtualEnvironment.from_db("a").path == tmp_path / "a"
+
+    del_env("a")
+    assert list(snapshot().environments) == ["b"]
+
+
+def test_snapshot_is_reused(registry: Path, tmp_path: Path) -> None:
+    add_env("a", tmp_path / "a")
+    assert snapshot() is snapshot()
+
+    add_env("b", tmp_path / "b")
+    assert list(snapshot().environments) == ["a", "b"]
+
+
+def test_capabilities_are_cached(registry: Path, tmp_path: Path) -> None:
+    venv = VirtualEnvironment("a", tmp_path / "a")
+    site_packages = venv.path / "lib" / "python3.12" / "site-packages"
+    site_packages.joinpath("Sphinx-8.0.0.dist-info").mkdir(parents=True)
+    add_env("a", venv.path)
+
+    assert Capabilities.load(venv).packages == {"sphinx": "8.0.0"}
+    assert snapshot().environments["a"].capabilities == dict(
+        site_packages=str(site_packages), stamp=site_packages.stat().st_mtime_ns, packages={"sphinx": "8.0.0"}
+    )
+
+    site_packages.joinpath("furo-2024.1.1.dist-info").mkdir()
+    assert Capabilities.load(venv).packages == {"sphinx": "8.0.0", "furo": "2024.1.1"}
+
+
+def test_migrate_shelve(registry: Path, tmp_path: Path) -> None:
+    registry.parent.mkdir()
+    with shelve.open(str(registry.with_suffix(""))) as shelf:
+        shelf["old"] = tmp_path / "old"
+
+    assert snapshot().environments == {"old": Record(tmp_path / "old")}
+    assert registry.exists()
+
+    del_env("old")
+    assert snapshot().environments == {}
+
+
+def add(path: Path, name: str) -> None:
+    with locked(path) as registry:
+        registry.environments[name] = Record(Path(name))
+
+
+def test_concurrent_changes(registry: Path) -> None:
+    with ProcessPoolExecutor(max_workers=8) as executor:
+        list(executor.map(add, [registry] * 64, [f"env{i}" for i in range(64)]))
+
+    assert len(snapshot().environments) == 64
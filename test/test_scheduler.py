@@ -0,0 +1,96 @@
+import dataclasses
+import threading
+import time
+
+import pytest
+
+from mdsphinx.diagrams import run
+from mdsphinx.scheduler import Scheduler
+
+
+@dataclasses.dataclass(frozen=True)
+class Sleep:
+    key: str
+    seconds: float = 0.05
+    fail: bool = False
+    active: list[int] = dataclasses.field(default_factory=lambda: [0, 0], compare=False)
+    lock: threading.Lock = dataclasses.field(default_factory=threading.Lock, compare=False)
+
+    def __call__(self) -> str:
+        with self.lock:
+            self.active[0] += 1
+            self.active[1] = max(self.active)
+        time.sleep(self.seconds)
+        with self.lock:
+            self.active[0] -= 1
+        if self.fail:
+            raise ValueError(self.key)
+        return "done"
+
+
+def test_scheduler_limits_concurrency() -> None:
+    active, lock = [0, 0], threading.Lock()
+    scheduler = Scheduler(max_jobs=2)
+    for i in range(6):
+        scheduler.submit(Sleep(str(i), active=active, lock=lock))
+    scheduler.submit(Sleep("0", active=active, lock=lock))
+
+    timings = scheduler.wait()
+    assert sorted(str(t.key) for t in timings) == ["0", "1", "2", "3", "4", "5"]
+    assert active[1] == 2
+
+
+def test_scheduler_fails_fast() -> None:
+    scheduler = Scheduler(max_jobs=1)
+    scheduler.submit(Sleep("a", fail=True))
+    slow = [Sleep(str(i), seconds=1.0) for i in range(5)]
+    for job in slow:
+        scheduler.submit(job)
+
+    start = time.monotonic()
+    with pytest.raises(ValueError, match="a"):
+        scheduler.wait()
+    assert time.monotonic() - start < 2.0
+
+
+def test_scheduler_timeout() -> None:
+    @dataclasses.dataclass(frozen=True)
+    class Hang:
+        key: str = "hang"
+
+        def __call__(self) -> str:
+            run(("sleep", "10"), check=True)
+            return "done"
+
+    scheduler = Scheduler(timeout=0.2)
+    scheduler.submit(Hang())
+    with pytest.raises(Exception, match="timed out"):
+        scheduler.wait()
+
+
+def test_scheduler_deferred() -> None:
+    scheduler = Scheduler(deferred=True)
+    scheduler.submit(Sleep("a"))
+    assert [job.key for job in scheduler.drain()] == ["a"]
+    assert scheduler.wait() == []
+
+
+def test_scheduler_configure() -> None:
+    with pytest.raises(ValueError, match="at least 1"):
+        Scheduler(max_jobs=0)
+
+    scheduler = Scheduler(max_jobs=1)
+    executor = scheduler.executor
+    scheduler.configure(1, timeout=5.0)
+    assert scheduler.executor is executor and scheduler.timeout == 5.0
+
+    with pytest.raises(ValueError, match="at least 1"):
+        scheduler.configure(-1, timeout=5.0)
+
+    with pytest.raises(ValueError, match="0 or more"):
+        scheduler.configure(1, timeout=-1.0)
+
+    scheduler.configure(3, timeout=5.0)
+    assert scheduler.executor is not executor and scheduler.executor._max_workers == 3
+    scheduler.submit(Sleep("a"))
+    assert [str(t.key) for t in scheduler.wait()] == ["a"]
@@ -0,0 +1,39 @@
+import json
+import os
+import socket
+from pathlib import Path
+
+import pytest
+
+from mdsphinx.core.sphinxd import handle
+from mdsphinx.core.sphinxd import HEADER
+
+
+def open_fds() -> set[int]:
+    # the listing holds a descriptor of its own, which is closed again once it returns
+    fds: set[int] = set()
+    for name in os.listdir("/proc/self/fd"):
+        try:
+            os.fstat(int(name))
+        except OSError:
+            continue
+        fds.add(int(name))
+    return fds
+
+
+@pytest.mark.skipif(not Path("/proc/self/fd").is_dir(), reason="needs /proc to list open file descriptors")
+@pytest.mark.parametrize("data", [pytest.param(b'{"command": "ping"}', id="ping"), pytest.param(b"{", id="invalid")])
+def test_handle_closes_streams(data: bytes) -> None:
+    client, conn = socket.socketpair()
+    with client, socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        before = open_fds() - {conn.fileno()}
+        read, write = os.pipe()
+        socket.send_fds(client, [HEADER.pack(len(data)) + data], [read, write])
+        os.close(read)
+        os.close(write)
+
+        assert handle(conn, {}, server)
+        assert open_fds() == before
+
+        reply = client.recv(1 << 16)
+        assert (json.loads(reply[HEADER.size :])["returncode"] == 0) if data.startswith(b'{"') else reply == b""
@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from mdsphinx.__main__ import LazyGroup
+
+
+HEAVY = frozenset({"jinja2", "jinja2_mermaid_extension", "natsort", "networkx", "yaml", "webbrowser"})
+
+# the modules of the subcommands, which are only loaded by the subcommand in use and the ones it builds on
+COMMANDS = frozenset(module for module, _ in LazyGroup.LAZY.values())
+
+
+# prints the loaded modules on exit, since -X importtime does not report those loaded with importlib.import_module
+MAIN = (
+    "import atexit, runpy, sys\n"
+    "atexit.register(lambda: print(*sorted(sys.modules), file=sys.stderr))\n"
+    "runpy.run_module('mdsphinx', run_name='__main__')\n"
+)
+
+
+@pytest.mark.parametrize(
+    "args,expected",
+    [
+        pytest.param(("--version",), set(), id="mdsphinx --version"),
+        pytest.param(("env", "list", "--help"), {"mdsphinx.core.environment"}, id="mdsphinx env list"),
+        pytest.param(
+            ("process", "--help"),
+            {f"mdsphinx.core.{name}" for name in ("process", "prepare", "cache", "daemon", "environment")},
+            id="mdsphinx process",
+        ),
+    ],
+)
+def test_startup_imports(args: tuple[str, ...], expected: set[str], tmp_path: Path) -> None:
+    config_root = tmp_path / "config"
+    result = subprocess.run(
+        (sys.executable, "-X", "importtime", "-c", MAIN, *args),
+        cwd=Path(__file__).parents[1],
+        env={**os.environ, "MDSPHINX_CONFIG_ROOT": str(config_root)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    *lines, modules = result.stderr.splitlines()
+    imported = {line.rsplit("|", 1)[-1].strip() for line in lines if line.startswith("import time:")} | set(modules.split())
+    assert {name for name in imported if name in COMMANDS} == expected
+    assert {name for name in imported if name.split(".")[0] in HEAVY} == set()
+    assert not config_root.exists()
@@ -1,11 +1,15 @@
+import shutil
 from datetime import datetime
 from datetime import UTC
 from pathlib import Path
 
 import pytest
 
+from mdsphinx import config
 from mdsphinx.tempdir import find_latest_directory
+from mdsphinx.tempdir import get_out_root
 from mdsphinx.tempdir import make_next_directory
+from mdsphinx.tempdir import OutRoots
 
 
 dt = datetime.now(UTC)
@@ -44,3 +48,49 @@ def test_find_latext_keyed_directory(existing: tuple[str], expected: str | type[
     else:
         with pytest.raises(expected):
             find_latest_directory("key", root=tmp_path)
+
+
+def test_find_latest_directory_past_nine(tmp_path: Path) -> None:
+    for i in (2, 9, 10):
+        (tmp_path / f"key.{dt:%Y-%m-%d}.abcde.{i}").mkdir()
+
+    assert find_latest_directory("key", root=tmp_path).name.endswith(".10")
+    assert make_next_directory("key", root=tmp_path).name.endswith(".11")
+
+
+def test_get_out_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "OUT_ROOTS", tmp_path / "outputs")
+    root = tmp_path / "tmp"
+    root.mkdir()
+
+    a = get_out_root(tmp_path / "a" / "doc.md", root=root)
+    assert get_out_root(tmp_path / "a" / "doc.md", root=root) == a
+    assert get_out_root(tmp_path / "b" / "doc.md", root=root) != a
+
+    b = get_out_root(tmp_path / "a" / "doc.md", root=root, overwrite=True)
+    assert b != a and b.name.endswith(".1")
+    assert get_out_root(tmp_path / "a" / "doc.md", root=root) == b
+    assert OutRoots.load(tmp_path / "a" / "doc.md", root=root).history == [a, b]
+
+    shutil.rmtree(b)
+    assert get_out_root(tmp_path / "a" / "doc.md", root=root) == a
+    assert {out_roots.inp.parent.name for out_roots in OutRoots.load_all()} == {"a", "b"}
+
+
+def test_out_roots_add(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "OUT_ROOTS", tmp_path / "outputs")
+    a, b, c = (tmp_path / name for name in "abc")
+    a.mkdir()
+    b.mkdir()
+
+    # both runs loaded the history before either added its folder
+    first = OutRoots.load(tmp_path / "doc.md", root=tmp_path)
+    second = OutRoots.load(tmp_path / "doc.md", root=tmp_path)
+    first.add(a)
+    second.add(b)
+    assert OutRoots.load(tmp_path / "doc.md", root=tmp_path).history == [a, b]
+
+    a.rmdir()
+    c.mkdir()
+    first.add(c)
+    assert OutRoots.load(tmp_path / "doc.md", root=tmp_path).history == [b, c]
@@ -0,0 +1,42 @@
+import json
+import threading
+from pathlib import Path
+
+from mdsphinx.trace import count
+from mdsphinx.trace import span
+from mdsphinx.trace import tracer
+from mdsphinx.trace import tracing
+
+
+def work() -> None:
+    with span("outer", key="a"):
+        count("files")
+        with span("inner"):
+            count("files", 2)
+            count("bytes", 10)
+
+
+def test_tracing(tmp_path: Path) -> None:
+    work()
+    assert tracer().spans == []
+
+    with tracing(tmp_path / "trace.json", "total"):
+        work()
+        thread = threading.Thread(target=work, name="other")
+        thread.start()
+        thread.join()
+
+    data = json.loads(tmp_path.joinpath("trace.json").read_text())
+    spans = [event for event in data["traceEvents"] if event["ph"] == "X"]
+    threads = {event["args"]["name"] for event in data["traceEvents"] if event["ph"] == "M"}
+
+    assert [event["name"] for event in spans] == ["total", "outer", "inner", "outer", "inner"]
+    assert spans[1]["args"] == {"key": "a", "files": 1}
+    assert spans[2]["args"] == {"files": 2, "bytes": 10}
+    assert spans[1]["ts"] <= spans[2]["ts"] and spans[2]["ts"] + spans[2]["dur"] <= spans[1]["ts"] + spans[1]["dur"]
+    assert spans[1]["tid"] != spans[3]["tid"]
+    assert {"other", threading.main_thread().name} <= threads
+    assert data["otherData"]["counts"] == {"files": 6, "bytes": 20}
+
+    work()
+    assert not tracer().enabled and len(tracer().spans) == 5
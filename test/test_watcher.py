@@ -0,0 +1,23 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from mdsphinx.watcher import watcher
+
+
+@pytest.mark.parametrize("poll", [pytest.param(False, id="inotify"), pytest.param(True, id="polling")])
+def test_watcher(tmp_path: Path, poll: bool) -> None:
+    tmp_path.joinpath("skip").mkdir()
+    tmp_path.joinpath("a.md").write_text("a")
+
+    with watcher([tmp_path], skip=lambda path: path.name == "skip", poll=poll, interval=0.05) as changes:
+        timer = threading.Timer(0.1, lambda: [tmp_path.joinpath(*parts).write_text("b") for parts in (("a.md",), ("skip", "b.md"))])
+        timer.start()
+        assert changes.wait(debounce=0.2) == {tmp_path / "a.md"}
+        timer.join()
+
+        tmp_path.joinpath("y").mkdir()
+        tmp_path.joinpath("y", "c.md").write_text("c")
+        tmp_path.joinpath("a.md").unlink()
+        assert {tmp_path / "a.md", tmp_path / "y" / "c.md"} <= changes.wait(debounce=0.2)